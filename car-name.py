@@ -3,29 +3,31 @@
 """
 事物信息生成脚本
 调用智谱AI的GLM-4.5模型生成事物名称、英文名称、描述和音标
+
+--export-batch 把待生成的事物写成 OpenAI 兼容的批量推理请求（每行一个），
+可以提交到价格更低、吞吐量更高的批量接口；--import-batch 逐行读取结果，校验后合并到 car.json。
+结果文件可以保存下来，离线重新导入。
 """
 
+import argparse
 import json
-import os
-import yaml
-from openai import OpenAI
+import time
 
-def load_config():
-    """从local.yaml加载配置"""
-    try:
-        with open('local.yaml', 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        return config
-    except Exception as e:
-        print(f"读取配置文件失败: {e}")
-        return None
+from kidcar.catalog import load_catalogue, save_catalogue
+from kidcar.concurrency import report_error, run_adaptive
+from kidcar.config import get_section
+from kidcar.history import record_throughput
+from kidcar.metrics import count, key_label, span, start_run
+from kidcar.profiling import run_main
+from kidcar.sdk import require
+from kidcar.sources import diff_items, load_item_sources
 
 # 加载配置
-config = load_config()
-if config:
+modelscope = get_section("ModelScope")
+if modelscope:
     # 使用所有API key
-    API_KEYS = config['ModelScope']['ApiKeys']
-    MODEL = config['ModelScope']['ChatModel']
+    API_KEYS = modelscope['ApiKeys']
+    MODEL = modelscope['ChatModel']
 else:
     print("使用默认配置")
     API_KEYS = ['ms-149e41d6-fb33-455d-bf45-86e8e97947b1']  # ModelScope Token
@@ -44,13 +46,23 @@ def get_next_api_key():
 def create_client():
     """创建OpenAI客户端"""
     api_key = get_next_api_key()
+    OpenAI = require("openai", "openai").OpenAI
     return OpenAI(
         base_url='https://api-inference.modelscope.cn/v1',
         api_key=api_key
     )
 
-def generate_item_info(client, item_name, item_type):
-    """生成单个事物信息"""
+# 系统提示词
+SYSTEM_PROMPT = '你是一个专业的儿童教育助手，专门为儿童提供简单易懂的各种事物知识，包括车辆、家具、动物、天气、食物和职业等。'
+
+# 批量推理文件中每行请求的接口
+BATCH_URL = "/v1/chat/completions"
+
+# 生成结果中必须有的字段
+INFO_FIELDS = ("car-name", "car-english-name", "car-description", "car-english-pronunciation", "car-american-pronunciation")
+
+def build_messages(item_name, item_type):
+    """构建生成单个事物信息的对话消息"""
     # 针对字母类型的特殊处理
     if item_type == "字母":
         prompt = f"""
@@ -95,403 +107,221 @@ def generate_item_info(client, item_name, item_type):
         }}
         """
     
+    return [
+        {
+            'role': 'system',
+            'content': SYSTEM_PROMPT
+        },
+        {
+            'role': 'user',
+            'content': prompt
+        }
+    ]
+
+def parse_item_info(content):
+    """从模型回复中提取JSON，解析失败时返回 None"""
+    content = content.strip()
+    
+    # 尝试提取JSON部分
+    if '{' in content and '}' in content:
+        start = content.find('{')
+        end = content.rfind('}') + 1
+        json_str = content[start:end]
+        
+        try:
+            return json.loads(json_str)
+        except json.JSONDecodeError:
+            print(f"JSON解析失败: {json_str}")
+            return None
+    else:
+        print(f"未找到JSON格式内容: {content}")
+        return None
+
+def generate_item_info(client, item_name, item_type):
+    """生成单个事物信息"""
     try:
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {
-                    'role': 'system',
-                    'content': '你是一个专业的儿童教育助手，专门为儿童提供简单易懂的各种事物知识，包括车辆、家具、动物、天气、食物和职业等。'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            stream=False
-        )
+        key = key_label(client.api_key)
+        count("api_calls", provider="modelscope-chat", key=key)
+        with span("chat", "modelscope-chat", key, item_name):
+            response = client.chat.completions.create(
+                model=MODEL,
+                messages=build_messages(item_name, item_type),
+                stream=False
+            )
         
         # 解析返回的JSON内容
-        content = response.choices[0].message.content.strip()
-        
-        # 尝试提取JSON部分
-        if '{' in content and '}' in content:
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            json_str = content[start:end]
-            
-            try:
-                car_info = json.loads(json_str)
-                return car_info
-            except json.JSONDecodeError:
-                print(f"JSON解析失败: {json_str}")
-                return None
-        else:
-            print(f"未找到JSON格式内容: {content}")
-            return None
+        return parse_item_info(response.choices[0].message.content)
             
     except Exception as e:
         print(f"生成事物信息时出错: {e}")
+        # 429、5xx 和超时会降低并发
+        report_error("modelscope-chat", e)
         return None
 
-def load_existing_items():
-    """加载已生成的事物信息"""
-    if os.path.exists('kid_car_flutter/assets/car.json'):
-        try:
-            with open('kid_car_flutter/assets/car.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"读取car.json文件失败: {e}")
-            return []
-    return []
+def new_catalogue_item(item_info, item_name, item_type):
+    """补上事物名称、类型和待生成的资源路径"""
+    item_info['car-name'] = item_name
+    item_info['car-type'] = item_type
+    item_info['car-image-path'] = ''  # 图片路径，后续生成
+    item_info['chinese-audio-path'] = ''  # 中文音频路径，后续生成
+    item_info['english-audio-path'] = ''  # 英文音频路径，后续生成
+    return item_info
+
+def pending_items(all_items):
+    """items/ 清单中有、目录中还没有的 (事物名称, 类型)，只需要生成这些"""
+    item_names, renamed = load_item_sources()
+    return diff_items(item_names, all_items, renamed)["added"]
 
-def save_items_to_json(items):
-    """保存事物信息到json文件"""
+def batch_custom_id(item_name, item_type):
+    """批量请求的 custom_id，导入结果时据此找回事物"""
+    return f"{item_type}:{item_name}"
+
+def export_batch(output_file, all_items):
+    """把待生成的事物写成 OpenAI 兼容的批量推理请求（每行一个请求），返回请求数"""
+    pending = pending_items(all_items)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for item_name, item_type in pending:
+            request = {
+                "custom_id": batch_custom_id(item_name, item_type),
+                "method": "POST",
+                "url": BATCH_URL,
+                "body": {"model": MODEL, "messages": build_messages(item_name, item_type)},
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    print(f"已导出 {len(pending)} 个批量请求到: {output_file}（模型 {MODEL}）")
+    return len(pending)
+
+def read_batch_result(line):
+    """
+    解析结果文件中的一行
+    返回 (custom_id, 事物信息, 错误信息)
+    """
     try:
-        with open('kid_car_flutter/assets/car.json', 'w', encoding='utf-8') as f:
-            json.dump(items, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"保存car.json文件失败: {e}")
-        return False
+        result = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, None, f"不是有效的JSON: {e}"
+    custom_id = result.get("custom_id")
+    if result.get("error"):
+        return custom_id, None, f"请求失败: {result['error']}"
+    response = result.get("response") or {}
+    if response.get("status_code", 200) != 200:
+        return custom_id, None, f"状态码 {response.get('status_code')}"
+    try:
+        content = response["body"]["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return custom_id, None, "没有回复内容"
+    item_info = parse_item_info(content or "")
+    if not isinstance(item_info, dict):
+        return custom_id, None, "回复中没有事物信息"
+    missing = [field for field in INFO_FIELDS if not str(item_info.get(field) or "").strip()]
+    if missing:
+        return custom_id, None, f"缺少字段 {', '.join(missing)}"
+    return custom_id, item_info, None
+
+def import_batch(result_file, all_items):
+    """
+    逐行读取批量推理的结果并合并到目录
+    只接受待生成事物的结果，同一个事物有多个结果时使用第一个，按清单的顺序追加
+    返回 (合并数, 失败数)
+    """
+    pending = {batch_custom_id(item_name, item_type): (item_name, item_type) for item_name, item_type in pending_items(all_items)}
+    results = {}
+    fail_count = 0
+    with open(result_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            custom_id, item_info, error = read_batch_result(line)
+            if error is None and custom_id not in pending:
+                error = "不是待生成的事物（已生成或不在列表中）"
+            if error is None and custom_id in results:
+                error = "重复的结果"
+            if error:
+                fail_count += 1
+                print(f"✗ 第 {line_number} 行 {custom_id or ''}: {error}")
+                continue
+            results[custom_id] = item_info
+    
+    for custom_id, (item_name, item_type) in pending.items():
+        if custom_id in results:
+            all_items.append(new_catalogue_item(results[custom_id], item_name, item_type))
+    if results:
+        save_catalogue(all_items)
+    print(f"已合并 {len(results)} 个事物信息，失败 {fail_count} 个，还有 {len(pending) - len(results)} 个没有结果")
+    return len(results), fail_count
 
 def main():
     """主函数"""
-    print("开始生成事物信息...")
+    parser = argparse.ArgumentParser(description="生成事物名称、英文名称、描述和音标")
+    parser.add_argument("--export-batch", metavar="文件", help="不调用API，把待生成的事物导出为批量推理请求（JSONL）")
+    parser.add_argument("--import-batch", metavar="文件", help="读取批量推理的结果（JSONL），校验后合并到 car.json")
+    args = parser.parse_args()
     
-    # 事物名称和类型列表
-    item_names = [
-        # 小型车辆
-        ("小汽车", "小型车辆"), ("出租车", "小型车辆"), ("跑车", "小型车辆"), ("越野车", "小型车辆"),
-        ("面包车", "小型车辆"), ("皮卡车", "小型车辆"), ("敞篷车", "小型车辆"), ("老爷车", "小型车辆"),
-        ("电动汽车", "小型车辆"), ("混合动力车", "小型车辆"), ("三轮车", "小型车辆"), ("摩托车", "小型车辆"),
-        ("电动摩托车", "小型车辆"), ("自行车", "小型车辆"), ("电动自行车", "小型车辆"), ("滑板车", "小型车辆"),
-        ("平衡车", "小型车辆"), ("卡丁车", "小型车辆"), ("儿童车", "小型车辆"),
-        
-        # 公共交通
-        ("公交车", "公共交通"), ("双层巴士", "公共交通"), ("校车", "公共交通"), ("长途客车", "公共交通"),
-        ("地铁", "公共交通"), ("轻轨", "公共交通"), ("有轨电车", "公共交通"), ("火车", "公共交通"),
-        ("高铁", "公共交通"), ("动车", "公共交通"), ("磁悬浮列车", "公共交通"), ("单轨列车", "公共交通"), ("缆车", "公共交通"),
-        
-        # 特种车辆
-        ("消防车", "特种车辆"), ("救护车", "特种车辆"), ("警车", "特种车辆"), ("工程车", "特种车辆"),
-        ("押运车", "特种车辆"), ("邮政车", "特种车辆"), ("垃圾车", "特种车辆"), ("洒水车", "特种车辆"),
-        ("清扫车", "特种车辆"), ("除雪车", "特种车辆"), ("道路救援车", "特种车辆"), ("电视转播车", "特种车辆"), ("移动餐车", "特种车辆"),
-        
-        # 工程机械
-        ("挖掘机", "工程机械"), ("推土机", "工程机械"), ("起重机", "工程机械"), ("装载机", "工程机械"),
-        ("压路机", "工程机械"), ("平地机", "工程机械"), ("铲运机", "工程机械"), ("混凝土搅拌车", "工程机械"),
-        ("泵车", "工程机械"), ("塔吊", "工程机械"), ("升降机", "工程机械"), ("叉车", "工程机械"), ("吊车", "工程机械"),
-        
-        # 货运车辆
-        ("货车", "货运车辆"), ("大货车", "货运车辆"), ("厢式货车", "货运车辆"), ("冷藏车", "货运车辆"),
-        ("油罐车", "货运车辆"), ("自卸车", "货运车辆"), ("半挂车", "货运车辆"), ("全挂车", "货运车辆"),
-        ("集装箱卡车", "货运车辆"), ("平板车", "货运车辆"), ("牵引车", "货运车辆"), ("农用车", "货运车辆"), ("三轮货车", "货运车辆"),
-        
-        # 特殊用途车辆
-        ("房车", "特殊用途车辆"), ("露营车", "特殊用途车辆"), ("餐车", "特殊用途车辆"), ("冰淇淋车", "特殊用途车辆"),
-        ("移动图书馆", "特殊用途车辆"), ("献血车", "特殊用途车辆"), ("移动医疗车", "特殊用途车辆"), ("观光车", "特殊用途车辆"),
-        ("高尔夫球车", "特殊用途车辆"), ("机场摆渡车", "特殊用途车辆"), ("无轨电车", "特殊用途车辆"), ("双层观光巴士", "特殊用途车辆"),
-        
-        # 紧急救援车辆
-        ("消防云梯车", "紧急救援车辆"), ("消防指挥车", "紧急救援车辆"), ("急救车", "紧急救援车辆"), ("救援车", "紧急救援车辆"),
-        ("抢险车", "紧急救援车辆"), ("警用摩托车", "紧急救援车辆"), ("防暴车", "紧急救援车辆"), ("装甲车", "紧急救援车辆"),
-        ("运兵车", "紧急救援车辆"), ("通信指挥车", "紧急救援车辆"),
-        
-        # 军用车辆
-        ("坦克", "军用车辆"), ("装甲运兵车", "军用车辆"), ("军用吉普", "军用车辆"), ("军用卡车", "军用车辆"),
-        ("导弹发射车", "军用车辆"), ("雷达车", "军用车辆"),
-        
-        # 航空器
-        ("飞机", "航空器"), ("直升机", "航空器"), ("战斗机", "航空器"), ("轰炸机", "航空器"), ("运输机", "航空器"),
-        ("客机", "航空器"), ("货机", "航空器"), ("水上飞机", "航空器"), ("滑翔机", "航空器"), ("热气球", "航空器"),
-        ("飞艇", "航空器"), ("无人机", "航空器"), ("航天飞机", "航空器"),
-        
-        # 船舶
-        ("轮船", "船舶"), ("客轮", "船舶"), ("货轮", "船舶"), ("油轮", "船舶"), ("集装箱船", "船舶"),
-        ("渡轮", "船舶"), ("游艇", "船舶"), ("帆船", "船舶"), ("渔船", "船舶"), ("拖船", "船舶"),
-        ("驳船", "船舶"), ("气垫船", "船舶"), ("潜水艇", "船舶"), ("破冰船", "船舶"), ("航空母舰", "船舶"),
-        ("巡洋舰", "船舶"), ("驱逐舰", "船舶"), ("护卫舰", "船舶"), ("快艇", "船舶"), ("摩托艇", "船舶"),
-        ("皮划艇", "船舶"), ("龙舟", "船舶"),
-        
-        # 农用机械
-        ("拖拉机", "农用机械"), ("收割机", "农用机械"), ("播种机", "农用机械"), ("插秧机", "农用机械"),
-        ("联合收割机", "农用机械"), ("喷雾器", "农用机械"), ("农用运输车", "农用机械"),
-        
-        # 其他特殊车辆
-        ("月球车", "其他特殊车辆"), ("火星车", "其他特殊车辆"), ("矿用车", "其他特殊车辆"), ("隧道掘进机", "其他特殊车辆"),
-        ("盾构机", "其他特殊车辆"), ("压裂车", "其他特殊车辆"), ("钻井平台", "其他特殊车辆"),
-        
-        # 家具分类
-        ("桌子", "家具"), ("椅子", "家具"), ("沙发", "家具"), ("床", "家具"),
-        ("书架", "家具"), ("衣柜", "家具"), ("茶几", "家具"), ("电视柜", "家具"),
-        ("学习桌", "家具"), ("儿童床", "家具"), ("玩具箱", "家具"), ("鞋柜", "家具"),
-        
-        # 动物分类
-        ("小狗", "动物"), ("小猫", "动物"), ("兔子", "动物"), ("小鸟", "动物"),
-        ("金鱼", "动物"), ("仓鼠", "动物"), ("乌龟", "动物"), ("蝴蝶", "动物"),
-        ("大象", "动物"), ("长颈鹿", "动物"), ("狮子", "动物"), ("熊猫", "动物"),
-        
-        # 天气分类
-        ("太阳", "天气"), ("云朵", "天气"), ("雨", "天气"), ("雪", "天气"),
-        ("彩虹", "天气"), ("风", "天气"), ("雷电", "天气"), ("雾", "天气"),
-        ("冰雹", "天气"), ("霜", "天气"), ("露珠", "天气"), ("星空", "天气"),
-        
-        # 食物分类
-        ("苹果", "食物"), ("香蕉", "食物"), ("面包", "食物"), ("牛奶", "食物"),
-        ("鸡蛋", "食物"), ("饼干", "食物"), ("果汁", "食物"), ("蔬菜", "食物"),
-        ("米饭", "食物"), ("面条", "食物"), ("蛋糕", "食物"), ("冰淇淋", "食物"),
-        
-        # 职业分类
-        ("医生", "职业"), ("护士", "职业"), ("老师", "职业"), ("警察", "职业"),
-        ("消防员", "职业"), ("厨师", "职业"), ("司机", "职业"), ("农民", "职业"),
-        ("宇航员", "职业"), ("运动员", "职业"), ("画家", "职业"), ("音乐家", "职业"),
-        
-        # 水果分类
-        ("苹果", "水果"), ("香蕉", "水果"), ("橙子", "水果"), ("葡萄", "水果"),
-        ("西瓜", "水果"), ("草莓", "水果"), ("梨子", "水果"), ("桃子", "水果"),
-        ("樱桃", "水果"), ("柠檬", "水果"), ("菠萝", "水果"), ("猕猴桃", "水果"),
-        ("芒果", "水果"), ("蓝莓", "水果"), ("柚子", "水果"), ("杏子", "水果"),
-        
-        # 蔬菜分类
-        ("胡萝卜", "蔬菜"), ("西红柿", "蔬菜"), ("黄瓜", "蔬菜"), ("白菜", "蔬菜"),
-        ("土豆", "蔬菜"), ("玉米", "蔬菜"), ("茄子", "蔬菜"), ("南瓜", "蔬菜"),
-        ("豌豆", "蔬菜"), ("花菜", "蔬菜"), ("菠菜", "蔬菜"), ("萝卜", "蔬菜"),
-        ("洋葱", "蔬菜"), ("青椒", "蔬菜"), ("豆角", "蔬菜"), ("冬瓜", "蔬菜"),
-        
-        # 颜色分类
-        ("红色", "颜色"), ("蓝色", "颜色"), ("黄色", "颜色"), ("绿色", "颜色"),
-        ("橙色", "颜色"), ("紫色", "颜色"), ("粉色", "颜色"), ("棕色", "颜色"),
-        ("黑色", "颜色"), ("白色", "颜色"), ("灰色", "颜色"), ("金色", "颜色"),
-        ("银色", "颜色"), ("青色", "颜色"), ("彩虹色", "颜色"), ("透明", "颜色"),
-        
-        # 形状分类
-        ("圆形", "形状"), ("正方形", "形状"), ("三角形", "形状"), ("长方形", "形状"),
-        ("椭圆形", "形状"), ("星形", "形状"), ("心形", "形状"), ("菱形", "形状"),
-        ("梯形", "形状"), ("半圆形", "形状"), ("五角星", "形状"), ("六边形", "形状"),
-        ("圆柱形", "形状"), ("球形", "形状"), ("立方体", "形状"), ("圆锥形", "形状"),
-        
-        # 数字分类
-        ("一", "数字"), ("二", "数字"), ("三", "数字"), ("四", "数字"),
-        ("五", "数字"), ("六", "数字"), ("七", "数字"), ("八", "数字"),
-        ("九", "数字"), ("十", "数字"), ("零", "数字"), ("百", "数字"),
-        ("千", "数字"), ("万", "数字"), ("第一", "数字"), ("最后", "数字"),
-        
-        # 家庭成员分类
-        ("爸爸", "家庭成员"), ("妈妈", "家庭成员"), ("爷爷", "家庭成员"), ("奶奶", "家庭成员"),
-        ("外公", "家庭成员"), ("外婆", "家庭成员"), ("叔叔", "家庭成员"), ("阿姨", "家庭成员"),
-        ("哥哥", "家庭成员"), ("姐姐", "家庭成员"), ("弟弟", "家庭成员"), ("妹妹", "家庭成员"),
-        ("宝宝", "家庭成员"), ("家人", "家庭成员"), ("朋友", "家庭成员"), ("邻居", "家庭成员"),
-        
-        # 身体部位分类
-        ("头", "身体部位"), ("眼睛", "身体部位"), ("鼻子", "身体部位"), ("嘴巴", "身体部位"),
-        ("耳朵", "身体部位"), ("手", "身体部位"), ("脚", "身体部位"), ("胳膊", "身体部位"),
-        ("腿", "身体部位"), ("肚子", "身体部位"), ("背", "身体部位"), ("肩膀", "身体部位"),
-        ("膝盖", "身体部位"), ("手指", "身体部位"), ("脚趾", "身体部位"), ("脸", "身体部位"),
-        
-        # 服装分类
-        ("帽子", "服装"), ("衣服", "服装"), ("裤子", "服装"), ("裙子", "服装"),
-        ("鞋子", "服装"), ("袜子", "服装"), ("手套", "服装"), ("围巾", "服装"),
-        ("外套", "服装"), ("背心", "服装"), ("雨衣", "服装"), ("睡衣", "服装"),
-        ("泳衣", "服装"), ("制服", "服装"), ("领带", "服装"), ("腰带", "服装"),
-        
-        # 玩具分类
-        ("球", "玩具"), ("积木", "玩具"), ("娃娃", "玩具"), ("小汽车", "玩具"),
-        ("拼图", "玩具"), ("气球", "玩具"), ("风筝", "玩具"), ("滑梯", "玩具"),
-        ("秋千", "玩具"), ("木马", "玩具"), ("泰迪熊", "玩具"), ("机器人", "玩具"),
-        ("橡皮泥", "玩具"), ("蜡笔", "玩具"), ("水枪", "玩具"), ("跳绳", "玩具"),
-        
-        # 学习用品分类
-        ("铅笔", "学习用品"), ("橡皮", "学习用品"), ("尺子", "学习用品"), ("剪刀", "学习用品"),
-        ("书本", "学习用品"), ("书包", "学习用品"), ("文具盒", "学习用品"), ("彩笔", "学习用品"),
-        ("作业本", "学习用品"), ("画纸", "学习用品"), ("胶水", "学习用品"), ("订书机", "学习用品"),
-        ("地球仪", "学习用品"), ("计算器", "学习用品"), ("字典", "学习用品"), ("放大镜", "学习用品"),
-        
-        # 日常用品分类
-        ("牙刷", "日常用品"), ("毛巾", "日常用品"), ("肥皂", "日常用品"), ("梳子", "日常用品"),
-        ("杯子", "日常用品"), ("碗", "日常用品"), ("盘子", "日常用品"), ("勺子", "日常用品"),
-        ("筷子", "日常用品"), ("叉子", "日常用品"), ("锅", "日常用品"), ("水壶", "日常用品"),
-        ("钟表", "日常用品"), ("电话", "日常用品"), ("电视", "日常用品"), ("电脑", "日常用品"),
-        
-        # 自然景物分类
-        ("山", "自然景物"), ("河流", "自然景物"), ("湖泊", "自然景物"), ("海洋", "自然景物"),
-        ("森林", "自然景物"), ("草原", "自然景物"), ("沙漠", "自然景物"), ("岛屿", "自然景物"),
-        ("瀑布", "自然景物"), ("火山", "自然景物"), ("冰川", "自然景物"), ("洞穴", "自然景物"),
-        ("沙滩", "自然景物"), ("岩石", "自然景物"), ("花朵", "自然景物"), ("树木", "自然景物"),
-        
-        # 乐器分类
-        ("钢琴", "乐器"), ("小提琴", "乐器"), ("吉他", "乐器"), ("鼓", "乐器"),
-        ("笛子", "乐器"), ("萨克斯", "乐器"), ("长号", "乐器"), ("小号", "乐器"),
-        ("竖琴", "乐器"), ("口琴", "乐器"), ("手风琴", "乐器"), ("电子琴", "乐器"),
-        ("古筝", "乐器"), ("二胡", "乐器"), ("琵琶", "乐器"), ("唢呐", "乐器"),
-        
-        # 运动项目分类
-        ("跑步", "运动项目"), ("游泳", "运动项目"), ("篮球", "运动项目"), ("足球", "运动项目"),
-        ("乒乓球", "运动项目"), ("羽毛球", "运动项目"), ("网球", "运动项目"), ("排球", "运动项目"),
-        ("跳绳", "运动项目"), ("滑冰", "运动项目"), ("滑雪", "运动项目"), ("骑自行车", "运动项目"),
-        ("跳舞", "运动项目"), ("体操", "运动项目"), ("武术", "运动项目"), ("瑜伽", "运动项目"),
-        
-        # 字母分类
-        ("A", "字母"), ("B", "字母"), ("C", "字母"), ("D", "字母"),
-        ("E", "字母"), ("F", "字母"), ("G", "字母"), ("H", "字母"),
-        ("I", "字母"), ("J", "字母"), ("K", "字母"), ("L", "字母"),
-        ("M", "字母"), ("N", "字母"), ("O", "字母"), ("P", "字母"),
-        ("Q", "字母"), ("R", "字母"), ("S", "字母"), ("T", "字母"),
-        ("U", "字母"), ("V", "字母"), ("W", "字母"), ("X", "字母"),
-        ("Y", "字母"), ("Z", "字母"),
-        
-        # 农场动物分类
-        ("奶牛", "农场动物"), ("猪", "农场动物"), ("绵羊", "农场动物"), ("山羊", "农场动物"),
-        ("马", "农场动物"), ("驴", "农场动物"), ("鸡", "农场动物"), ("小鸡", "农场动物"),
-        ("公鸡", "农场动物"), ("鸭子", "农场动物"), ("火鸡", "农场动物"),
-        
-        # 家养宠物分类
-        ("狗", "家养宠物"), ("小狗", "家养宠物"), ("猫", "家养宠物"), ("小猫", "家养宠物"),
-        ("金鱼", "家养宠物"), ("仓鼠", "家养宠物"), ("兔子", "家养宠物"), ("鹦鹉", "家养宠物"),
-        
-        # 野生动物分类
-        ("狮子", "野生动物"), ("老虎", "野生动物"), ("大象", "野生动物"), ("长颈鹿", "野生动物"),
-        ("猴子", "野生动物"), ("熊", "野生动物"), ("狼", "野生动物"), ("狐狸", "野生动物"),
-        ("斑马", "野生动物"), ("袋鼠", "野生动物"),
-        
-        # 鸟类分类
-        ("鸟", "鸟类"), ("鹰", "鸟类"), ("猫头鹰", "鸟类"), ("企鹅", "鸟类"),
-        ("火烈鸟", "鸟类"), ("天鹅", "鸟类"),
-        
-        # 海洋生物分类
-        ("鱼", "海洋生物"), ("鲨鱼", "海洋生物"), ("海豚", "海洋生物"), ("鲸鱼", "海洋生物"),
-        ("章鱼", "海洋生物"), ("水母", "海洋生物"), ("海星", "海洋生物"), ("海马", "海洋生物"),
-        ("螃蟹", "海洋生物"), ("龙虾", "海洋生物"),
-        
-        # 昆虫分类
-        ("蜜蜂", "昆虫"), ("蝴蝶", "昆虫"), ("瓢虫", "昆虫"), ("蚂蚁", "昆虫"),
-        ("蚱蜢", "昆虫"), ("蜘蛛", "昆虫"), ("蚯蚓", "昆虫"), ("蜗牛", "昆虫"),
-        
-        # 肉类与蛋白质分类
-        ("鸡蛋", "肉类与蛋白质"), ("鸡肉", "肉类与蛋白质"), ("肉", "肉类与蛋白质"), ("鱼肉", "肉类与蛋白质"),
-        ("牛肉", "肉类与蛋白质"), ("猪肉", "肉类与蛋白质"), ("火腿", "肉类与蛋白质"), ("香肠", "肉类与蛋白质"), ("豆腐", "肉类与蛋白质"),
-        
-        # 主食与零食分类
-        ("米饭", "主食与零食"), ("面条", "主食与零食"), ("面包", "主食与零食"), ("蛋糕", "主食与零食"),
-        ("饼干", "主食与零食"), ("糖果", "主食与零食"), ("冰淇淋", "主食与零食"), ("巧克力", "主食与零食"),
-        ("奶酪", "主食与零食"), ("披萨", "主食与零食"), ("汉堡", "主食与零食"), ("薯条", "主食与零食"),
-        ("爆米花", "主食与零食"), ("花生酱", "主食与零食"), ("果酱", "主食与零食"),
-        
-        # 饮品分类
-        ("水", "饮品"), ("牛奶", "饮品"), ("果汁", "饮品"), ("茶", "饮品"),
-        ("奶昔", "饮品"), ("酸奶", "饮品"),
-        
-        # 餐具分类
-        ("勺子", "餐具"), ("叉子", "餐具"), ("刀", "餐具"), ("碗", "餐具"),
-        ("盘子", "餐具"), ("杯子", "餐具"), ("筷子", "餐具"), ("餐巾", "餐具"),
-        
-        # 房间分类
-        ("客厅", "房间"), ("卧室", "房间"), ("厨房", "房间"), ("浴室", "房间"), ("花园", "房间"),
-        
-        # 电器分类
-        ("电视", "电器"), ("冰箱", "电器"), ("烤箱", "电器"), ("洗衣机", "电器"),
-        ("风扇", "电器"), ("灯", "电器"),
-        
-        # 基础动词分类
-        ("吃", "基础动词"), ("喝", "基础动词"), ("睡觉", "基础动词"), ("醒来", "基础动词"),
-        ("坐", "基础动词"), ("站", "基础动词"), ("走", "基础动词"), ("跑", "基础动词"),
-        ("跳", "基础动词"), ("单脚跳", "基础动词"), ("爬", "基础动词"), ("跳舞", "基础动词"),
-        ("唱歌", "基础动词"), ("阅读", "基础动词"), ("写作", "基础动词"), ("画画", "基础动词"),
-        ("绘画", "基础动词"), ("烹饪", "基础动词"), ("洗", "基础动词"), ("清洁", "基础动词"),
-        ("刷", "基础动词"), ("哭", "基础动词"), ("笑", "基础动词"), ("微笑", "基础动词"),
-        ("拥抱", "基础动词"), ("亲吻", "基础动词"), ("挥手", "基础动词"), ("玩耍", "基础动词"),
-        ("扔", "基础动词"), ("接住", "基础动词"), ("踢", "基础动词"), ("听", "基础动词"),
-        ("看", "基础动词"), ("看见", "基础动词"), ("挠痒痒", "基础动词"),
-        
-        # 形容词分类
-        ("大的", "形容词"), ("小的", "形容词"), ("小小的", "形容词"), ("巨大的", "形容词"), ("微小的", "形容词"),
-        ("圆的", "形容词"), ("方的", "形容词"), ("三角形的", "形容词"), ("星形的", "形容词"),
-        ("热的", "形容词"), ("冷的", "形容词"), ("温暖的", "形容词"), ("凉爽的", "形容词"),
-        ("饿的", "形容词"), ("饱的", "形容词"), ("渴的", "形容词"), ("累的", "形容词"), ("困的", "形容词"),
-        ("开心的", "形容词"), ("伤心的", "形容词"), ("生气的", "形容词"), ("害怕的", "形容词"), ("兴奋的", "形容词"),
-        ("好的", "形容词"), ("坏的", "形容词"), ("美味的", "形容词"), ("难吃的", "形容词"),
-        ("干净的", "形容词"), ("脏的", "形容词"), ("快的", "形容词"), ("慢的", "形容词"),
-        ("大声的", "形容词"), ("安静的", "形容词"), ("软的", "形容词"), ("硬的", "形容词"),
-        ("粗糙的", "形容词"), ("光滑的", "形容词"), ("重的", "形容词"), ("轻的", "形容词"),
-        
-        # 前置词分类
-        ("在...里面", "前置词"), ("在...上面", "前置词"), ("在...下面", "前置词"), ("在...旁边", "前置词"),
-        ("在...后面", "前置词"), ("在...前面", "前置词"), ("在...之间", "前置词"), ("向上", "前置词"), ("向下", "前置词"),
-        
-        # 社交用语分类
-        ("做得好", "社交用语"), ("干得好", "社交用语"), ("你做到了", "社交用语"), ("我为你骄傲", "社交用语"), ("再试一次", "社交用语"),
-        ("这是什么", "社交用语"), ("...在哪里", "社交用语"), ("你能...吗", "社交用语"), ("我能有...吗", "社交用语"), ("我想要...", "社交用语"),
-        ("我饿了", "社交用语"), ("我渴了", "社交用语"), ("我累了", "社交用语"),
-        
-        # 日常问候与礼貌用语分类
-        ("你好", "日常问候与礼貌用语"), ("再见", "日常问候与礼貌用语"), ("早上好", "日常问候与礼貌用语"), ("晚安", "日常问候与礼貌用语"),
-        ("请", "日常问候与礼貌用语"), ("谢谢", "日常问候与礼貌用语"), ("不客气", "日常问候与礼貌用语"), ("对不起", "日常问候与礼貌用语"),
-        
-        # 动物叫声分类
-        ("喵", "动物叫声"), ("汪", "动物叫声"), ("嘎", "动物叫声"), ("哼", "动物叫声"), ("哞", "动物叫声"),
-        
-        # 动作指令分类
-        ("站起来", "动作指令"), ("坐下", "动作指令"), ("拍拍手", "动作指令"), ("跺跺脚", "动作指令"),
-        ("跳", "动作指令"), ("跑", "动作指令"), ("走", "动作指令"), ("摸", "动作指令"), ("指", "动作指令"),
-        ("吃", "动作指令"), ("喝", "动作指令"), ("睡觉", "动作指令"),
-        
-        # 日常活动分类
-        ("数数", "日常活动"), ("画画", "日常活动"), ("认汽车", "日常活动"), ("吃水果", "日常活动"),
-        ("数楼梯", "日常活动"), ("数玩具", "日常活动"), ("洗澡", "日常活动"), ("穿衣", "日常活动"),
-        ("唱歌", "日常活动"), ("跳舞", "日常活动"), ("玩游戏", "日常活动"), ("看书", "日常活动")
-    ]
-    
-    # 创建客户端
-    client = create_client()
+    start_run("car-name")
     
     # 加载已生成的事物信息
-    all_items = load_existing_items()
+    all_items = load_catalogue()
+    
+    if args.export_batch:
+        export_batch(args.export_batch, all_items)
+        return
+    if args.import_batch:
+        import_batch(args.import_batch, all_items)
+        return
     
-    # 获取已生成的事物名称集合
-    generated_item_names = {item['car-name'] for item in all_items}
+    # 只生成清单和目录的差异（python -m kidcar items 查看）
+    pending = pending_items(all_items)
+    if not pending:
+        print("没有需要生成的事物")
+        return
+    print(f"开始生成事物信息，共 {len(pending)} 个...")
+    
+    # 创建客户端
+    client = create_client()
     
     # 统计信息
     success_count = len(all_items)
     fail_count = 0
     
-    # 为每种事物生成信息
-    for i, (item_name, item_type) in enumerate(item_names, 1):
-        # 跳过已生成的事物
-        if item_name in generated_item_names:
-            print(f"跳过已生成: {item_name} ({item_type})")
-            continue
-        
-        print(f"正在生成第 {i}/{len(item_names)} 个事物信息: {item_name} ({item_type})")
-        
-        item_info = generate_item_info(client, item_name, item_type)
-        
-        if item_info:
+    def generate(job):
+        i, (item_name, item_type) = job
+        print(f"正在生成第 {i}/{len(pending)} 个事物信息: {item_name} ({item_type})")
+        start_time = time.time()
+        with span("item", "modelscope-chat", item=item_name) as item_span:
+            item_info = generate_item_info(client, item_name, item_type)
+            item_span["ok"] = item_info is not None
+        if item_info is None:
+            raise RuntimeError("生成失败")
+        return item_info, time.time() - start_time
+    
+    # 请求按自适应并发发出（kidcar.concurrency），结果按清单顺序写入目录
+    finished = {}
+    next_index = 1
+    for (i, _), result, error in run_adaptive(enumerate(pending, 1), generate, "modelscope-chat"):
+        finished[i] = result
+        while next_index in finished:
+            result = finished.pop(next_index)
+            item_name, item_type = pending[next_index - 1]
+            next_index += 1
+            if result is None:
+                fail_count += 1
+                print(f"✗ 生成失败: {item_name} ({item_type})")
+                continue
+            item_info, seconds = result
+            # 记录吞吐量，供 plan_generation.py 估算
+            record_throughput("modelscope-chat", seconds)
             # 添加事物类型和初始路径
-            item_info['car-name'] = item_name
-            item_info['car-type'] = item_type
-            item_info['car-image-path'] = ''  # 图片路径，后续生成
-            item_info['chinese-audio-path'] = ''  # 中文音频路径，后续生成
-            item_info['english-audio-path'] = ''  # 英文音频路径，后续生成
-            
-            all_items.append(item_info)
+            all_items.append(new_catalogue_item(item_info, item_name, item_type))
             success_count += 1
             print(f"✓ 成功生成: {item_info['car-name']} ({item_type})")
             
             # 每生成一个就保存一次
-            if save_items_to_json(all_items):
-                print(f"  已保存到 car.json")
-            else:
-                print(f"  保存失败！")
-        else:
-            fail_count += 1
-            print(f"✗ 生成失败: {item_name} ({item_type})")
-        
-        # 添加延迟避免请求过快
-        import time
-        time.sleep(1)
+            with span("save-json"):
+                save_catalogue(all_items)
+            print(f"  已保存到 car.json")
     
     print(f"\n完成！共生成 {success_count} 个事物信息，失败 {fail_count} 个")
     print(f"结果已保存到: car.json")
 
 if __name__ == "__main__":
-    main()
+    run_main(main, "car-name")
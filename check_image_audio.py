@@ -1,25 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
 import os
 import sys
 from pathlib import Path
 
-def load_json_file(file_path):
-    """加载JSON文件"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"错误：找不到文件 {file_path}")
-        return None
-    except json.JSONDecodeError:
-        print(f"错误：文件 {file_path} 不是有效的JSON格式")
-        return None
-    except Exception as e:
-        print(f"错误：加载文件 {file_path} 时发生异常：{str(e)}")
-        return None
+from kidcar.catalog import ASSET_FIELDS, AUDIO_FIELDS, DESCRIPTION_FIELD, SEQUENCE_FIELD, iter_catalogue
+from kidcar.profiling import run_main
+
+# 可选的音频变体、拼接的播放音频和描述朗读字段，只检查已经生成的
+AUDIO_VARIANT_FIELDS = [field for field in AUDIO_FIELDS if field not in ("chinese-audio-path", "english-audio-path")] + [SEQUENCE_FIELD, DESCRIPTION_FIELD]
 
 def check_file_exists(file_path, item_name, file_type):
     """检查文件是否存在"""
@@ -38,47 +28,64 @@ def check_file_exists(file_path, item_name, file_type):
         print(f"警告：{item_name} 的 {file_type} 文件不存在: {file_path}")
         return False
 
+def check_item(item):
+    """检查一个条目的图片和音频文件，返回 (缺失文件数, 检查文件数)"""
+    item_name = item.get("car-name", "未知项目")
+    missing_files = 0
+    total_checks = 0
+    
+    # 检查图片文件
+    image_path = item.get("car-image-path", "")
+    total_checks += 1
+    if not check_file_exists(image_path, item_name, "图片"):
+        missing_files += 1
+    
+    # 检查中文音频文件
+    chinese_audio_path = item.get("chinese-audio-path", "")
+    total_checks += 1
+    if not check_file_exists(chinese_audio_path, item_name, "中文音频"):
+        missing_files += 1
+    
+    # 检查英文音频文件
+    english_audio_path = item.get("english-audio-path", "")
+    total_checks += 1
+    if not check_file_exists(english_audio_path, item_name, "英文音频"):
+        missing_files += 1
+    
+    # 检查已生成的口音、语速变体音频
+    for field in AUDIO_VARIANT_FIELDS:
+        variant_path = item.get(field, "")
+        if not variant_path:
+            continue
+        total_checks += 1
+        if not check_file_exists(variant_path, item_name, field):
+            missing_files += 1
+    
+    return missing_files, total_checks
+
 def check_image_audio_files(json_file_path):
     """检查JSON文件中的图片和音频文件是否存在"""
     print(f"开始检查文件: {json_file_path}")
     
-    # 加载JSON数据
-    data = load_json_file(json_file_path)
-    if data is None:
-        return False
-    
-    if not isinstance(data, list):
-        print(f"错误：JSON文件内容格式不正确，应该是一个数组")
-        return False
-    
-    print(f"共找到 {len(data)} 个条目需要检查")
+    # 流式读取目录，只保留名称和资源路径
+    data = iter_catalogue(json_file_path, ("car-name", *ASSET_FIELDS))
     
     missing_files = 0
     total_checks = 0
+    item_count = 0
     
-    for item in data:
-        item_name = item.get("car-name", "未知项目")
-        
-        # 检查图片文件
-        image_path = item.get("car-image-path", "")
-        total_checks += 1
-        if not check_file_exists(image_path, item_name, "图片"):
-            missing_files += 1
-        
-        # 检查中文音频文件
-        chinese_audio_path = item.get("chinese-audio-path", "")
-        total_checks += 1
-        if not check_file_exists(chinese_audio_path, item_name, "中文音频"):
-            missing_files += 1
-        
-        # 检查英文音频文件
-        english_audio_path = item.get("english-audio-path", "")
-        total_checks += 1
-        if not check_file_exists(english_audio_path, item_name, "英文音频"):
-            missing_files += 1
+    try:
+        for item in data:
+            item_count += 1
+            missing, checks = check_item(item)
+            missing_files += missing
+            total_checks += checks
+    except ValueError as e:
+        print(f"错误：文件 {json_file_path} 不是有效的JSON格式: {e}")
+        return False
     
     print("\n检查完成！")
-    print(f"总共检查了 {len(data)} 个条目，{total_checks} 个文件")
+    print(f"总共检查了 {item_count} 个条目，{total_checks} 个文件")
     print(f"缺失文件数量：{missing_files}")
     print(f"文件完整性：{((total_checks - missing_files) / total_checks * 100):.1f}%")
     
@@ -107,4 +114,4 @@ def main():
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_main(main, "check_image_audio")
\ No newline at end of file
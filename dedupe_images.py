@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片去重脚本
+计算 kid_car_flutter/assets/images 中图片的感知哈希，报告完全相同和近似重复的图片，
+可以把完全相同的文件改成硬链接，并把重复的图片标记为需要重新生成
+"""
+
+from kidcar.dedupe import main
+from kidcar.profiling import run_main
+
+if __name__ == "__main__":
+    run_main(main, "dedupe_images")
@@ -1,42 +1,44 @@
+import argparse
 import os
-import json
 import time
-import requests
-import yaml
-from PIL import Image
-from io import BytesIO
 
-# 配置常量
-CONFIG_FILE = "local.yaml"
-CAR_JSON_FILE = "kid_car_flutter/assets/car.json"
-IMAGES_DIR = "kid_car_flutter/assets/images"
+from kidcar.assets import scan_assets
+from kidcar.catalog import IMAGES_DIR, load_catalogue, save_catalogue
+from kidcar.concurrency import run_adaptive
+from kidcar.config import get_proxies, get_section
+from kidcar.fingerprint import image_fingerprint, is_asset_up_to_date, set_fingerprint
+from kidcar.history import record_throughput
+from kidcar.metrics import span, start_run, traced_request
+from kidcar.profiling import run_main
+from kidcar.quality import QualityGate
+from kidcar.scoring import add_reference, load_reference_hashes, pick_best
+from kidcar.state import is_quarantined, mark_failed, recover_downloads, write_asset
 
 # 豆包API配置
 BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
 IMAGE_MODEL = "doubao-seedream-3-0-t2i-250415"
 
+# 运行指标和吞吐量历史中的服务商名称
+PROVIDER = "doubao-image"
+
+# 资源字段
+FIELD = "car-image-path"
+
 # API密钥和代理配置
 API_KEYS = []
 CURRENT_API_KEY_INDEX = 0
 PROXIES = None
 
 def load_config():
-    """加载配置文件"""
+    """从 local.yaml 读取豆包API密钥和代理配置"""
     global API_KEYS, PROXIES
     
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    doubao = get_section("Doubao")
+    if "ApiKey" in doubao:
+        API_KEYS.append(doubao["ApiKey"])
     
-    # 读取豆包API密钥
-    if "Doubao" in config and "ApiKey" in config["Doubao"]:
-        API_KEYS.append(config["Doubao"]["ApiKey"])
-    
-    # 读取代理配置
-    if "Proxy" in config:
-        PROXIES = {
-            "http": config["Proxy"].get("HttpProxy"),
-            "https": config["Proxy"].get("HttpsProxy")
-        }
+    PROXIES = get_proxies()
+    if PROXIES:
         print(f"已配置代理: {PROXIES}")
 
 def get_next_api_key():
@@ -49,133 +51,192 @@ def get_next_api_key():
     CURRENT_API_KEY_INDEX = (CURRENT_API_KEY_INDEX + 1) % len(API_KEYS)
     return api_key
 
-def load_cars_data():
-    """加载车辆数据"""
-    if not os.path.exists(CAR_JSON_FILE):
-        return []
-    
-    with open('kid_car_flutter/assets/car.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+def build_prompt(car_name, car_type):
+    """创建提示词，明确要求不要出现人物"""
+    if car_type in ['家具', '动物', '天气', '食物', '职业']:
+        return f"一个{car_name}，{car_type}，卡通风格，儿童友好，明亮色彩，简单易懂"
+    return f"一辆{car_name}，{car_type}，卡通风格，儿童友好，明亮色彩，简洁背景，不要出现人物，不要出现人，不要有人脸，不要有人形，纯车辆展示"
 
-def save_cars_data(cars_data):
-    """保存车辆数据"""
-    with open('kid_car_flutter/assets/car.json', 'w', encoding='utf-8') as f:
-        json.dump(cars_data, f, ensure_ascii=False, indent=2)
+def car_fingerprint(car):
+    """图片输入（提示词、模型）的指纹"""
+    return image_fingerprint(build_prompt(car["car-name"], car["car-type"]), IMAGE_MODEL)
 
-def generate_car_image(car_name, car_type):
-    """使用豆包API生成车辆图片"""
-    # 创建提示词，明确要求不要出现人物
-    if car_type in ['家具', '动物', '天气', '食物', '职业']:
-        prompt = f"一个{car_name}，{car_type}，卡通风格，儿童友好，明亮色彩，简单易懂"
-    else:
-        prompt = f"一辆{car_name}，{car_type}，卡通风格，儿童友好，明亮色彩，简洁背景，不要出现人物，不要出现人，不要有人脸，不要有人形，纯车辆展示"
-    
-    try:
-        # 发送图片生成请求
-        api_key = get_next_api_key()
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": IMAGE_MODEL,
-            "prompt": prompt,
-            "n": 1,
-            "size": "1024x1024",
-            "watermark": False
-        }
-        
-        response = requests.post(
-            f"{BASE_URL}/images/generations",
-            headers=headers,
-            json=data,
-            proxies=PROXIES if PROXIES else None
-        )
-        
-        if response.status_code != 200:
-            print(f"✗ 图片生成失败: {car_name}, 状态码: {response.status_code}, 错误: {response.text}")
-            return None
-        
-        result = response.json()
-        if "data" not in result or len(result["data"]) == 0:
-            print(f"✗ 图片生成失败: {car_name}, 响应格式错误")
-            return None
-        
-        image_url = result["data"][0]["url"]
-        
-        # 下载生成的图片
-        image_response = requests.get(image_url, proxies=PROXIES if PROXIES else None)
+def fetch_car_image(car, candidates=1, reference=None):
+    """
+    使用豆包API生成并下载车辆图片，返回图片数据，失败时抛出异常
+    candidates 大于1时一次请求多张候选图片，在本地评分后只返回最好的一张
+    reference 为已有图片的感知哈希（见 kidcar.scoring），条目自己的旧图片不参与比较
+    只读取条目，可以在线程中并发调用
+    """
+    car_name = car["car-name"]
+    prompt = build_prompt(car_name, car["car-type"])
+    
+    # 发送图片生成请求
+    api_key = get_next_api_key()
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    
+    data = {
+        "model": IMAGE_MODEL,
+        "prompt": prompt,
+        "n": candidates,
+        "size": "1024x1024",
+        "watermark": False
+    }
+    
+    response = traced_request(
+        "POST",
+        f"{BASE_URL}/images/generations",
+        "submit",
+        PROVIDER,
+        api_key,
+        car_name,
+        headers=headers,
+        json=data,
+        proxies=PROXIES if PROXIES else None
+    )
+    
+    if response.status_code != 200:
+        raise RuntimeError(f"状态码: {response.status_code}, 错误: {response.text}")
+    
+    result = response.json()
+    if "data" not in result or len(result["data"]) == 0:
+        raise RuntimeError("响应格式错误")
+    
+    # 下载生成的图片
+    image_contents = []
+    for image in result["data"]:
+        image_response = traced_request("GET", image["url"], "download", PROVIDER, item=car_name, proxies=PROXIES if PROXIES else None)
         if image_response.status_code != 200:
             print(f"✗ 图片下载失败: {car_name}")
-            return None
-        
-        # 确保images目录存在
-        os.makedirs(IMAGES_DIR, exist_ok=True)
-        
-        # 保存图片
-        image_filename = f"{car_name}_{car_type}.jpg"
-        image_path = os.path.join(IMAGES_DIR, image_filename)
-        
-        with open(image_path, 'wb') as f:
-            f.write(image_response.content)
-        
-        print(f"✓ 图片生成成功: {image_path}")
-        return image_path
-        
-    except Exception as e:
-        print(f"✗ 图片生成失败: {car_name}, 错误: {str(e)}")
-        return None
+            continue
+        image_contents.append(image_response.content)
+    if not image_contents:
+        raise RuntimeError("图片下载失败")
+    
+    # 多张候选时在本地评分，选出最好的一张
+    content = image_contents[0]
+    if len(image_contents) > 1:
+        with span("score", PROVIDER, item=car_name):
+            content, _ = pick_best(image_contents, reference, car.get(FIELD))
+        if content is None:
+            raise RuntimeError("候选图片都无法读取")
+    return content
+
+def save_car_image(car, cars_data, content):
+    """保存图片，按 downloaded -> committed 的顺序写入目录，返回图片路径"""
+    image_filename = f"{car['car-name']}_{car['car-type']}.jpg"
+    image_path = os.path.join(IMAGES_DIR, image_filename)
+    write_asset(cars_data, car, FIELD, image_path, content)
+    print(f"✓ 图片生成成功: {image_path}")
+    return image_path
+
+def record_failure(car, cars_data, error):
+    """记录失败次数并保存目录"""
+    print(f"✗ 图片生成失败: {car['car-name']}, 错误: {str(error)}")
+    mark_failed(car, FIELD, error)
+    with span("save-json"):
+        save_catalogue(cars_data)
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="生成车辆图片")
+    parser.add_argument("--regenerate", action="store_true", help="只重新生成输入（提示词、模型）已变化的图片")
+    parser.add_argument("--candidates", type=int, default=1, metavar="N", help="每次请求生成N张候选图片，在本地评分后保存最好的一张")
+    parser.add_argument("--no-qa", action="store_true", help="不检查图片质量")
+    args = parser.parse_args()
+    
+    start_run("doubao-generate-image")
+    
     # 加载配置
     load_config()
     
     # 加载车辆数据
-    cars_data = load_cars_data()
+    cars_data = load_catalogue()
     if not cars_data:
         print("没有找到车辆数据")
         return
     
     print(f"找到 {len(cars_data)} 个车辆数据")
     
-    # 统计需要生成图片的车辆数量
-    need_generate_count = 0
-    for car in cars_data:
-        if not car.get("car-image-path"):
-            need_generate_count += 1
+    # 恢复上次在下载和写入目录之间中断的图片
+    recovered = recover_downloads(cars_data, (FIELD,))
+    for car, field, _ in recovered:
+        set_fingerprint(car, field, car_fingerprint(car))
+    if recovered:
+        save_catalogue(cars_data)
+        print(f"恢复了 {len(recovered)} 张上次已下载的图片")
+    
+    # 统计需要生成图片的车辆数量（已有图片路径的跳过，--regenerate 模式下比较输入指纹，已隔离的跳过）
+    pending_cars = [
+        car for car in cars_data
+        if not is_quarantined(car, FIELD)
+        and not is_asset_up_to_date(car, FIELD, car_fingerprint(car), args.regenerate)
+    ]
+    need_generate_count = len(pending_cars)
+    quarantined_count = sum(1 for car in cars_data if is_quarantined(car, FIELD))
     
-    print(f"其中 {need_generate_count} 个车辆需要生成图片")
+    print(f"其中 {need_generate_count} 个车辆需要生成图片" + (f"，{quarantined_count} 个已隔离（python -m kidcar state --release 解除）" if quarantined_count else ""))
     
-    # 处理每个车辆
+    # 保存新记录的指纹基线
+    if args.regenerate:
+        save_catalogue(cars_data)
+    
+    # 候选图片和已有图片比较差异度
+    reference = None
+    if args.candidates > 1 and pending_cars:
+        reference = load_reference_hashes(scan_assets())
+        print(f"每次请求 {args.candidates} 张候选图片，参考图片 {len(reference)} 张")
+    
+    # 请求和下载按自适应并发进行（kidcar.concurrency），写入目录在主线程中完成
+    # 每个任务带一份当时的参考哈希，主线程之后加入的图片不影响正在评分的任务
+    def fetch(job):
+        car, job_reference = job
+        print(f"正在生成图片: {car['car-name']} ({car['car-type']})")
+        start_time = time.time()
+        with span("item", PROVIDER, item=car["car-name"]) as item_span:
+            content = fetch_car_image(car, args.candidates, job_reference)
+            item_span["ok"] = True
+        return content, time.time() - start_time
+    
+    jobs = ((car, dict(reference) if reference is not None else None) for car in pending_cars)
+    # 保存后的图片在后台进程中做质量检查，没有通过的标记为需要重新生成
+    gate = None if args.no_qa else QualityGate(FIELD)
     generated_count = 0
-    for car in cars_data:
-        # 如果已经有图片路径，跳过
-        if car.get("car-image-path"):
-            continue
-        
+    for (car, _), result, error in run_adaptive(jobs, fetch, PROVIDER):
         car_name = car["car-name"]
-        car_type = car["car-type"]
-        
-        print(f"正在生成图片: {car_name} ({car_type})")
-        
-        # 生成图片
-        image_path = generate_car_image(car_name, car_type)
-        if image_path:
-            # 更新车辆数据
-            # 将完整路径转换为相对于assets目录的路径
-            relative_path = image_path.replace('kid_car_flutter/', '')
-            car["car-image-path"] = relative_path
-            # 立即保存到JSON文件
-            save_cars_data(cars_data)
-            generated_count += 1
-            print(f"已更新JSON文件: {car_name}")
-        
-        # 添加延迟，避免请求过于频繁
-        time.sleep(2)
+        if error:
+            record_failure(car, cars_data, error)
+            continue
+        content, elapsed = result
+        try:
+            image_path = save_car_image(car, cars_data, content)
+        except OSError as e:
+            record_failure(car, cars_data, e)
+            continue
+        # 记录吞吐量，供 plan_generation.py 估算
+        record_throughput(PROVIDER, elapsed, len(content), calls=1 + args.candidates)
+        # 图片路径已由 write_asset 写入，记录指纹
+        if reference is not None:
+            add_reference(reference, car[FIELD], content)
+        set_fingerprint(car, FIELD, car_fingerprint(car))
+        if gate is not None:
+            gate.submit(car, image_path)
+            gate.collect()
+        # 立即保存到JSON文件
+        with span("save-json"):
+            save_catalogue(cars_data)
+        generated_count += 1
+        print(f"已更新JSON文件: {car_name}")
     
+    if gate is not None:
+        with span("qa"):
+            counts = gate.close()
+        save_catalogue(cars_data)
+        print(f"质量检查: 通过 {counts['passed']} 张，重新生成 {counts['requeued']} 张，隔离 {counts['quarantined']} 张")
     print(f"图片生成完成，共生成 {generated_count} 张图片")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_main(main, "doubao-generate-image")
\ No newline at end of file
@@ -1,153 +1,261 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
 import json
-import yaml
 import os
 import requests
 import time
 from pathlib import Path
-from urllib.parse import quote
+from xml.sax.saxutils import escape
 
-def load_config():
-    """加载配置文件"""
-    with open('local.yaml', 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+from kidcar.assets import replace_asset_file
+from kidcar.catalog import AUDIO_FIELDS, expected_asset_path, load_catalogue, save_catalogue, to_disk_path
+from kidcar.concurrency import get_controller, run_adaptive
+from kidcar.config import load_config
+from kidcar.fingerprint import AUDIO_VOICES, BASE_VOICES, VOICE_FIELDS, audio_fingerprint, is_asset_up_to_date, set_fingerprint, voice_prosody
+from kidcar.history import record_throughput
+from kidcar.metrics import count, key_label, span, start_run, traced_request
+from kidcar.mp3 import split_on_silence
+from kidcar.profiling import run_main
+from kidcar.sequence import build_sequences
+from kidcar.state import is_quarantined, mark_committed, mark_failed
+from kidcar.tts import EDGE_PROVIDER, check_local_engine, generate_audio, parse_provider_overrides, synthesize_local_many, tts_settings, voice_inputs, voice_provider
 
-def load_car_data():
-    """加载车辆数据"""
-    with open('kid_car_flutter/assets/car.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+# 合成服务（并发控制器和统计中的名称）
+PROVIDER = EDGE_PROVIDER
 
-def save_car_data(car_data):
-    """保存车辆数据"""
-    with open('kid_car_flutter/assets/car.json', 'w', encoding='utf-8') as f:
-        json.dump(car_data, f, ensure_ascii=False, indent=2)
+# 批量合成: 语音类型 -> SSML 语言
+VOICE_LANGUAGES = {"chinese": "zh-CN", "english": "en-US", "english-gb": "en-GB", "english-slow": "en-US", "chinese-slow": "zh-CN"}
 
-def generate_audio(text, output_path, voice_type="chinese", config=None):
+# 批量合成时条目之间插入的停顿，切分时按静音段找回每个条目
+BATCH_BREAK_MS = 1200
+
+# 批量合成的输出格式，和逐条合成得到的文件一致（MPEG-2、24kHz、单声道、96kbps）
+BATCH_FORMAT = "audio-24khz-96kbitrate-mono-mp3"
+
+def process_car_audio(car_data, config, settings=None, regenerate=False, voice_types=BASE_VOICES, workers=None):
     """
-    调用微软TTS生成音频文件
-    使用Python requests库替代curl
+    逐条合成音频
+    所有语音（包括口音和语速变体）的任务一起按自适应并发执行，同一个输出文件只合成一次
+    workers 为固定并发数，不指定时由 kidcar.concurrency 按服务的响应调整
     """
-    if config is None:
-        raise ValueError("配置不能为空")
+    # 确保audios目录存在
+    Path('kid_car_flutter/assets/audios').mkdir(exist_ok=True)
     
-    # 从配置中获取Edge设置
+    tasks = collect_audio_tasks(car_data, regenerate, settings, voice_types)
+    jobs = [(voice_type, output_path, text, targets) for voice_type, voice_tasks in tasks.items() for output_path, text, targets in voice_tasks]
+    print(f"需要生成 {len(jobs)} 个音频文件（{'、'.join(voice_types)}），{f'{workers} 个并发' if workers else '自适应并发'}")
+    
+    def synthesize(job):
+        voice_type, output_path, text, _ = job
+        start_time = time.time()
+        with span("item", PROVIDER, item=text) as item_span:
+            item_span["ok"] = generate_audio(text, output_path, voice_type, config)
+        if not item_span["ok"]:
+            raise RuntimeError("TTS请求失败")
+        return time.time() - start_time
+    
+    generated_count = 0
+    for (voice_type, output_path, text, targets), seconds, error in run_adaptive(jobs, synthesize, PROVIDER, workers):
+        if error:
+            print(f"  {voice_type} 音频生成失败，跳过: {text}")
+            for car, field, _ in targets:
+                mark_failed(car, field, str(error))
+            continue
+        record_throughput(PROVIDER, seconds, os.path.getsize(output_path))
+        
+        # 将完整路径转换为相对于assets目录的路径
+        relative_path = output_path.replace('kid_car_flutter/', '')
+        for car, field, fingerprint in targets:
+            mark_committed(car, field, relative_path)
+            set_fingerprint(car, field, fingerprint)
+        # 立即保存更新
+        with span("save-json"):
+            save_catalogue(car_data)
+        generated_count += 1
+        print(f"  已更新 {voice_type} 音频路径: {relative_path}")
+    
+    print(f"\n处理完成！共生成 {generated_count}/{len(jobs)} 个音频文件")
+    return car_data
+
+def build_batch_ssml(texts, voice_type):
+    """把同一语音的多条文本放进一个SSML文档，条目之间插入固定时长的停顿"""
+    voice = AUDIO_VOICES[voice_type].replace('+', ' ')
+    prosody = " ".join(f'{key}="{value:+d}%"' for key, value in voice_prosody(voice_type).items())
+    separator = f'<break time="{BATCH_BREAK_MS}ms"/>'
+    body = separator.join(escape(text) for text in texts)
+    return (
+        f'<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{VOICE_LANGUAGES[voice_type]}">'
+        f'<voice name="{voice}"><prosody {prosody}>{body}</prosody></voice></speak>'
+    )
+
+def synthesize_batch(texts, voice_type, config):
+    """
+    一次请求合成多条文本，按停顿切分成每条文本的MP3数据
+    切分结果和文本数量对不上时返回 None
+    """
     edge_config = config.get('Edge', {})
     base_url = edge_config.get('BaseUrl', 'https://ms-ra-forwarder-silk-ten.vercel.app')
     token = edge_config.get('Token', '')
-    
     if not token:
         raise ValueError("Edge配置中缺少Token")
     
-    # 根据语言类型选择不同的语音
-    if voice_type == "chinese":
-        voice = "Microsoft+Server+Speech+Text+to+Speech+Voice+(zh-CN,+XiaoxiaoNeural)"
-    else:  # english
-        voice = "Microsoft+Server+Speech+Text+to+Speech+Voice+(en-US,+JennyNeural)"
-    
-    # 构建请求URL - 手动构建查询字符串以避免requests的自动编码
-    query_string = f"voice={voice}&volume=0&rate=0&pitch=0&text={quote(text)}"
-    api_url = f"{base_url}/api/text-to-speech?{query_string}"
-    
+    # ms-ra-forwarder 的 SSML 接口
+    api_url = f"{base_url}{edge_config.get('SsmlPath', '/api/ra')}"
     headers = {
-        'Authorization': f'Bearer {token}'
+        'Authorization': f'Bearer {token}',
+        'Content-Type': 'application/ssml+xml',
+        'Format': BATCH_FORMAT,
     }
+    ssml = build_batch_ssml(texts, voice_type)
     
     try:
-        print(f"  请求URL: {api_url}")
-        
-        # 发送GET请求
-        response = requests.get(api_url, headers=headers, stream=True)
+        response = traced_request("POST", api_url, "tts-batch", "edge-tts", token, f"{len(texts)} 条",
+                                  headers=headers, data=ssml.encode('utf-8'), timeout=120)
         response.raise_for_status()
-        
-        # 保存音频文件
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        
-        # 检查文件是否成功创建且大小大于0
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            print(f"  成功生成音频文件: {output_path} (大小: {os.path.getsize(output_path)} bytes)")
-            return True
-        else:
-            print(f"  生成音频文件失败: {output_path}")
-            return False
-            
     except requests.exceptions.RequestException as e:
-        print(f"  调用TTS API失败: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"  响应状态码: {e.response.status_code}")
-            print(f"  响应内容: {e.response.text}")
-        return False
-    except Exception as e:
-        print(f"  生成音频时发生错误: {e}")
-        return False
+        print(f"  批量调用TTS API失败: {e}")
+        return None
+    
+    clips = split_on_silence(response.content, len(texts))
+    if clips is None:
+        print(f"  批量音频中找不到 {len(texts) - 1} 个停顿，无法切分")
+    return clips
 
-def process_car_audio(car_data, config):
-    """处理车辆音频生成"""
-    # 确保audios目录存在
+def collect_audio_tasks(car_data, regenerate=False, settings=None, voice_types=BASE_VOICES):
+    """
+    收集需要生成的音频，按输出文件合并（同一个英文名只合成一次）
+    settings 为 TTS 配置，用于计算当前合成引擎的指纹
+    返回 {语音类型: [(输出文件, 文本, [(车辆, 字段, 指纹)])]}
+    """
+    tasks = {}
+    by_output = {}
+    fields = [VOICE_FIELDS[voice_type] for voice_type in voice_types]
+    for car in car_data:
+        for field in fields:
+            text_field, voice_type, _ = AUDIO_FIELDS[field]
+            # 连续失败被隔离的不再自动重试
+            if is_quarantined(car, field):
+                continue
+            fingerprint = audio_fingerprint(car, field, voice_inputs(voice_type, settings) if settings else None)
+            if is_asset_up_to_date(car, field, fingerprint, regenerate):
+                continue
+            output_path = to_disk_path(expected_asset_path(car, field))
+            task = by_output.get(output_path)
+            if task is None:
+                task = (output_path, car[text_field], [])
+                by_output[output_path] = task
+                tasks.setdefault(voice_type, []).append(task)
+            task[2].append((car, field, fingerprint))
+    return tasks
+
+def process_car_audio_batch(car_data, config, batch_size, regenerate=False, voice_types=BASE_VOICES):
+    """
+    批量处理车辆音频生成
+    同一语音的条目每 batch_size 条合成一次，切分失败的批次退回逐条合成
+    """
     Path('kid_car_flutter/assets/audios').mkdir(exist_ok=True)
+    token = config.get('Edge', {}).get('Token', '')
+    tasks = collect_audio_tasks(car_data, regenerate, voice_types=voice_types)
+    total = sum(len(voice_tasks) for voice_tasks in tasks.values())
+    print(f"需要生成 {total} 个音频文件，每批 {batch_size} 条")
     
-    total_cars = len(car_data)
-    processed_count = 0
-    
-    for i, car in enumerate(car_data):
-        print(f"处理第 {i+1}/{total_cars} 个车辆: {car['car-name']}")
-        
-        # 检查是否已经生成了音频文件
-        chinese_audio_generated = car.get('chinese-audio-path', '').strip() != ''
-        english_audio_generated = car.get('english-audio-path', '').strip() != ''
-        
-        if chinese_audio_generated and english_audio_generated:
-            print(f"  跳过 {car['car-name']} - 音频文件已存在")
-            processed_count += 1
-            continue
-        
-        # 生成中文音频
-        if not chinese_audio_generated:
-            chinese_filename = f"kid_car_flutter/assets/audios/{car['car-name']}_zh.mp3"
-            print(f"  生成中文音频: {chinese_filename}")
+    generated_count = 0
+    for voice_type, voice_tasks in tasks.items():
+        for start in range(0, len(voice_tasks), batch_size):
+            batch = voice_tasks[start:start + batch_size]
+            print(f"批量生成 {voice_type} 音频 {start + 1}-{start + len(batch)}/{len(voice_tasks)}")
             
-            if generate_audio(car['car-name'], chinese_filename, "chinese", config):
-                # 将完整路径转换为相对于assets目录的路径
-                relative_path = chinese_filename.replace('kid_car_flutter/', '')
-                car['chinese-audio-path'] = relative_path
-                # 立即保存更新
-                save_car_data(car_data)
-                print(f"  已更新中文音频路径: {chinese_filename}")
+            start_time = time.time()
+            clips = synthesize_batch([text for _, text, _ in batch], voice_type, config)
+            if clips is None:
+                # 整批失败后逐条重新合成
+                count("retries", len(batch), provider="edge-tts", key=key_label(token))
             else:
-                print(f"  中文音频生成失败，跳过此车辆")
-                continue
-        
-        # 生成英文音频
-        if not english_audio_generated:
-            english_filename = f"kid_car_flutter/assets/audios/{car['car-english-name']}_en.mp3"
-            print(f"  生成英文音频: {english_filename}")
+                # 历史按单个条目平滑，一批只调用一次API，按条目数平摊
+                record_throughput("edge-tts", (time.time() - start_time) / len(batch), sum(len(clip) for clip in clips) / len(batch), calls=1 / len(batch))
             
-            if generate_audio(car['car-english-name'], english_filename, "english", config):
+            for i, (output_path, text, targets) in enumerate(batch):
+                if clips is None:
+                    # 退回逐条合成
+                    with span("item", "edge-tts", item=text) as item_span:
+                        item_span["ok"] = generate_audio(text, output_path, voice_type, config)
+                    if not item_span["ok"]:
+                        print(f"  音频生成失败，跳过: {text}")
+                        for car, field, _ in targets:
+                            mark_failed(car, field, "TTS请求失败")
+                        continue
+                else:
+                    tmp_path = f"{output_path}.part"
+                    with open(tmp_path, 'wb') as f:
+                        f.write(clips[i])
+                    count("bytes", len(clips[i]), provider="edge-tts", key=key_label(token))
+                    replace_asset_file(tmp_path, output_path)
+                
                 # 将完整路径转换为相对于assets目录的路径
-                relative_path = english_filename.replace('kid_car_flutter/', '')
-                car['english-audio-path'] = relative_path
-                # 立即保存更新
-                save_car_data(car_data)
-                print(f"  已更新英文音频路径: {english_filename}")
-            else:
-                print(f"  英文音频生成失败，跳过此车辆")
+                relative_path = output_path.replace('kid_car_flutter/', '')
+                for car, field, fingerprint in targets:
+                    mark_committed(car, field, relative_path)
+                    set_fingerprint(car, field, fingerprint)
+                generated_count += 1
+                print(f"  {relative_path} ({os.path.getsize(output_path)} bytes)")
+            
+            # 每批保存一次
+            with span("save-json"):
+                save_catalogue(car_data)
+            
+            # 服务返回 429 或超时后等待，正常时直接发出下一批
+            with span("pacing"):
+                get_controller(PROVIDER).wait_ready()
+    
+    print(f"\n处理完成！共生成 {generated_count}/{total} 个音频文件")
+    return car_data
+
+def process_car_audio_local(car_data, settings, regenerate=False, voice_types=BASE_VOICES):
+    """用本地合成引擎并行生成音频"""
+    tasks = collect_audio_tasks(car_data, regenerate, settings, voice_types)
+    jobs = [(text, voice_type, output_path) for voice_type, voice_tasks in tasks.items() for output_path, text, _ in voice_tasks]
+    targets = {output_path: targets for voice_tasks in tasks.values() for output_path, _, targets in voice_tasks}
+    print(f"本地合成 {len(jobs)} 个音频文件（{settings['engine']}，{settings['workers']} 个进程）")
+    
+    generated_count = 0
+    with span("local-tts", f"local:{settings['engine']}"):
+        for (text, voice_type, output_path), ok, seconds, error in synthesize_local_many(jobs, settings):
+            if not ok:
+                print(f"  本地合成失败 {text}: {error}")
+                for car, field, _ in targets[output_path]:
+                    mark_failed(car, field, error)
                 continue
-        
-        processed_count += 1
-        print(f"  完成 {car['car-name']} 的音频生成")
-        
-        # 添加短暂延迟，避免API调用过于频繁
-        time.sleep(1)
+            record_throughput("local-tts", seconds, os.path.getsize(output_path))
+            count("clips", provider=f"local:{settings['engine']}")
+            relative_path = output_path.replace('kid_car_flutter/', '')
+            for car, field, fingerprint in targets[output_path]:
+                mark_committed(car, field, relative_path)
+                set_fingerprint(car, field, fingerprint)
+            generated_count += 1
+            print(f"  {relative_path} ({seconds:.2f} 秒)")
+            # 定期保存，中断后已完成的不用重新生成
+            if generated_count % 20 == 0:
+                save_catalogue(car_data)
     
-    print(f"\n处理完成！共处理 {processed_count}/{total_cars} 个车辆")
+    save_catalogue(car_data)
+    print(f"本地合成完成: {generated_count}/{len(jobs)}")
     return car_data
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="生成车辆的中文和英文音频文件（以及口音、语速变体）")
+    parser.add_argument("--regenerate", action="store_true", help="只重新生成输入（文本、语音）已变化的音频")
+    parser.add_argument("--batch", type=int, default=0, metavar="N", help="批量模式，每次请求用SSML合成N条同一语音的文本（例如 40）")
+    parser.add_argument("--provider", action="append", metavar="[语音=]服务商",
+                        help="选择合成引擎 edge/local，例如 --provider local 或 --provider english=local，可重复")
+    parser.add_argument("--voices", help=f"要生成的语音，逗号分隔（{','.join(VOICE_FIELDS)}），默认为中文、英文和 TTS.Variants 中的变体")
+    parser.add_argument("--workers", type=int, help="逐条合成时固定的并发请求数，默认按服务的响应自动调整")
+    parser.add_argument("--no-sequences", action="store_true", help="不拼接\"英文 ×3 + 中文\"播放音频")
+    args = parser.parse_args()
+    
+    start_run("generate-audio")
     print("开始生成车辆音频文件...")
     
     try:
@@ -156,14 +264,40 @@ def main():
         print("配置文件加载成功")
         
         # 加载车辆数据
-        car_data = load_car_data()
+        car_data = load_catalogue()
         print(f"加载了 {len(car_data)} 个车辆数据")
         
+        # 按语音选择合成引擎
+        voice_types = [voice_type.strip() for voice_type in args.voices.split(",")] if args.voices else None
+        settings = tts_settings(parse_provider_overrides(args.provider), voice_types)
+        local_voices = tuple(voice_type for voice_type in settings["voice_types"] if voice_provider(voice_type, settings) == "local")
+        edge_voices = tuple(voice_type for voice_type in settings["voice_types"] if voice_type not in local_voices)
+        
+        updated_car_data = car_data
+        if local_voices:
+            problems = check_local_engine(settings, local_voices)
+            if problems:
+                for problem in problems:
+                    print(f"本地合成不可用: {problem}")
+                return
+            updated_car_data = process_car_audio_local(updated_car_data, settings, args.regenerate, local_voices)
+        
         # 处理音频生成
-        updated_car_data = process_car_audio(car_data, config)
+        if edge_voices and args.batch > 0:
+            updated_car_data = process_car_audio_batch(updated_car_data, config, args.batch, args.regenerate, edge_voices)
+        elif edge_voices:
+            workers = args.workers or config.get('Edge', {}).get('Workers')
+            updated_car_data = process_car_audio(updated_car_data, config, settings, args.regenerate, edge_voices, workers)
+        
+        # 把英文三遍和中文一遍拼接成一个播放音频，输入音频没变的跳过
+        if not args.no_sequences:
+            with span("sequences"):
+                composed, failed = build_sequences(updated_car_data)
+            if composed or failed:
+                print(f"播放音频拼接完成: {composed} 个，失败 {failed} 个")
         
         # 最终保存
-        save_car_data(updated_car_data)
+        save_catalogue(updated_car_data)
         print("所有数据已保存")
         
         print("音频生成任务完成！")
@@ -172,10 +306,10 @@ def main():
         print(f"文件未找到: {e}")
     except json.JSONDecodeError as e:
         print(f"JSON解析错误: {e}")
-    except yaml.YAMLError as e:
-        print(f"YAML解析错误: {e}")
+    except ValueError as e:
+        print(f"配置错误: {e}")
     except Exception as e:
         print(f"发生未知错误: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_main(main, "generate-audio")
\ No newline at end of file
@@ -2,21 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import os
-import json
-import yaml
 import requests
 import random
 from pathlib import Path
 
-def load_config():
-    """加载配置文件"""
-    with open('local.yaml', 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
-
-def load_car_data():
-    """加载汽车数据"""
-    with open('car.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+from kidcar.config import load_config
 
 def generate_apple_icon():
     """生成苹果图标"""
@@ -1,46 +1,55 @@
+import argparse
 import os
-import json
+import threading
 import time
-import requests
-import yaml
-from PIL import Image
-from io import BytesIO
 
-# 配置常量
-CONFIG_FILE = "local.yaml"
-CAR_JSON_FILE = "kid_car_flutter/assets/car.json"
-IMAGES_DIR = "kid_car_flutter/assets/images"
+from kidcar.catalog import IMAGES_DIR, load_catalogue, save_catalogue
+from kidcar.concurrency import OVERLOAD_STATUS, get_controller, run_adaptive
+from kidcar.config import get_proxies, get_section
+from kidcar.fingerprint import image_fingerprint, is_asset_up_to_date, set_fingerprint
+from kidcar.history import record_throughput
+from kidcar.metrics import count, key_label, span, start_run, traced_request
+from kidcar.profiling import run_main
+from kidcar.quality import QualityGate
+from kidcar.state import is_quarantined, mark_failed, mark_submitted, recover_downloads, submitted_task, write_asset
 
 # ModelScope API配置
 BASE_URL = "https://api-inference.modelscope.cn/"
 IMAGE_MODEL = "Qwen/Qwen-Image"
 
+# 运行指标和吞吐量历史中的服务商名称
+PROVIDER = "modelscope-image"
+
+# 资源字段
+FIELD = "car-image-path"
+
+# 轮询间隔从 POLL_INITIAL 秒开始，每次乘以 POLL_FACTOR，最长 POLL_MAX 秒
+POLL_INITIAL = 2.0
+POLL_FACTOR = 1.5
+POLL_MAX = 15.0
+
+# 每批条目先并发提交并记录任务ID，再并发轮询和下载
+BATCH_SIZE = 16
+
 # API密钥和代理配置
 API_KEYS = []
+# 密钥标识 -> 密钥，用于继续轮询上次提交的任务（目录中只记录密钥标识）
+API_KEYS_BY_LABEL = {}
 CURRENT_API_KEY_INDEX = 0
+API_KEY_LOCK = threading.Lock()
 PROXIES = None
 
 def load_config():
-    """加载配置文件"""
+    """从 local.yaml 读取API密钥、图片模型和代理配置"""
     global API_KEYS, PROXIES, IMAGE_MODEL
     
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    
-    # 读取ModelScope API密钥
-    if "ModelScope" in config and "ApiKeys" in config["ModelScope"]:
-        API_KEYS.extend(config["ModelScope"]["ApiKeys"])
+    modelscope = get_section("ModelScope")
+    API_KEYS.extend(modelscope.get("ApiKeys", []))
+    API_KEYS_BY_LABEL.update({key_label(api_key): api_key for api_key in API_KEYS})
+    IMAGE_MODEL = modelscope.get("ImageModel", IMAGE_MODEL)
     
-    # 读取图片模型配置
-    if "ModelScope" in config and "ImageModel" in config["ModelScope"]:
-        IMAGE_MODEL = config["ModelScope"]["ImageModel"]
-    
-    # 读取代理配置
-    if "Proxy" in config:
-        PROXIES = {
-            "http": config["Proxy"].get("HttpProxy"),
-            "https": config["Proxy"].get("HttpsProxy")
-        }
+    PROXIES = get_proxies()
+    if PROXIES:
         print(f"已配置代理: {PROXIES}")
 
 def get_next_api_key():
@@ -49,165 +58,248 @@ def get_next_api_key():
     if not API_KEYS:
         raise ValueError("没有可用的API密钥")
     
-    api_key = API_KEYS[CURRENT_API_KEY_INDEX]
-    CURRENT_API_KEY_INDEX = (CURRENT_API_KEY_INDEX + 1) % len(API_KEYS)
+    # 多个线程同时提交任务
+    with API_KEY_LOCK:
+        api_key = API_KEYS[CURRENT_API_KEY_INDEX]
+        CURRENT_API_KEY_INDEX = (CURRENT_API_KEY_INDEX + 1) % len(API_KEYS)
     return api_key
 
-def load_cars_data():
-    """加载车辆数据"""
-    if not os.path.exists(CAR_JSON_FILE):
-        return []
-    
-    with open('kid_car_flutter/assets/car.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def save_cars_data(cars_data):
-    """保存车辆数据"""
-    with open('kid_car_flutter/assets/car.json', 'w', encoding='utf-8') as f:
-        json.dump(cars_data, f, ensure_ascii=False, indent=2)
-
-def generate_car_image(car_name, car_type):
-    """使用ModelScope Qwen-Image API生成车辆图片"""
-    # 创建提示词，明确要求不要出现人物
-    prompt = f"一辆{car_name}，{car_type}，卡通风格，儿童友好，明亮色彩，简洁背景，不要出现人物，不要出现人，不要有人脸，不要有人形"
-    
-    try:
-        # 发送图片生成请求
-        api_key = get_next_api_key()
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "X-ModelScope-Async-Mode": "true"
-        }
-        
-        data = {
-            "model": IMAGE_MODEL,
-            "prompt": prompt,
-        }
-        
-        response = requests.post(
-            f"{BASE_URL}v1/images/generations",
-            headers=headers,
-            json=data,
+def build_prompt(car_name, car_type):
+    """创建提示词，明确要求不要出现人物"""
+    return f"一辆{car_name}，{car_type}，卡通风格，儿童友好，明亮色彩，简洁背景，不要出现人物，不要出现人，不要有人脸，不要有人形"
+
+def car_fingerprint(car):
+    """图片输入（提示词、模型）的指纹"""
+    return image_fingerprint(build_prompt(car["car-name"], car["car-type"]), IMAGE_MODEL)
+
+def submit_task(car_name, car_type):
+    """
+    提交图片生成任务
+    返回 (任务ID, API密钥)，失败时抛出 RuntimeError
+    """
+    prompt = build_prompt(car_name, car_type)
+    api_key = get_next_api_key()
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "X-ModelScope-Async-Mode": "true"
+    }
+    
+    data = {
+        "model": IMAGE_MODEL,
+        "prompt": prompt,
+    }
+    
+    response = traced_request(
+        "POST",
+        f"{BASE_URL}v1/images/generations",
+        "submit",
+        PROVIDER,
+        api_key,
+        car_name,
+        headers=headers,
+        json=data,
+        proxies=PROXIES if PROXIES else None
+    )
+    
+    if response.status_code != 200:
+        raise RuntimeError(f"提交失败，状态码: {response.status_code}, 错误: {response.text}")
+    
+    result = response.json()
+    if "task_id" not in result:
+        raise RuntimeError("提交失败，响应格式错误")
+    
+    print(f"✓ 任务提交成功: {car_name}, 任务ID: {result['task_id']}")
+    return result["task_id"], api_key
+
+def wait_for_task(task_id, api_key, car_name):
+    """
+    轮询任务状态直到完成
+    返回 (生成图片的URL, 轮询次数)，任务失败时抛出 RuntimeError
+    轮询间隔按 POLL_FACTOR 逐渐拉长；服务返回 429、5xx 时按 Retry-After（由并发控制器记录）等待后继续轮询
+    """
+    common_headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "X-ModelScope-Task-Type": "image_generation"
+    }
+    controller = get_controller(PROVIDER)
+    interval = POLL_INITIAL
+    polls = 0
+    
+    while True:
+        controller.wait_ready()
+        result_response = traced_request(
+            "GET",
+            f"{BASE_URL}v1/tasks/{task_id}",
+            "poll",
+            PROVIDER,
+            api_key,
+            car_name,
+            headers=common_headers,
             proxies=PROXIES if PROXIES else None
         )
+        polls += 1
         
-        if response.status_code != 200:
-            print(f"✗ 图片生成失败: {car_name}, 状态码: {response.status_code}, 错误: {response.text}")
-            return None
-        
-        result = response.json()
-        if "task_id" not in result:
-            print(f"✗ 图片生成失败: {car_name}, 响应格式错误")
-            return None
-        
-        task_id = result["task_id"]
-        print(f"✓ 任务提交成功: {car_name}, 任务ID: {task_id}")
+        # 服务繁忙时任务仍在运行，暂停期过后重新轮询
+        if result_response.status_code in OVERLOAD_STATUS:
+            count("retries", provider=PROVIDER, key=key_label(api_key))
+            continue
+        if result_response.status_code != 200:
+            raise RuntimeError(f"获取任务状态失败，状态码: {result_response.status_code}")
         
-        # 轮询任务状态
-        common_headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "X-ModelScope-Task-Type": "image_generation"
-        }
+        task_result = result_response.json()
         
-        while True:
-            result_response = requests.get(
-                f"{BASE_URL}v1/tasks/{task_id}",
-                headers=common_headers,
-                proxies=PROXIES if PROXIES else None
-            )
-            
-            if result_response.status_code != 200:
-                print(f"✗ 获取任务状态失败: {car_name}, 状态码: {result_response.status_code}")
-                return None
-            
-            task_result = result_response.json()
-            
-            if task_result["task_status"] == "SUCCEED":
-                print(f"✓ 图片生成成功: {car_name}")
-                # 下载生成的图片
-                image_url = task_result["output_images"][0]
-                image_response = requests.get(image_url, proxies=PROXIES if PROXIES else None)
-                
-                if image_response.status_code != 200:
-                    print(f"✗ 图片下载失败: {car_name}")
-                    return None
-                
-                # 确保images目录存在
-                os.makedirs(IMAGES_DIR, exist_ok=True)
-                
-                # 保存图片
-                image_filename = f"{car_name}_{car_type}.jpg"
-                image_path = os.path.join(IMAGES_DIR, image_filename)
-                
-                with open(image_path, 'wb') as f:
-                    f.write(image_response.content)
-                
-                print(f"✓ 图片保存成功: {image_path}")
-                return image_path
-                
-            elif task_result["task_status"] == "FAILED":
-                print(f"✗ 图片生成失败: {car_name}, 任务失败")
-                return None
-            
-            # 等待5秒后再次查询
-            print(f"等待图片生成: {car_name}...")
-            time.sleep(5)
+        if task_result["task_status"] == "SUCCEED":
+            print(f"✓ 图片生成成功: {car_name}")
+            return task_result["output_images"][0], polls
+        elif task_result["task_status"] == "FAILED":
+            raise RuntimeError("任务失败")
         
-    except Exception as e:
-        print(f"✗ 图片生成失败: {car_name}, 错误: {str(e)}")
-        return None
+        print(f"等待图片生成: {car_name}...")
+        with span("wait", PROVIDER, item=car_name):
+            time.sleep(interval)
+        interval = min(POLL_MAX, interval * POLL_FACTOR)
+
+def resume_task(car):
+    """上次提交、还没有下载的任务，返回 (任务ID, API密钥)，没有或密钥已不在配置中时返回 (None, None)"""
+    task_id, key = submitted_task(car, FIELD, PROVIDER)
+    api_key = API_KEYS_BY_LABEL.get(key) if task_id else None
+    if task_id and api_key:
+        return task_id, api_key
+    return None, None
+
+def fetch_car_image(job):
+    """
+    轮询任务并下载图片（在工作线程中运行，不修改目录）
+    job 为 (车辆, 任务ID, API密钥)，返回 (图片内容, 调用次数, 耗时)，失败时抛出异常
+    """
+    car, task_id, api_key = job
+    start_time = time.time()
+    with span("item", PROVIDER, item=car["car-name"]) as item_span:
+        image_url, polls = wait_for_task(task_id, api_key, car["car-name"])
+        image_response = traced_request("GET", image_url, "download", PROVIDER, item=car["car-name"], proxies=PROXIES if PROXIES else None)
+        if image_response.status_code != 200:
+            raise RuntimeError(f"图片下载失败，状态码: {image_response.status_code}")
+        item_span["ok"] = True
+    # 调用次数 = 提交 + 轮询 + 下载
+    return image_response.content, polls + 2, time.time() - start_time
+
+def record_failure(car, cars_data, error):
+    """记录失败次数并保存目录"""
+    print(f"✗ 图片生成失败: {car['car-name']}, 错误: {error}")
+    mark_failed(car, FIELD, error)
+    with span("save-json"):
+        save_catalogue(cars_data)
+
+def generate_batch(batch, cars_data, gate=None):
+    """
+    生成一批图片，返回成功的数量
+    提交和轮询都在工作线程中按自适应并发进行；任务ID、图片和指纹在主线程中写入目录。
+    提交后立即把任务ID保存到目录中，中断后重新运行会继续轮询同一个任务，不会重新生成；
+    下载的图片按 downloaded -> committed 的顺序写入
+    """
+    polls = []
+    to_submit = []
+    for car in batch:
+        task_id, api_key = resume_task(car)
+        if task_id:
+            print(f"继续上次提交的任务: {car['car-name']}, 任务ID: {task_id}")
+            polls.append((car, task_id, api_key))
+        else:
+            to_submit.append(car)
+    
+    for car, result, error in run_adaptive(to_submit, lambda car: submit_task(car["car-name"], car["car-type"]), PROVIDER):
+        if error:
+            record_failure(car, cars_data, error)
+            continue
+        task_id, api_key = result
+        mark_submitted(car, FIELD, PROVIDER, task_id, key_label(api_key))
+        with span("save-json"):
+            save_catalogue(cars_data)
+        polls.append((car, task_id, api_key))
+    
+    generated_count = 0
+    for (car, _, _), result, error in run_adaptive(polls, fetch_car_image, PROVIDER):
+        if error:
+            record_failure(car, cars_data, error)
+            continue
+        content, calls, elapsed = result
+        image_path = os.path.join(IMAGES_DIR, f"{car['car-name']}_{car['car-type']}.jpg")
+        write_asset(cars_data, car, FIELD, image_path, content)
+        print(f"✓ 图片保存成功: {image_path}")
+        # 记录吞吐量，供 plan_generation.py 估算
+        record_throughput(PROVIDER, elapsed, len(content), calls=calls)
+        # 图片路径已由 write_asset 写入，记录指纹
+        set_fingerprint(car, FIELD, car_fingerprint(car))
+        if gate is not None:
+            gate.submit(car, image_path)
+            gate.collect()
+        with span("save-json"):
+            save_catalogue(cars_data)
+        generated_count += 1
+    return generated_count
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="生成车辆图片")
+    parser.add_argument("--regenerate", action="store_true", help="只重新生成输入（提示词、模型）已变化的图片")
+    parser.add_argument("--no-qa", action="store_true", help="不检查图片质量")
+    args = parser.parse_args()
+    
+    start_run("generate-image")
+    
     # 加载配置
     load_config()
     
     # 加载车辆数据
-    cars_data = load_cars_data()
+    cars_data = load_catalogue()
     if not cars_data:
         print("没有找到车辆数据")
         return
     
     print(f"找到 {len(cars_data)} 个车辆数据")
     
-    # 统计需要生成图片的车辆数量
-    need_generate_count = 0
-    for car in cars_data:
-        if not car.get("car-image-path"):
-            need_generate_count += 1
+    # 恢复上次在下载和写入目录之间中断的图片
+    recovered = recover_downloads(cars_data, (FIELD,))
+    for car, field, _ in recovered:
+        set_fingerprint(car, field, car_fingerprint(car))
+    if recovered:
+        save_catalogue(cars_data)
+        print(f"恢复了 {len(recovered)} 张上次已下载的图片")
+    
+    # 统计需要生成图片的车辆数量（已有图片路径的跳过，--regenerate 模式下比较输入指纹，已隔离的跳过）
+    pending_cars = [
+        car for car in cars_data
+        if not is_quarantined(car, FIELD)
+        and (submitted_task(car, FIELD, PROVIDER)[0] or not is_asset_up_to_date(car, FIELD, car_fingerprint(car), args.regenerate))
+    ]
+    need_generate_count = len(pending_cars)
+    quarantined_count = sum(1 for car in cars_data if is_quarantined(car, FIELD))
+    
+    print(f"其中 {need_generate_count} 个车辆需要生成图片" + (f"，{quarantined_count} 个已隔离（python -m kidcar state --release 解除）" if quarantined_count else ""))
     
-    print(f"其中 {need_generate_count} 个车辆需要生成图片")
+    # 保存新记录的指纹基线
+    if args.regenerate:
+        save_catalogue(cars_data)
     
-    # 处理每个车辆
+    # 保存后的图片在后台进程中做质量检查，没有通过的标记为需要重新生成
+    gate = None if args.no_qa else QualityGate(FIELD)
+    
+    # 按批处理：每批先并发提交，再并发轮询和下载
     generated_count = 0
-    for car in cars_data:
-        # 如果已经有图片路径，跳过
-        if car.get("car-image-path"):
-            continue
-        
-        car_name = car["car-name"]
-        car_type = car["car-type"]
-        
-        print(f"正在生成图片: {car_name} ({car_type})")
-        
-        # 生成图片
-        image_path = generate_car_image(car_name, car_type)
-        if image_path:
-            # 更新车辆数据
-            # 将完整路径转换为相对于assets目录的路径
-            relative_path = image_path.replace('kid_car_flutter/', '')
-            car["car-image-path"] = relative_path
-            # 立即保存到JSON文件
-            save_cars_data(cars_data)
-            generated_count += 1
-            print(f"已更新JSON文件: {car_name}")
-        
-        # 添加延迟，避免请求过于频繁
-        time.sleep(2)
+    for start in range(0, len(pending_cars), BATCH_SIZE):
+        batch = pending_cars[start:start + BATCH_SIZE]
+        print(f"正在生成第 {start + 1}-{start + len(batch)} 张图片（共 {len(pending_cars)} 张）")
+        generated_count += generate_batch(batch, cars_data, gate)
+    
+    if gate is not None:
+        with span("qa"):
+            counts = gate.close()
+        save_catalogue(cars_data)
+        print(f"质量检查: 通过 {counts['passed']} 张，重新生成 {counts['requeued']} 张，隔离 {counts['quarantined']} 张")
     
     print(f"图片生成完成，共生成 {generated_count} 张图片")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_main(main, "generate-image")
\ No newline at end of file
@@ -6,17 +6,15 @@
 """
 
 import json
-import yaml
 import os
 import requests
-import time
 from pathlib import Path
 from urllib.parse import quote
 
-def load_config():
-    """加载配置文件"""
-    with open('local.yaml', 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+from kidcar.concurrency import run_adaptive
+from kidcar.config import load_config
+from kidcar.metrics import traced_request
+from kidcar.tts import EDGE_PROVIDER
 
 def generate_applaud_audio(text, output_path, voice_type="chinese", config=None):
     """
@@ -51,8 +49,8 @@ def generate_applaud_audio(text, output_path, voice_type="chinese", config=None)
     try:
         print(f"  请求URL: {api_url}")
         
-        # 发送GET请求
-        response = requests.get(api_url, headers=headers, stream=True)
+        # 发送GET请求，429和5xx会反馈给 edge-tts 的并发控制器
+        response = traced_request("GET", api_url, "tts", EDGE_PROVIDER, token, text, headers=headers, stream=True)
         response.raise_for_status()
         
         # 保存音频文件
@@ -119,33 +117,23 @@ def main():
             ]
         }
         
-        # 生成中文鼓励音频
-        print("\n生成中文鼓励音频...")
-        for i, text in enumerate(encourage_texts["chinese"], 1):
-            filename = f"kid_car_flutter/assets/audios/applaud_zh_{i:02d}.mp3"
-            print(f"生成第 {i}/{len(encourage_texts['chinese'])} 个中文鼓励音频: {text}")
-            
-            if generate_applaud_audio(text, filename, "chinese", config):
-                print(f"  ✓ 成功生成: {filename}")
-            else:
-                print(f"  ✗ 生成失败: {text}")
-            
-            # 添加短暂延迟，避免API调用过于频繁
-            time.sleep(1)
+        # 中英文鼓励音频一起按 edge-tts 的自适应并发生成，代替固定的 sleep
+        jobs = []
+        for voice_type, prefix in (("chinese", "zh"), ("english", "en")):
+            for i, text in enumerate(encourage_texts[voice_type], 1):
+                jobs.append((voice_type, text, f"kid_car_flutter/assets/audios/applaud_{prefix}_{i:02d}.mp3"))
+        print(f"\n生成 {len(jobs)} 个鼓励音频...")
         
-        # 生成英文鼓励音频
-        print("\n生成英文鼓励音频...")
-        for i, text in enumerate(encourage_texts["english"], 1):
-            filename = f"kid_car_flutter/assets/audios/applaud_en_{i:02d}.mp3"
-            print(f"生成第 {i}/{len(encourage_texts['english'])} 个英文鼓励音频: {text}")
-            
-            if generate_applaud_audio(text, filename, "english", config):
-                print(f"  ✓ 成功生成: {filename}")
-            else:
+        def synthesize(job):
+            voice_type, text, filename = job
+            if not generate_applaud_audio(text, filename, voice_type, config):
+                raise RuntimeError("TTS请求失败")
+        
+        for (voice_type, text, filename), _, error in run_adaptive(jobs, synthesize, EDGE_PROVIDER):
+            if error:
                 print(f"  ✗ 生成失败: {text}")
-            
-            # 添加短暂延迟，避免API调用过于频繁
-            time.sleep(1)
+            else:
+                print(f"  ✓ 成功生成: {filename}")
         
         print("\n鼓励音频生成完成！")
         print(f"共生成 {len(encourage_texts['chinese'])} 个中文鼓励音频")
@@ -154,8 +142,8 @@ def main():
         
     except FileNotFoundError as e:
         print(f"文件未找到: {e}")
-    except yaml.YAMLError as e:
-        print(f"YAML解析错误: {e}")
+    except ValueError as e:
+        print(f"配置错误: {e}")
     except Exception as e:
         print(f"发生未知错误: {e}")
 
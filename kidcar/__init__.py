@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+kid-car 资源生成流水线的公共模块
+
+各个生成脚本（car-name.py、generate-image.py、generate-audio.py 等）共享的
+目录读写、资源索引和吞吐量历史都放在这里
+"""
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""python -m kidcar 入口"""
+
+from kidcar.cli import main
+
+main()
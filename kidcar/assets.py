@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+资源索引
+
+扫描 assets/images 和 assets/audios，记录每个文件的大小、修改时间、sha256
+以及简单的损坏检查结果。索引缓存在 .kidcar/asset-index.json 中，
+大小和修改时间都没变的文件不会重新计算哈希。
+"""
+
+import hashlib
+import json
+import os
+
+from kidcar.catalog import AUDIOS_DIR, FLUTTER_DIR, IMAGES_DIR, STATE_DIR, to_asset_path
+
+INDEX_FILE = os.path.join(STATE_DIR, "asset-index.json")
+INDEX_VERSION = 1
+
+# 扩展名 -> 资源类型
+ASSET_KINDS = {
+    ".jpg": "image",
+    ".jpeg": "image",
+    ".png": "image",
+    ".webp": "image",
+    ".mp3": "audio",
+}
+
+
+def detect_corruption(head, tail, size, ext):
+    """
+    根据文件头尾字节判断文件是否损坏
+    返回损坏原因，文件正常时返回 None
+    """
+    if size == 0:
+        return "空文件"
+
+    if ext in (".jpg", ".jpeg"):
+        if not head.startswith(b'\xff\xd8\xff'):
+            return "不是JPEG文件"
+        # 下载中断的JPEG通常缺少结束标记
+        if b'\xff\xd9' not in tail:
+            return "JPEG文件被截断"
+    elif ext == ".png":
+        if not head.startswith(b'\x89PNG\r\n\x1a\n'):
+            return "不是PNG文件"
+    elif ext == ".webp":
+        if not (head.startswith(b'RIFF') and head[8:12] == b'WEBP'):
+            return "不是WEBP文件"
+    elif ext == ".mp3":
+        # ID3标签或MPEG帧同步字
+        if not (head.startswith(b'ID3') or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)):
+            return "不是MP3文件"
+    return None
+
+
+def inspect_file(disk_path, ext):
+    """计算单个文件的哈希并做损坏检查"""
+    sha256 = hashlib.sha256()
+    head = b''
+    tail = b''
+    with open(disk_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            if not head:
+                head = chunk[:16]
+            tail = (tail + chunk)[-16:]
+            sha256.update(chunk)
+    size = os.path.getsize(disk_path)
+    return sha256.hexdigest(), detect_corruption(head, tail, size, ext)
+
+
+def load_asset_index(index_file=INDEX_FILE):
+    """加载缓存的资源索引，不存在或版本不匹配时返回空索引"""
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION:
+                return index
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"读取资源索引失败，将重新扫描: {e}")
+    return {"version": INDEX_VERSION, "files": {}}
+
+
+def save_asset_index(index, index_file=INDEX_FILE):
+    """保存资源索引"""
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    tmp_file = f"{index_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_file, index_file)
+
+
+def scan_assets(index=None, directories=(IMAGES_DIR, AUDIOS_DIR), root=FLUTTER_DIR):
+    """
+    增量扫描资源目录，返回更新后的索引
+    只有大小或修改时间变化的文件才会重新读取，索引中的路径相对于 root
+    """
+    if index is None:
+        index = load_asset_index()
+
+    old_files = index.get("files", {})
+    files = {}
+    rehashed = 0
+
+    for directory in directories:
+        if not os.path.exists(directory):
+            continue
+        for entry in os.scandir(directory):
+            if not entry.is_file():
+                continue
+            ext = os.path.splitext(entry.name)[1].lower()
+            kind = ASSET_KINDS.get(ext)
+            if kind is None:
+                continue
+
+            stat = entry.stat()
+            asset_path = to_asset_path(entry.path, root)
+            cached = old_files.get(asset_path)
+            if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+                files[asset_path] = cached
+                continue
+
+            sha256, corrupt = inspect_file(entry.path, ext)
+            files[asset_path] = {
+                "kind": kind,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256,
+                "corrupt": corrupt,
+            }
+            rehashed += 1
+
+    index["files"] = files
+    index["rehashed"] = rehashed
+    return index
+
+
+def refresh_asset_index():
+    """扫描资源目录并保存索引"""
+    index = scan_assets()
+    save_asset_index(index)
+    return index
+
+
+def build_case_lookup(index):
+    """构建小写路径 -> 实际路径的映射，用于发现只差大小写的文件名"""
+    return {path.lower(): path for path in index["files"]}
+
+
+def resolve_asset(index, case_lookup, asset_path):
+    """
+    在索引中查找资源
+    返回 (实际路径, 索引条目)，找不到时返回 (None, None)
+    """
+    entry = index["files"].get(asset_path)
+    if entry is not None:
+        return asset_path, entry
+
+    # 在大小写不敏感的文件系统上生成的文件，名字可能只差大小写
+    actual_path = case_lookup.get(asset_path.lower())
+    if actual_path is not None:
+        return actual_path, index["files"][actual_path]
+    return None, None
+
+
+def replace_asset_file(tmp_path, disk_path):
+    """
+    把下载好的临时文件移动到目标位置
+    在大小写不敏感的文件系统上，如果已有只差大小写的旧文件（例如 Taxi_en.mp3
+    和 taxi_en.mp3），直接替换会沿用旧文件名，所以先删除旧文件
+    """
+    directory, filename = os.path.split(disk_path)
+    # exists() 为真但目录里没有这个精确的文件名，说明命中的是只差大小写的旧文件
+    if os.path.exists(disk_path) and filename not in os.listdir(directory or '.'):
+        for existing in os.listdir(directory or '.'):
+            if existing.lower() == filename.lower():
+                os.remove(os.path.join(directory, existing))
+    os.replace(tmp_path, disk_path)
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+本地流水线阶段的基准测试
+
+网络请求之外，目录读写、文件检查、孤立文件查找、规则校验和图片处理都在本机运行，
+目录越大越慢。python -m kidcar bench 在合成的 600、1 万、10 万条目录上分别计时:
+
+  catalogue.load      load_catalogue 读取整个目录
+  catalogue.iter      iter_catalogue 流式读取名称和资源路径
+  catalogue.save      save_catalogue 写出整个目录
+  catalogue.dump      json.dump(indent=2) 写出整个目录（对照 save_catalogue）
+  check.files         check_image_audio.py 的 check_image_audio_files
+  assets.scan-cold    没有资源索引时扫描并计算全部文件的 sha256
+  assets.scan-warm    资源索引已是最新时的增量扫描
+  cleanup.orphans     find_orphans 查找没有被引用的文件（remove-image-audio.py）
+  rules.evaluate      validate-rules.yaml 的全部规则校验整个目录（validate_car_data.py）
+  pillow.features     best-of-N 候选评分的解码、转换和缩放（每张图片）
+  pillow.quality      图片质量检查（每张图片）
+
+合成目录和资源文件缓存在 .kidcar/bench/fixtures/<条目数>/，只在第一次运行时生成。
+每项重复运行取最短时间，结果写到 .kidcar/bench/latest.json，和基线
+.kidcar/bench/baseline.json（--save-baseline 保存）比较：比基线慢超过 Threshold（比例）
+且绝对值超过 MinDelta 秒的记为退化，以状态 1 退出。同一项在最大和最小目录上的
+耗时增长明显快于条目数增长（对数斜率超过 MaxExponent）时也会提示。
+基线和机器有关，只和同一台机器上的结果比较。
+
+local.yaml 示例（可选）:
+  Bench:
+    Threshold: 0.25
+    MinDelta: 0.01
+    MaxExponent: 1.25
+    Thresholds: {check.files: 0.5}   # 单独放宽某一项
+"""
+
+import argparse
+import contextlib
+import gc
+import importlib.util
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from kidcar.assets import INDEX_VERSION, scan_assets
+from kidcar.catalog import ASSET_FIELDS, STATE_DIR, expected_asset_path, iter_catalogue, load_catalogue, save_catalogue
+from kidcar.cleanup import find_orphans
+from kidcar.cli import REPO_DIR
+from kidcar.config import get_section
+from kidcar.rules import RULES_FILE, evaluate, load_rules
+
+BENCH_DIR = os.path.join(STATE_DIR, "bench")
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+LATEST_FILE = os.path.join(BENCH_DIR, "latest.json")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+
+# 合成数据的格式变化时加一，旧的缓存会重新生成
+FIXTURE_VERSION = 1
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = (600, 10000, 100000)
+
+DEFAULT_BENCH = {
+    "Threshold": 0.25,
+    "MinDelta": 0.01,
+    "MaxExponent": 1.25,
+    "Thresholds": {},
+}
+
+# 每项至少运行 MIN_REPEAT 次、累计 MIN_TIME 秒，最多 MAX_REPEAT 次
+MIN_REPEAT = 3
+MAX_REPEAT = 15
+MIN_TIME = 1.0
+
+# 各组基准测试的名称，--only 按前缀选择
+CATALOGUE_BENCHMARKS = ("catalogue.load", "catalogue.iter", "catalogue.save", "catalogue.dump", "check.files",
+                        "assets.scan-cold", "assets.scan-warm", "cleanup.orphans", "rules.evaluate")
+IMAGE_BENCHMARKS = ("pillow.features", "pillow.quality")
+
+# 图片基准测试用的合成图片数量和尺寸
+IMAGE_COUNT = 8
+IMAGE_SIZE = 1024
+
+# 合成目录中缺少资源文件的条目比例、资源目录中孤立文件的比例
+MISSING_RATE = 0.01
+ORPHAN_RATE = 0.02
+
+CATEGORIES = ("小型车辆", "公共交通", "特种车辆", "工程机械", "航空器", "船舶", "家具", "动物", "水果", "蔬菜", "乐器", "文具")
+
+# 合成资源文件的内容：能通过资源索引损坏检查的最小文件头和文件尾
+JPEG_BYTES = b"\xff\xd8\xff\xe0" + b"\x00" * 2044 + b"\xff\xd9"
+MP3_BYTES = b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x64" + b"\x00" * 4082
+
+
+def bench_settings():
+    """读取 local.yaml 的 Bench 配置"""
+    settings = dict(DEFAULT_BENCH)
+    settings.update(get_section("Bench"))
+    return settings
+
+
+def load_script(filename):
+    """按文件路径导入仓库根目录下被测的脚本（不运行它的 main）"""
+    spec = importlib.util.spec_from_file_location(os.path.splitext(filename)[0], os.path.join(REPO_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_item(i, rng):
+    """生成一个合成条目，字段和 car.json 一致"""
+    category = CATEGORIES[i % len(CATEGORIES)]
+    item = {
+        "car-name": f"事物{i:06d}",
+        "car-english-name": f"Thing {i}",
+        "car-description": "".join(rng.choice("这是一种小朋友喜欢的东西它有很多颜色可以在路上行驶") for _ in range(rng.randint(40, 90))) + "。",
+        "car-english-pronunciation": f"/θɪŋ {i}/",
+        "car-american-pronunciation": f"/θɪŋ {i}/",
+        "car-type": category,
+    }
+    for field in ("car-image-path", "chinese-audio-path", "english-audio-path"):
+        item[field] = expected_asset_path(item, field)
+    return item
+
+
+def build_fixture(entries, fixture_dir):
+    """
+    在 fixture_dir 下生成合成目录和资源文件，目录结构和仓库一致（kid_car_flutter/assets/...）
+    少量条目的资源文件缺失，另有少量没有被引用的孤立文件
+    """
+    rng = random.Random(entries)
+    if os.path.exists(fixture_dir):
+        shutil.rmtree(fixture_dir)
+    images_dir = os.path.join(fixture_dir, "kid_car_flutter", "assets", "images")
+    audios_dir = os.path.join(fixture_dir, "kid_car_flutter", "assets", "audios")
+    os.makedirs(images_dir)
+    os.makedirs(audios_dir)
+
+    items = [synthetic_item(i, rng) for i in range(entries)]
+    # 少量重复名称，让重复检查规则有命中
+    for i in range(0, entries, 97):
+        items[i]["car-name"] = items[max(i - 1, 0)]["car-name"]
+
+    for item in items:
+        skip = rng.random() < MISSING_RATE
+        for field in ("car-image-path", "chinese-audio-path", "english-audio-path"):
+            if skip and field == "english-audio-path":
+                continue
+            data = JPEG_BYTES if field == "car-image-path" else MP3_BYTES
+            with open(os.path.join(fixture_dir, "kid_car_flutter", item[field]), 'wb') as f:
+                f.write(data)
+    for i in range(int(entries * ORPHAN_RATE)):
+        with open(os.path.join(audios_dir, f"孤立{i:06d}_en.mp3"), 'wb') as f:
+            f.write(MP3_BYTES)
+
+    save_catalogue(items, os.path.join(fixture_dir, "kid_car_flutter", "assets", "car.json"))
+    with open(os.path.join(fixture_dir, "fixture.json"), 'w', encoding='utf-8') as f:
+        json.dump({"version": FIXTURE_VERSION, "entries": entries}, f)
+
+
+def ensure_fixture(entries):
+    """返回合成目录所在的文件夹，需要时生成"""
+    fixture_dir = os.path.abspath(os.path.join(FIXTURE_DIR, str(entries)))
+    marker = os.path.join(fixture_dir, "fixture.json")
+    try:
+        with open(marker, 'r', encoding='utf-8') as f:
+            if json.load(f).get("version") == FIXTURE_VERSION:
+                return fixture_dir
+    except (OSError, json.JSONDecodeError):
+        pass
+    started = time.perf_counter()
+    print(f"生成 {entries} 条的合成目录和资源文件...")
+    build_fixture(entries, fixture_dir)
+    print(f"  完成，耗时 {time.perf_counter() - started:.1f} 秒")
+    return fixture_dir
+
+
+def synthetic_images(count=IMAGE_COUNT, size=IMAGE_SIZE):
+    """生成有渐变、色块和噪点的 JPEG 图片（接近卡通图片的压缩率）"""
+    rng = np.random.default_rng(0)
+    images = []
+    y, x = np.mgrid[0:size, 0:size]
+    for i in range(count):
+        rgb = np.stack([(x + i * 40) % 256, (y + i * 25) % 256, ((x + y) // 2 + i * 60) % 256], axis=-1).astype(np.uint8)
+        for _ in range(6):
+            x0, y0 = rng.integers(0, size - 200, 2)
+            rgb[y0:y0 + 200, x0:x0 + 200] = rng.integers(0, 256, 3)
+        rgb = np.clip(rgb.astype(np.int16) + rng.integers(-8, 9, rgb.shape), 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(rgb).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    """临时切换工作目录，流水线函数使用相对于仓库根目录的路径"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def measure(func, min_repeat=MIN_REPEAT, max_repeat=MAX_REPEAT, min_time=MIN_TIME):
+    """重复运行 func，返回 {"best", "median", "runs"}（秒）"""
+    timings = []
+    while len(timings) < min_repeat or (sum(timings) < min_time and len(timings) < max_repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {"best": min(timings), "median": statistics.median(timings), "runs": len(timings)}
+
+
+def selected(name, only):
+    """--only 指定了前缀时，只运行匹配的项"""
+    return not only or name.startswith(only)
+
+
+def any_selected(names, only):
+    """一组基准测试中是否有要运行的项，没有时不必准备合成目录或图片"""
+    return any(selected(name, only) for name in names)
+
+
+def catalogue_benchmarks(entries, rules, check_script, only=None):
+    """在一个合成目录上运行目录相关的基准测试，返回 {名称: 结果}"""
+    fixture_dir = ensure_fixture(entries)
+    results = {}
+    with working_directory(fixture_dir):
+        json_file = os.path.join("kid_car_flutter", "assets", "car.json")
+        out_file = os.path.join(fixture_dir, "out.json")
+        items = load_catalogue(json_file)
+        warm_index = scan_assets({"version": INDEX_VERSION, "files": {}})
+
+        def dump():
+            with open(out_file, 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False, indent=2)
+
+        def check_files():
+            # 缺失文件的警告不计入输出
+            with contextlib.redirect_stdout(io.StringIO()):
+                check_script.check_image_audio_files(json_file)
+
+        benchmarks = {
+            "catalogue.load": lambda: load_catalogue(json_file),
+            "catalogue.iter": lambda: sum(1 for _ in iter_catalogue(json_file, ("car-name", *ASSET_FIELDS))),
+            "catalogue.save": lambda: save_catalogue(items, out_file),
+            "catalogue.dump": dump,
+            "check.files": check_files,
+            "assets.scan-cold": lambda: scan_assets({"version": INDEX_VERSION, "files": {}}),
+            "assets.scan-warm": lambda: scan_assets(warm_index),
+            "cleanup.orphans": lambda: find_orphans(warm_index, items),
+            "rules.evaluate": lambda: evaluate(items, rules),
+        }
+        for name, func in benchmarks.items():
+            if not selected(name, only):
+                continue
+            result = measure(func)
+            result["entries"] = entries
+            results[f"{name}@{entries}"] = result
+            print(f"  {name:<20}{entries:>8} 条  {format_seconds(result['best']):>10}  （{result['runs']} 次）")
+        if os.path.exists(out_file):
+            os.remove(out_file)
+    return results
+
+
+def image_benchmarks(only=None):
+    """图片处理的基准测试，结果为每张图片的耗时"""
+    from kidcar.quality import DEFAULT_QUALITY, analyze_image
+    from kidcar.scoring import image_features
+
+    images = synthetic_images()
+
+    def quality():
+        for data in images:
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+                analyze_image(image, DEFAULT_QUALITY, detector=None)
+
+    benchmarks = {
+        "pillow.features": lambda: [image_features(data) for data in images],
+        "pillow.quality": quality,
+    }
+    results = {}
+    for name, func in benchmarks.items():
+        if not selected(name, only):
+            continue
+        result = measure(func)
+        result = {key: value / len(images) if key != "runs" else value for key, value in result.items()}
+        result["images"] = len(images)
+        results[name] = result
+        print(f"  {name:<20}{'每张':>10}  {format_seconds(result['best']):>10}  （{result['runs']} 次）")
+    return results
+
+
+def format_seconds(seconds):
+    """按量级显示耗时"""
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 0.001:
+        return f"{seconds * 1000:.1f} ms"
+    return f"{seconds * 1e6:.0f} µs"
+
+
+def scaling(results, max_exponent):
+    """
+    同一项在最小和最大目录上的耗时增长率: log(耗时比) / log(条目数比)
+    线性为 1，返回 [(名称, 斜率)] 中超过 max_exponent 的项
+    """
+    by_name = {}
+    for key, result in results.items():
+        if "@" in key:
+            name, _ = key.split("@")
+            by_name.setdefault(name, []).append(result)
+    superlinear = []
+    for name, points in by_name.items():
+        if len(points) < 2:
+            continue
+        points.sort(key=lambda result: result["entries"])
+        small, large = points[0], points[-1]
+        if small["best"] <= 0:
+            continue
+        exponent = math.log(large["best"] / small["best"]) / math.log(large["entries"] / small["entries"])
+        if exponent > max_exponent:
+            superlinear.append((name, exponent))
+    return superlinear
+
+
+def compare(results, baseline, settings):
+    """
+    和基线比较，返回 (退化列表, 改善列表)，元素为 (名称, 基线耗时, 当前耗时, 比例)
+    只比较两边都有的项
+    """
+    regressions, improvements = [], []
+    for key, result in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base is None or base["best"] <= 0:
+            continue
+        threshold = settings["Thresholds"].get(key.split("@")[0], settings["Threshold"])
+        ratio = result["best"] / base["best"]
+        delta = result["best"] - base["best"]
+        if ratio > 1 + threshold and delta > settings["MinDelta"]:
+            regressions.append((key, base["best"], result["best"], ratio))
+        elif ratio < 1 / (1 + threshold) and -delta > settings["MinDelta"]:
+            improvements.append((key, base["best"], result["best"], ratio))
+    return regressions, improvements
+
+
+def load_results(results_file):
+    """读取结果文件，不存在时返回 None"""
+    if not os.path.exists(results_file):
+        return None
+    with open(results_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(data, results_file):
+    """保存结果文件，先写临时文件再替换"""
+    os.makedirs(os.path.dirname(os.path.abspath(results_file)), exist_ok=True)
+    tmp_file = f"{results_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_file, results_file)
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="在合成目录上对本地流水线阶段计时，并和基线比较")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help=f"合成目录的条目数，逗号分隔，默认 {','.join(str(size) for size in DEFAULT_SIZES)}")
+    parser.add_argument("--only", help="只运行名称以这些前缀开头的项，逗号分隔，例如 catalogue,rules")
+    parser.add_argument("--no-images", action="store_true", help="跳过图片处理的基准测试")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help=f"基线文件，默认 {BASELINE_FILE}")
+    parser.add_argument("--save-baseline", action="store_true", help="把这次的结果保存为基线")
+    parser.add_argument("--out", default=LATEST_FILE, help=f"结果文件，默认 {LATEST_FILE}")
+    args = parser.parse_args(argv)
+
+    settings = bench_settings()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    only = tuple(prefix.strip() for prefix in args.only.split(",")) if args.only else None
+    check_script = load_script("check_image_audio.py")
+    rules = load_rules(os.path.join(REPO_DIR, RULES_FILE))
+
+    started = time.perf_counter()
+    results = {}
+    # 没有选中目录相关的项时不生成合成目录（100000 条的目录约有 30 万个文件）
+    for entries in sizes if any_selected(CATALOGUE_BENCHMARKS, only) else ():
+        print(f"\n== {entries} 条 ==")
+        results.update(catalogue_benchmarks(entries, rules, check_script, only))
+    if not args.no_images and any_selected(IMAGE_BENCHMARKS, only):
+        print(f"\n== 图片（{IMAGE_COUNT} 张 {IMAGE_SIZE}x{IMAGE_SIZE}）==")
+        results.update(image_benchmarks(only))
+
+    data = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.node(),
+        "results": results,
+    }
+    save_results(data, args.out)
+    print(f"\n结果已保存到 {args.out}（耗时 {time.perf_counter() - started:.1f} 秒）")
+
+    for name, exponent in scaling(results, settings["MaxExponent"]):
+        print(f"⚠️  {name} 的耗时增长快于条目数（斜率 {exponent:.2f}，线性为 1）")
+
+    baseline = load_results(args.baseline)
+    regressions = []
+    if baseline is not None and not args.save_baseline:
+        if baseline.get("machine") != data["machine"]:
+            print(f"⚠️  基线来自另一台机器（{baseline.get('machine')}），比较结果仅供参考")
+        regressions, improvements = compare(results, baseline, settings)
+        for key, base, current, ratio in improvements:
+            print(f"✅ {key}: {format_seconds(base)} -> {format_seconds(current)}（{ratio:.2f}x）")
+        for key, base, current, ratio in regressions:
+            print(f"❌ {key}: {format_seconds(base)} -> {format_seconds(current)}（{ratio:.2f}x）")
+        if not regressions:
+            print(f"和基线 {args.baseline} 相比没有退化")
+    elif not args.save_baseline:
+        print("没有基线，运行 python -m kidcar bench --save-baseline 保存")
+
+    if args.save_baseline:
+        save_results(data, args.baseline)
+        print(f"已保存为基线: {args.baseline}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} 项比基线慢（阈值 {settings['Threshold']:.0%}）")
+        sys.exit(1)
+    return data
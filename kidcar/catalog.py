@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+事物目录（car.json）读写以及资源路径约定
+"""
+
+import json
+import os
+
+# 配置常量
+FLUTTER_DIR = "kid_car_flutter"
+CAR_JSON_FILE = "kid_car_flutter/assets/car.json"
+IMAGES_DIR = "kid_car_flutter/assets/images"
+AUDIOS_DIR = "kid_car_flutter/assets/audios"
+
+# 流水线本地状态目录（资源索引、吞吐量历史等）
+STATE_DIR = ".kidcar"
+
+# 音频字段 -> (文本字段, 语音类型, 文件名后缀)
+# 前两个是 App 播放的基本音频，其余是可选的口音/语速变体（在 local.yaml 的 TTS.Variants 中启用）
+AUDIO_FIELDS = {
+    "chinese-audio-path": ("car-name", "chinese", "zh"),
+    "english-audio-path": ("car-english-name", "english", "en"),
+    "english-gb-audio-path": ("car-english-name", "english-gb", "en-gb"),
+    "english-slow-audio-path": ("car-english-name", "english-slow", "en-slow"),
+    "chinese-slow-audio-path": ("car-name", "chinese-slow", "zh-slow"),
+}
+
+# 预先拼接好的"英文 ×3 + 中文"播放音频（由基本音频拼接，不调用TTS）
+SEQUENCE_FIELD = "sequence-audio-path"
+
+# 朗读 car-description 的音频（按句合成后拼接，python -m kidcar narrate）
+DESCRIPTION_FIELD = "description-audio-path"
+
+# 条目中引用资源的字段 -> 资源类型
+ASSET_FIELDS = {
+    "car-image-path": "image",
+    **{field: "audio" for field in AUDIO_FIELDS},
+    SEQUENCE_FIELD: "sequence",
+    DESCRIPTION_FIELD: "narration",
+}
+
+
+# 流式读取时每次从文件读入的字符数
+READ_CHUNK = 1 << 16
+
+
+def is_jsonl(json_file):
+    """目录文件是否为 JSONL 格式（每行一个条目）"""
+    return json_file.endswith(".jsonl")
+
+
+def load_catalogue(json_file=CAR_JSON_FILE):
+    """加载事物目录，文件不存在时返回空列表"""
+    if not os.path.exists(json_file):
+        return []
+
+    if is_jsonl(json_file):
+        return list(iter_catalogue(json_file))
+    with open(json_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _iter_json_array(f):
+    """逐个解码 JSON 数组中的元素，内存中只保留一块读缓冲和当前元素"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    # 下一个期望的符号: "[" 数组开头，"item" 元素，"," 分隔符或数组结尾
+    expect = "["
+    while True:
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer = f.read(READ_CHUNK)
+            position = 0
+            eof = not buffer
+        if position >= len(buffer):
+            raise ValueError("目录文件不完整")
+
+        char = buffer[position]
+        if expect == "[":
+            if char != "[":
+                raise ValueError("目录文件应为JSON数组")
+            position += 1
+            expect = "item"
+            continue
+        if char == "]":
+            return
+        if expect == ",":
+            if char != ",":
+                raise ValueError(f"目录文件格式错误，位置附近的内容: {buffer[position:position + 20]!r}")
+            position += 1
+            expect = "item"
+            continue
+
+        # 当前元素可能跨越读缓冲，解码失败时读入更多内容再试
+        while True:
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(READ_CHUNK)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+        yield item
+        expect = ","
+
+
+def iter_catalogue(json_file=CAR_JSON_FILE, fields=None):
+    """
+    流式读取事物目录，逐个返回条目，文件不存在时不返回任何条目
+    支持 JSON 数组和 JSONL（.jsonl）；fields 只保留需要的字段（例如不保留很长的 car-description）
+    """
+    if not os.path.exists(json_file):
+        return
+
+    keep = set(fields) if fields else None
+    with open(json_file, 'r', encoding='utf-8') as f:
+        items = (json.loads(line) for line in f if line.strip()) if is_jsonl(json_file) else _iter_json_array(f)
+        for item in items:
+            yield item if keep is None else {key: value for key, value in item.items() if key in keep}
+
+
+class CatalogueReader:
+    """
+    可以反复迭代的流式目录，每次迭代都重新读取文件
+    可以传给只需要遍历条目的函数（规划、清理、校验），代替整个加载到内存的列表
+    """
+
+    def __init__(self, json_file=CAR_JSON_FILE, fields=None):
+        self.json_file = json_file
+        self.fields = fields
+
+    def __iter__(self):
+        return iter_catalogue(self.json_file, self.fields)
+
+
+class CatalogueWriter:
+    """
+    流式写入事物目录：逐条写入临时文件，正常结束时替换原文件，出错时保留原文件
+    JSON 数组的输出和 json.dump(items, indent=2) 一致
+    """
+
+    def __init__(self, json_file=CAR_JSON_FILE):
+        self.json_file = json_file
+        self.tmp_file = f"{json_file}.tmp"
+        self.jsonl = is_jsonl(json_file)
+        self.count = 0
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.tmp_file, 'w', encoding='utf-8')
+        if not self.jsonl:
+            self.file.write("[")
+        return self
+
+    def write(self, item):
+        """写入一个条目"""
+        if self.jsonl:
+            self.file.write(json.dumps(item, ensure_ascii=False) + "\n")
+        else:
+            # 字符串中的换行已被转义，这里的换行都是缩进产生的
+            text = json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            self.file.write(("," if self.count else "") + "\n  " + text)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.jsonl:
+            self.file.write("\n]" if self.count else "]")
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_file, self.json_file)
+        else:
+            os.remove(self.tmp_file)
+        return False
+
+
+def save_catalogue(items, json_file=CAR_JSON_FILE):
+    """保存事物目录，先写临时文件再替换，避免中途崩溃留下半个JSON"""
+    with CatalogueWriter(json_file) as writer:
+        for item in items:
+            writer.write(item)
+
+
+def expected_asset_path(item, field):
+    """根据条目当前的文本计算资源应有的路径（相对于 kid_car_flutter）"""
+    if field == "car-image-path":
+        return f"assets/images/{item['car-name']}_{item['car-type']}.jpg"
+    if field in AUDIO_FIELDS:
+        text_field, _, suffix = AUDIO_FIELDS[field]
+        return f"assets/audios/{item[text_field]}_{suffix}.mp3"
+    if field == SEQUENCE_FIELD:
+        return f"assets/audios/{item['car-name']}_{item['car-english-name']}_seq.mp3"
+    if field == DESCRIPTION_FIELD:
+        return f"assets/audios/{item['car-name']}_{item['car-type']}_desc.mp3"
+    raise ValueError(f"未知的资源字段: {field}")
+
+
+def to_disk_path(asset_path):
+    """assets/xxx -> kid_car_flutter/assets/xxx"""
+    return os.path.join(FLUTTER_DIR, asset_path)
+
+
+def to_asset_path(disk_path, root=FLUTTER_DIR):
+    """kid_car_flutter/assets/xxx -> assets/xxx"""
+    return os.path.relpath(disk_path, root).replace(os.sep, '/')
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+资源清理
+
+根据资源索引找出没有被 car.json 引用的文件，把要删除的文件整批移动到
+.kidcar/trash/<时间>/ 中（同一文件系统上只是一次 rename），而不是直接删除。
+每批都有 manifest.json 记录移走的文件和被删除的目录条目，可以整批恢复。
+--yes 用于无人值守运行，--max-delete 限制一次最多移走的文件数，防止误删整个目录。
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kidcar.assets import build_case_lookup, resolve_asset, save_asset_index, scan_assets
+from kidcar.catalog import ASSET_FIELDS, CAR_JSON_FILE, STATE_DIR, CatalogueReader, load_catalogue, save_catalogue, to_disk_path
+
+TRASH_DIR = os.path.join(STATE_DIR, "trash")
+MANIFEST_FILE = "manifest.json"
+
+# 一次最多移走的文件数，超过时需要用 --max-delete 明确放宽
+DEFAULT_MAX_DELETE = 100
+
+# 并行移动文件的线程数
+DEFAULT_WORKERS = 8
+
+
+def referenced_assets(items):
+    """目录中引用的所有资源路径"""
+    referenced = set()
+    for item in items:
+        for field in ASSET_FIELDS:
+            asset_path = item.get(field, "").strip()
+            if asset_path:
+                referenced.add(asset_path)
+    return referenced
+
+
+def find_orphans(index, items):
+    """
+    找出没有被目录引用的资源文件
+    和引用路径只差大小写的文件不算孤立文件，它们由 plan_generation.py 提示改名
+    """
+    referenced = {path.lower() for path in referenced_assets(items)}
+    return sorted(path for path in index["files"] if path.lower() not in referenced)
+
+
+def confirm(count, yes=False, max_delete=DEFAULT_MAX_DELETE, action="移到回收站"):
+    """
+    删除前的保护检查，返回是否继续
+    - 超过 max_delete 时直接拒绝
+    - 没有 --yes 时在终端中询问，非交互运行（没有终端）时拒绝
+    """
+    if max_delete is not None and count > max_delete:
+        print(f"将要{action}的文件有 {count} 个，超过上限 {max_delete}，已取消。确认无误请使用 --max-delete {count}")
+        return False
+    if yes:
+        return True
+    if not sys.stdin.isatty():
+        print("非交互运行，需要使用 --yes 确认")
+        return False
+    response = input(f"是否要把这 {count} 个文件{action}？(y/n): ").strip().lower()
+    return response == 'y'
+
+
+def _move(source, target):
+    """移动单个文件，同一文件系统上是一次 rename，跨文件系统时退回复制"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.rename(source, target)
+    except OSError:
+        shutil.move(source, target)
+
+
+def new_batch_dir(trash_dir=TRASH_DIR):
+    """创建新的回收站批次目录"""
+    batch = time.strftime('%Y%m%d-%H%M%S')
+    batch_dir = os.path.join(trash_dir, batch)
+    suffix = 1
+    while os.path.exists(batch_dir):
+        suffix += 1
+        batch_dir = os.path.join(trash_dir, f"{batch}-{suffix}")
+    os.makedirs(batch_dir)
+    return batch_dir
+
+
+def move_to_trash(asset_paths, reason, entries=None, json_file=CAR_JSON_FILE, workers=DEFAULT_WORKERS, trash_dir=TRASH_DIR):
+    """
+    把资源文件整批移到回收站，返回 (批次目录, 移动成功的路径列表)
+    entries 为同时从目录 json_file 中删除的条目 [(原位置, 条目)]，恢复时一起放回
+    """
+    batch_dir = new_batch_dir(trash_dir)
+    moved = []
+    failed = []
+
+    def move_one(asset_path):
+        try:
+            _move(to_disk_path(asset_path), os.path.join(batch_dir, asset_path))
+            return asset_path, None
+        except OSError as e:
+            return asset_path, e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for asset_path, error in executor.map(move_one, asset_paths):
+            if error is None:
+                moved.append(asset_path)
+            else:
+                failed.append(asset_path)
+                print(f"移动失败 {asset_path}: {error}")
+
+    manifest = {
+        "created": time.time(),
+        "reason": reason,
+        "files": moved,
+        "catalogue": json_file,
+        "entries": [{"index": position, "item": item} for position, item in (entries or [])],
+    }
+    with open(os.path.join(batch_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"已移动 {len(moved)} 个文件到 {batch_dir}，失败 {len(failed)} 个")
+    return batch_dir, moved
+
+
+def list_batches(trash_dir=TRASH_DIR):
+    """回收站中的批次，按时间从旧到新排列，返回 [(批次目录, manifest)]"""
+    if not os.path.exists(trash_dir):
+        return []
+    batches = []
+    for name in os.listdir(trash_dir):
+        manifest_path = os.path.join(trash_dir, name, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                batches.append((os.path.join(trash_dir, name), json.load(f)))
+    return sorted(batches, key=lambda batch: batch[1]["created"])
+
+
+def restore_batch(batch_dir, workers=DEFAULT_WORKERS):
+    """
+    恢复一批文件和目录条目
+    原位置已有同名文件时跳过该文件，目录中已有名称和类型都相同的条目时跳过该条目
+    """
+    with open(os.path.join(batch_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    restorable = [path for path in manifest["files"] if not os.path.exists(to_disk_path(path))]
+    for asset_path in manifest["files"]:
+        if asset_path not in restorable:
+            print(f"原位置已有文件，跳过: {asset_path}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda path: _move(os.path.join(batch_dir, path), to_disk_path(path)), restorable))
+
+    restored_entries = 0
+    if manifest["entries"]:
+        json_file = manifest.get("catalogue", CAR_JSON_FILE)
+        items = load_catalogue(json_file)
+        # 重名的条目按类型区分（例如玩具和运动项目中的"跳绳"）
+        keys = {(item.get("car-name"), item.get("car-type")) for item in items}
+        for entry in sorted(manifest["entries"], key=lambda entry: entry["index"]):
+            key = (entry["item"].get("car-name"), entry["item"].get("car-type"))
+            if key in keys:
+                print(f"目录中已有条目，跳过: {key[0]} ({key[1]})")
+                continue
+            keys.add(key)
+            items.insert(min(entry["index"], len(items)), entry["item"])
+            restored_entries += 1
+        save_catalogue(items, json_file)
+
+    skipped = len(manifest["files"]) - len(restorable)
+    if skipped == 0:
+        shutil.rmtree(batch_dir)
+    print(f"已恢复 {len(restorable)} 个文件、{restored_entries} 个条目" + (f"，{skipped} 个文件保留在 {batch_dir}" if skipped else ""))
+    return restorable
+
+
+def empty_trash(older_than_days=0, trash_dir=TRASH_DIR):
+    """清空回收站中早于指定天数的批次"""
+    cutoff = time.time() - older_than_days * 86400
+    removed = 0
+    for batch_dir, manifest in list_batches(trash_dir):
+        if manifest["created"] <= cutoff:
+            shutil.rmtree(batch_dir)
+            removed += 1
+    print(f"已清空 {removed} 批")
+    return removed
+
+
+def print_batches(batches):
+    """打印回收站批次"""
+    if not batches:
+        print("回收站是空的")
+        return
+    for batch_dir, manifest in batches:
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(manifest["created"]))
+        print(f"{os.path.basename(batch_dir)}  {created}  {manifest['reason']}  文件 {len(manifest['files'])} 个，条目 {len(manifest['entries'])} 个")
+
+
+def trash_entry_assets(items, removed, json_file=CAR_JSON_FILE, index=None, yes=False, max_delete=DEFAULT_MAX_DELETE, workers=DEFAULT_WORKERS):
+    """
+    从目录中删除条目时把它们的资源移到回收站
+    items 为保留的条目（可以是流式读取的目录，只遍历一次），removed 为 [(原位置, 条目)]，
+    仍被保留条目引用的文件不会移走
+    返回回收站批次目录，取消时返回 None
+    """
+    if index is None:
+        index = scan_assets()
+    case_lookup = build_case_lookup(index)
+    still_referenced = {path.lower() for path in referenced_assets(items)}
+
+    asset_paths = set()
+    for _, item in removed:
+        for field in ASSET_FIELDS:
+            asset_path = item.get(field, "").strip()
+            if not asset_path or asset_path.lower() in still_referenced:
+                continue
+            actual_path, entry = resolve_asset(index, case_lookup, asset_path)
+            if entry is not None:
+                asset_paths.add(actual_path)
+
+    if asset_paths and not confirm(len(asset_paths), yes, max_delete):
+        return None
+    batch_dir, _ = move_to_trash(sorted(asset_paths), "invalid-entries", entries=removed, json_file=json_file, workers=workers)
+    save_asset_index(scan_assets(index))
+    return batch_dir
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="资源清理 - 把没有被 car.json 引用的图片和音频移到回收站")
+    parser.add_argument("--yes", "-y", action="store_true", help="不询问直接执行（用于自动化）")
+    parser.add_argument("--max-delete", type=int, default=DEFAULT_MAX_DELETE, help=f"一次最多移走的文件数，默认 {DEFAULT_MAX_DELETE}")
+    parser.add_argument("--dry-run", action="store_true", help="只列出孤立文件")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"并行移动文件的线程数，默认 {DEFAULT_WORKERS}")
+    parser.add_argument("--list-trash", action="store_true", help="列出回收站中的批次")
+    parser.add_argument("--restore", nargs="?", const="latest", metavar="批次", help="恢复一批文件，默认恢复最近一批")
+    parser.add_argument("--empty-trash", type=float, metavar="天数", help="清空回收站中早于指定天数的批次（0 为全部）")
+    args = parser.parse_args(argv)
+
+    if args.list_trash:
+        print_batches(list_batches())
+        return None
+    if args.empty_trash is not None:
+        return empty_trash(args.empty_trash)
+    if args.restore:
+        batches = list_batches()
+        if not batches:
+            print("回收站是空的")
+            return None
+        if args.restore == "latest":
+            batch_dir = batches[-1][0]
+        else:
+            batch_dir = os.path.join(TRASH_DIR, args.restore)
+            if not os.path.exists(os.path.join(batch_dir, MANIFEST_FILE)):
+                print(f"回收站中没有批次: {args.restore}")
+                return None
+        restored = restore_batch(batch_dir, args.workers)
+        save_asset_index(scan_assets())
+        return restored
+
+    print("正在分析文件...")
+    index = scan_assets()
+    # 只需要资源路径，流式读取目录
+    items = CatalogueReader(fields=ASSET_FIELDS)
+    orphans = find_orphans(index, items)
+    print(f"目录中的条目: {sum(1 for _ in items)}，资源文件: {len(index['files'])}")
+    print(f"\n未使用的文件数量: {len(orphans)}")
+    if not orphans:
+        print("没有发现未使用的文件")
+        save_asset_index(index)
+        return []
+
+    for i, asset_path in enumerate(orphans, 1):
+        print(f"{i}. {asset_path}")
+    if args.dry_run or not confirm(len(orphans), args.yes, args.max_delete):
+        save_asset_index(index)
+        return []
+
+    _, moved = move_to_trash(orphans, "orphans", workers=args.workers)
+    save_asset_index(scan_assets(index))
+    print("可以用 --restore 恢复")
+    return moved
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+统一命令入口: python -m kidcar <命令> [参数...]
+
+只导入所选命令需要的模块，check、plan 这类不调用服务商的命令启动时
+不会导入 openai、google-genai、numpy 等重型依赖。
+原来的各个脚本仍然可以直接运行，这里只是把它们集中到一个入口。
+"""
+
+import argparse
+import importlib
+import os
+import runpy
+import sys
+
+from kidcar.profiling import run_main
+
+# 仓库根目录，各脚本都放在这里
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 命令 -> (kidcar 模块或仓库根目录下的脚本, 说明)
+COMMANDS = {
+    "items": ("kidcar.sources", "比较 items/ 中的事物清单和 car.json，应用改名和删除"),
+    "names": ("car-name.py", "生成事物名称、英文名称、描述和音标"),
+    "image": ("generate-image.py", "用 ModelScope Qwen-Image 生成图片"),
+    "doubao-image": ("doubao-generate-image.py", "用豆包生成图片"),
+    "gemini-image": ("generate-image-gemini.py", "用 Gemini 生成图片"),
+    "audio": ("generate-audio.py", "生成中文和英文音频"),
+    "narrate": ("kidcar.narration", "按句并行合成 car-description 的朗读音频，拼接成每个条目一个文件"),
+    "sequences": ("kidcar.sequence", "把英文音频三遍和中文音频一遍拼接成一个播放音频"),
+    "applaud": ("generate-kid-applaud.py", "生成鼓励音频"),
+    "check": ("check_image_audio.py", "检查图片和音频文件是否存在"),
+    "validate": ("validate_car_data.py", "校验并清理 car.json 中不完整的条目"),
+    "remove": ("remove-image-audio.py", "把没有被 car.json 引用的资源文件移到回收站，或从回收站恢复"),
+    "plan": ("kidcar.plan", "列出待生成的资源并估算调用次数和耗时"),
+    "dedupe": ("kidcar.dedupe", "查找重复和近似重复的图片"),
+    "qa": ("kidcar.quality", "检查图片质量（空白、单色、边框、水印、比例、人物）"),
+    "bench": ("kidcar.bench", "在合成的 600 / 1 万 / 10 万条目录上对本地流水线阶段计时，和基线比较"),
+    "metrics": ("kidcar.metrics", "汇总生成脚本的运行指标"),
+    "sync": ("kidcar.sync", "把 Flutter 的资源和目录增量同步到 Vue 应用"),
+    "state": ("kidcar.state", "查看生成中、失败和已隔离的资源，解除隔离"),
+    "export": ("kidcar.export", "导出 Vue 应用的分块目录、带哈希的资源和预缓存清单"),
+    "serve": ("kidcar.serve", "本地目录服务：分类、搜索、分页 API，以及支持 Range 和 ETag 的图片和音频"),
+    "watch": ("kidcar.watch", "监视 car.json 和资源目录，编辑后自动重新生成受影响的资源并导出"),
+}
+
+
+def run_command(name, args):
+    """运行一个命令，args 为传给命令的参数"""
+    target = COMMANDS[name][0]
+    if target.endswith(".py"):
+        # 脚本自己的 __main__ 分支会处理 --profile
+        script = os.path.join(REPO_DIR, target)
+        sys.argv = [script] + args
+        runpy.run_path(script, run_name="__main__")
+        return None
+
+    sys.argv = [f"python -m kidcar {name}"] + args
+    module = importlib.import_module(target)
+    return run_main(module.main, name)
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        prog="python -m kidcar",
+        description="kid-car 资源生成流水线",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="命令:\n" + "\n".join(f"  {name:<14}{description}" for name, (_, description) in COMMANDS.items()),
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="命令", help="要运行的命令，见下方列表")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="传给命令的参数，例如 --help、--profile")
+    args = parser.parse_args(argv)
+    return run_command(args.command, args.args)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+服务商自适应并发（AIMD）
+
+每个服务商一个控制器，代替各脚本中固定的 sleep 和固定的并发数：
+  - 请求成功且延迟正常（不超过基线延迟的 LATENCY_FACTOR 倍）时，并发上限加法增长，每完成"上限"个任务加 1
+  - 遇到 429、5xx 或超时时，并发上限乘以 DECREASE（减半），同一次拥塞中只减一次；
+    响应带 Retry-After 时在此之前不再发出新任务
+  - 延迟明显变长但没有出错时保持不变
+
+HTTP 请求经过 kidcar.metrics.traced_request，状态码和超时会自动反馈给对应服务商的控制器；
+SDK 调用（openai、google-genai）的异常由 run_adaptive 或调用方用 report_error 反馈。
+run_adaptive 中因拥塞失败的任务在暂停期后自动重试（最多 MAX_RETRIES 次），重试次数记在追踪的 retries 计数器中。
+每个服务商最后一次的并发上限保存在 .kidcar/concurrency.json，下次运行从这里开始。
+
+local.yaml 示例（可选，默认 Initial 2、Max 16）:
+  Concurrency:
+    edge-tts: {Initial: 4, Max: 12}
+    doubao-image: {Max: 4}
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from kidcar.catalog import STATE_DIR
+from kidcar.config import get_section
+from kidcar.metrics import count
+
+LIMITS_FILE = os.path.join(STATE_DIR, "concurrency.json")
+
+DEFAULT_INITIAL = 2
+DEFAULT_MAX = 16
+
+# 拥塞时并发上限乘以这个系数
+DECREASE = 0.5
+
+# 延迟超过基线的多少倍时不再增加并发
+LATENCY_FACTOR = 2.0
+
+# 视为拥塞的状态码
+OVERLOAD_STATUS = (408, 429, 500, 502, 503, 504)
+
+# 没有 Retry-After 时，拥塞后暂停发出新任务的秒数
+DEFAULT_BACKOFF = 1.0
+
+# run_adaptive 中因拥塞失败的任务在暂停期后最多重试的次数
+MAX_RETRIES = 2
+
+_controllers = {}
+_registry_lock = threading.Lock()
+
+
+class Controller:
+    """一个服务商的并发控制器"""
+
+    def __init__(self, provider, initial=DEFAULT_INITIAL, maximum=DEFAULT_MAX, minimum=1):
+        self.provider = provider
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.baseline = None
+        self.latency = None
+        self.blocked_until = 0.0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self):
+        """有空闲名额且不在暂停期时占用一个名额，返回是否成功"""
+        with self._cond:
+            if self.in_flight >= int(self.limit) or time.time() < self.blocked_until:
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self):
+        """等待并占用一个名额"""
+        with self._cond:
+            while self.in_flight >= int(self.limit) or time.time() < self.blocked_until:
+                self._cond.wait(timeout=max(0.05, self.blocked_until - time.time()))
+            self.in_flight += 1
+
+    def release(self):
+        """释放名额"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def wait_ready(self):
+        """等到暂停期结束（用于不并发的脚本代替固定的 sleep）"""
+        delay = self.blocked_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_success(self, seconds):
+        """任务成功：更新延迟，延迟正常时加法增加并发上限"""
+        with self._cond:
+            self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+            # 基线取最近的较低延迟，缓慢上浮，服务商整体变慢后也能适应
+            if self.baseline is None or seconds < self.baseline:
+                self.baseline = seconds
+            else:
+                self.baseline += (seconds - self.baseline) * 0.02
+            if self.latency <= self.baseline * LATENCY_FACTOR:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def on_overload(self, retry_after=None):
+        """遇到 429、5xx 或超时：乘法减小并发上限，并暂停发出新任务"""
+        with self._cond:
+            now = time.time()
+            # 同时在途的请求会一起失败，只按一次拥塞处理
+            window = max(self.latency or 0, DEFAULT_BACKOFF)
+            if now - self._last_decrease >= window:
+                self.limit = max(self.minimum, self.limit * DECREASE)
+                self._last_decrease = now
+                self.decreases += 1
+                print(f"  {self.provider} 服务繁忙，并发降到 {int(self.limit)}")
+            self.blocked_until = max(self.blocked_until, now + (retry_after if retry_after is not None else DEFAULT_BACKOFF))
+
+
+def load_limits(limits_file=LIMITS_FILE):
+    """上次运行结束时各服务商的并发上限"""
+    if not os.path.exists(limits_file):
+        return {}
+    try:
+        with open(limits_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_limits(limits_file=LIMITS_FILE):
+    """保存各服务商当前的并发上限"""
+    with _registry_lock:
+        limits = {**load_limits(limits_file), **{name: round(c.limit, 2) for name, c in _controllers.items()}}
+    os.makedirs(os.path.dirname(limits_file), exist_ok=True)
+    tmp_file = f"{limits_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(limits, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, limits_file)
+
+
+def starting_limit(provider):
+    """服务商下次运行的起始并发上限：上次保存的上限，没有时用配置的 Initial"""
+    settings = get_section("Concurrency").get(provider) or {}
+    return load_limits().get(provider, settings.get("Initial", DEFAULT_INITIAL))
+
+
+def get_controller(provider, fixed=None):
+    """
+    服务商的控制器，同一进程中共享
+    fixed 为固定并发数（例如命令行 --workers），指定后不再自适应
+    """
+    with _registry_lock:
+        controller = _controllers.get(provider)
+        if controller is None:
+            settings = get_section("Concurrency").get(provider) or {}
+            maximum = settings.get("Max", DEFAULT_MAX)
+            controller = Controller(provider, starting_limit(provider), maximum)
+            _controllers[provider] = controller
+        if fixed:
+            controller.minimum = controller.maximum = fixed
+            controller.limit = float(fixed)
+        return controller
+
+
+def retry_after_seconds(headers):
+    """解析 Retry-After（秒数），没有或无法解析时返回 None"""
+    value = (headers or {}).get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_overload_error(error):
+    """异常是否表示服务商拥塞：超时、连接失败、带 429 / 5xx 状态码的 SDK 或 requests 异常"""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and status in OVERLOAD_STATUS:
+        return True
+    name = type(error).__name__
+    return any(word in name for word in ("Timeout", "RateLimit", "ConnectionError", "ServiceUnavailable"))
+
+
+def report_status(provider, status, headers=None):
+    """反馈一次HTTP响应的状态码"""
+    if status in OVERLOAD_STATUS:
+        get_controller(provider).on_overload(retry_after_seconds(headers))
+
+
+def report_error(provider, error):
+    """反馈一次请求异常，拥塞类的异常会减小并发"""
+    if is_overload_error(error):
+        get_controller(provider).on_overload()
+        return True
+    return False
+
+
+def run_adaptive(jobs, fn, provider, fixed=None, retries=MAX_RETRIES):
+    """
+    按服务商的自适应并发执行 fn(job)
+    按完成顺序逐个返回 (job, 结果, 异常)，在调用方线程中返回，调用方可以直接修改目录并保存
+    因拥塞（429、5xx、超时）失败的任务在暂停期后重新执行，最多 retries 次，每次重试计入 retries 计数器
+    """
+    controller = get_controller(provider, fixed)
+    jobs = iter(jobs)
+    # 等待重试的 (任务, 已重试次数)，优先于新任务发出
+    retry_queue = deque()
+
+    def run(job, attempt):
+        start = time.perf_counter()
+        try:
+            result = fn(job)
+        except Exception as e:
+            report_error(provider, e)
+            return job, attempt, None, e
+        finally:
+            controller.release()
+        controller.on_success(time.perf_counter() - start)
+        return job, attempt, result, None
+
+    futures = set()
+    exhausted = False
+    try:
+        with ThreadPoolExecutor(max_workers=controller.maximum) as executor:
+            while futures or retry_queue or not exhausted:
+                while (retry_queue or not exhausted) and controller.try_acquire():
+                    if retry_queue:
+                        job, attempt = retry_queue.popleft()
+                    else:
+                        job, attempt = next(jobs, None), 0
+                        if job is None:
+                            controller.release()
+                            exhausted = True
+                            break
+                    futures.add(executor.submit(run, job, attempt))
+                if not futures:
+                    # 拥塞后的暂停期
+                    controller.wait_ready()
+                    continue
+                # 定期醒来，并发上限提高后可以及时发出新任务
+                done, futures = wait(futures, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, attempt, result, error = future.result()
+                    if error is not None and attempt < retries and is_overload_error(error):
+                        count("retries", provider=provider)
+                        retry_queue.append((job, attempt + 1))
+                        continue
+                    yield job, result, error
+    finally:
+        if not fixed:
+            save_limits()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+local.yaml 配置读取
+
+配置在一个进程里只读取一次，各脚本通过 load_config() 共享同一份结果。
+yaml 在第一次读取时才导入，不需要配置的命令（check、plan 等）不用付出导入开销。
+"""
+
+import os
+
+CONFIG_FILE = "local.yaml"
+
+# 已读取的配置：配置文件路径 -> 配置字典
+_cache = {}
+
+
+def load_config(config_file=CONFIG_FILE, required=True):
+    """
+    读取配置文件，同一文件只读取一次
+    required=False 时文件不存在返回空字典，否则抛出 FileNotFoundError；
+    YAML格式错误时抛出 ValueError
+    """
+    if config_file in _cache:
+        return _cache[config_file]
+
+    if not os.path.exists(config_file):
+        if required:
+            raise FileNotFoundError(f"配置文件 {config_file} 不存在")
+        return {}
+
+    import yaml
+
+    with open(config_file, 'r', encoding='utf-8') as f:
+        try:
+            config = yaml.safe_load(f) or {}
+        except yaml.YAMLError as e:
+            raise ValueError(f"配置文件 {config_file} 格式错误: {e}") from e
+    _cache[config_file] = config
+    return config
+
+
+def get_section(name, config_file=CONFIG_FILE):
+    """读取配置中的一个分组（例如 ModelScope、Doubao、Edge），没有时返回空字典"""
+    return load_config(config_file, required=False).get(name) or {}
+
+
+def get_proxies(config_file=CONFIG_FILE):
+    """requests 使用的代理配置，没有配置 Proxy 时返回 None"""
+    proxy = get_section("Proxy", config_file)
+    if not proxy:
+        return None
+    return {
+        "http": proxy.get("HttpProxy"),
+        "https": proxy.get("HttpsProxy"),
+    }
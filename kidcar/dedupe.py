@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+图片感知哈希去重
+
+对 assets/images 中的图片计算 pHash 和 dHash（NumPy 向量化，多进程解码），
+找出内容完全相同的文件和看起来几乎一样的图片。完全相同的文件可以改成硬链接，
+近似重复的图片可以标记为需要重新生成（下次运行图片脚本时重新生成）。
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from kidcar.assets import save_asset_index, scan_assets
+from kidcar.catalog import STATE_DIR, load_catalogue, save_catalogue, to_disk_path
+from kidcar.fingerprint import invalidate_fingerprint
+
+HASH_CACHE_FILE = os.path.join(STATE_DIR, "image-hashes.json")
+
+# pHash 先缩放到 32x32 做 DCT，取左上角 8x8 低频系数
+PHASH_SIZE = 32
+HASH_SIZE = 8
+
+# 近似重复还要求中间区域（宽高各取中间一半，主体所在的位置）的平均颜色接近（RGB欧氏距离），
+# 否则灰色和青色这样构图相同、只有主体颜色不同的图片会被判为重复。
+# 整张图的平均颜色被相同的背景主导，灰色和青色只差 28 左右，区分不开
+COLOR_THRESHOLD = 48
+
+# 每个进程一次处理的图片数量
+CHUNK_SIZE = 32
+
+# 8位整数 -> 其中1的个数，用于计算汉明距离
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(size):
+    """DCT-II 变换矩阵"""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _pack_bits(bits):
+    """把 (N, 64) 的布尔数组打包成 N 个 uint64"""
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+    return packed.view('>u8').reshape(-1).astype(np.uint64)
+
+
+def compute_hashes(pixels_32, pixels_9x8):
+    """
+    批量计算哈希
+    pixels_32: (N, 32, 32) 灰度图，用于 pHash
+    pixels_9x8: (N, 8, 9) 灰度图，用于 dHash
+    返回 (phash, dhash)，均为 N 个 uint64
+    """
+    # 对整批图片同时做二维DCT: C @ X @ C^T
+    coefficients = _DCT @ pixels_32 @ _DCT.T
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels_32), -1)
+    # 去掉直流分量后取中位数
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    phash = _pack_bits(low > median)
+
+    dhash = _pack_bits(pixels_9x8[:, :, 1:] > pixels_9x8[:, :, :-1])
+    return phash, dhash
+
+
+def _load_and_hash(disk_paths):
+    """工作进程：解码一批图片并计算哈希"""
+    pixels_32 = []
+    pixels_9x8 = []
+    colors = []
+    valid = []
+    for disk_path in disk_paths:
+        try:
+            with Image.open(disk_path) as image:
+                gray = image.convert("L")
+                pixels_32.append(np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64))
+                pixels_9x8.append(np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16))
+                width, height = image.size
+                center = image.convert("RGB").crop((width // 4, height // 4, width * 3 // 4, height * 3 // 4))
+                colors.append(center.resize((1, 1), Image.BOX).getpixel((0, 0)))
+            valid.append(disk_path)
+        except Exception as e:
+            print(f"无法读取图片 {disk_path}: {e}")
+
+    if not valid:
+        return []
+    phash, dhash = compute_hashes(np.stack(pixels_32), np.stack(pixels_9x8))
+    return [
+        (path, {"phash": f"{p:016x}", "dhash": f"{d:016x}", "center": "{:02x}{:02x}{:02x}".format(*color)})
+        for path, p, d, color in zip(valid, phash.tolist(), dhash.tolist(), colors)
+    ]
+
+
+def load_hash_cache(cache_file=HASH_CACHE_FILE):
+    """加载哈希缓存（sha256 -> 感知哈希）"""
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取图片哈希缓存失败: {e}")
+        return {}
+
+
+def save_hash_cache(cache, cache_file=HASH_CACHE_FILE):
+    """保存哈希缓存"""
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, sort_keys=True)
+    os.replace(tmp_file, cache_file)
+
+
+def hash_images(index, workers=None):
+    """
+    计算索引中所有图片的感知哈希
+    以文件内容的 sha256 为键缓存，内容没变的图片不会重新解码
+    返回 {资源路径: {"sha256", "phash", "dhash", "center"}}，center 为中间区域的平均颜色
+    """
+    cache = load_hash_cache()
+    images = {
+        path: entry for path, entry in index["files"].items()
+        if entry["kind"] == "image" and not entry.get("corrupt")
+    }
+
+    todo = sorted({to_disk_path(path) for path, entry in images.items() if "center" not in cache.get(entry["sha256"], {})})
+    if todo:
+        print(f"需要计算哈希的图片: {len(todo)} 张")
+        disk_to_sha = {to_disk_path(path): entry["sha256"] for path, entry in images.items()}
+        chunks = [todo[i:i + CHUNK_SIZE] for i in range(0, len(todo), CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for results in executor.map(_load_and_hash, chunks):
+                for disk_path, image_hashes in results:
+                    cache[disk_to_sha[disk_path]] = image_hashes
+        save_hash_cache(cache)
+
+    hashes = {}
+    for path, entry in images.items():
+        cached = cache.get(entry["sha256"])
+        if cached:
+            hashes[path] = {"sha256": entry["sha256"], **cached}
+    return hashes
+
+
+def hamming_distances(values, block_size=1024):
+    """
+    计算 uint64 数组两两之间的汉明距离
+    按行分块，避免大目录时一次性分配 N*N*8 字节的中间数组
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    count = len(values)
+    distances = np.empty((count, count), dtype=np.uint8)
+    for start in range(0, count, block_size):
+        xor = values[start:start + block_size, None] ^ values[None, :]
+        distances[start:start + block_size] = _POPCOUNT_TABLE[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=2)
+    return distances
+
+
+def hamming_to(value, values):
+    """一个 uint64 和数组中每个值的汉明距离"""
+    xor = np.asarray(values, dtype=np.uint64) ^ np.uint64(value)
+    return _POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _union_find_clusters(count, pairs):
+    """把相连的下标对合并成簇"""
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = {}
+    for i in range(count):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def find_duplicates(hashes, threshold=10, color_threshold=COLOR_THRESHOLD):
+    """
+    查找重复图片
+    返回 (完全相同的簇, 近似重复的簇)，每个簇是按路径排序的资源路径列表
+    近似重复要求 pHash 和 dHash 的汉明距离都不超过 threshold，且中间区域的平均颜色距离不超过 color_threshold
+    """
+    # 完全相同：文件内容哈希一致
+    by_sha = {}
+    for path, entry in hashes.items():
+        by_sha.setdefault(entry["sha256"], []).append(path)
+    exact = [sorted(paths) for paths in by_sha.values() if len(paths) > 1]
+
+    # 近似重复：每组完全相同的文件只取一个代表参与比较
+    representatives = sorted(paths[0] for paths in by_sha.values())
+    if len(representatives) < 2:
+        return sorted(exact), []
+
+    phash = np.array([int(hashes[path]["phash"], 16) for path in representatives], dtype=np.uint64)
+    dhash = np.array([int(hashes[path]["dhash"], 16) for path in representatives], dtype=np.uint64)
+    colors = np.array([bytes.fromhex(hashes[path]["center"]) for path in representatives], dtype='S3').view(np.uint8).reshape(-1, 3).astype(np.float32)
+    color_distances = np.sqrt(((colors[:, None, :] - colors[None, :, :]) ** 2).sum(axis=2))
+    close = (hamming_distances(phash) <= threshold) & (hamming_distances(dhash) <= threshold) & (color_distances <= color_threshold)
+    rows, cols = np.nonzero(np.triu(close, k=1))
+    near = [sorted(representatives[i] for i in members) for members in _union_find_clusters(len(representatives), zip(rows.tolist(), cols.tolist()))]
+    return sorted(exact), sorted(near)
+
+
+def hard_link_duplicates(cluster):
+    """
+    把完全相同的文件改成指向第一个文件的硬链接
+    返回节省的字节数
+    """
+    canonical = to_disk_path(cluster[0])
+    canonical_stat = os.stat(canonical)
+    saved = 0
+    for path in cluster[1:]:
+        disk_path = to_disk_path(path)
+        stat = os.stat(disk_path)
+        if stat.st_ino == canonical_stat.st_ino and stat.st_dev == canonical_stat.st_dev:
+            continue
+        # 先在旁边建立链接再原子替换，中途失败不会丢文件
+        tmp_path = f"{disk_path}.link"
+        os.link(canonical, tmp_path)
+        os.replace(tmp_path, disk_path)
+        saved += stat.st_size
+    return saved
+
+
+def items_by_image(catalogue):
+    """图片路径（小写）-> 引用它的 (目录中的位置, 条目) 列表"""
+    mapping = {}
+    for position, item in enumerate(catalogue):
+        path = item.get("car-image-path", "").strip()
+        if path:
+            mapping.setdefault(path.lower(), []).append((position, item))
+    return mapping
+
+
+def describe_cluster(cluster, image_items):
+    """把簇中的每个文件和引用它的条目格式化成文本"""
+    lines = []
+    for path in cluster:
+        names = ", ".join(f"{item['car-name']}({item['car-type']})" for _, item in image_items.get(path.lower(), []))
+        lines.append(f"    {path}  <- {names or '未被引用'}")
+    return lines
+
+
+def flag_cluster(cluster, image_items, reason):
+    """
+    保留簇中在目录里最靠前的条目，其余引用这些图片的条目标记为需要重新生成
+    返回被标记的条目
+    """
+    referencing = []
+    for path in cluster:
+        referencing.extend(image_items.get(path.lower(), []))
+    if len(referencing) < 2:
+        return []
+
+    # 簇按路径排序，保留的条目按目录顺序选
+    referencing.sort(key=lambda entry: entry[0])
+    flagged = [item for _, item in referencing[1:]]
+    for item in flagged:
+        invalidate_fingerprint(item, "car-image-path", reason)
+    return flagged
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="图片去重 - 查找完全相同和近似重复的图片")
+    parser.add_argument("--threshold", type=int, default=10, help="近似重复的汉明距离阈值（0-64），默认 10")
+    parser.add_argument("--workers", type=int, default=None, help="解码图片的进程数，默认为CPU核数")
+    parser.add_argument("--link", action="store_true", help="把内容完全相同的文件改成硬链接")
+    parser.add_argument("--flag", action="store_true", help="把重复图片标记为需要重新生成（之后运行图片脚本时重新生成）")
+    parser.add_argument("--json", dest="json_path", help="将重复簇写入JSON文件")
+    args = parser.parse_args(argv)
+
+    index = scan_assets()
+    save_asset_index(index)
+    hashes = hash_images(index, args.workers)
+    print(f"共 {len(hashes)} 张图片")
+
+    exact, near = find_duplicates(hashes, args.threshold)
+    catalogue = load_catalogue()
+    image_items = items_by_image(catalogue)
+
+    print(f"\n=== 内容完全相同: {len(exact)} 组 ===")
+    for cluster in exact:
+        print(f"  - {len(cluster)} 个文件")
+        print("\n".join(describe_cluster(cluster, image_items)))
+
+    print(f"\n=== 近似重复（阈值 {args.threshold}）: {len(near)} 组 ===")
+    for cluster in near:
+        print(f"  - {len(cluster)} 张图片")
+        print("\n".join(describe_cluster(cluster, image_items)))
+
+    if args.link and exact:
+        saved = sum(hard_link_duplicates(cluster) for cluster in exact)
+        print(f"\n已改为硬链接，节省 {saved} 字节")
+        # 硬链接改变了文件的修改时间，刷新索引
+        save_asset_index(scan_assets(index))
+
+    if args.flag:
+        flagged = []
+        for cluster in exact:
+            flagged.extend(flag_cluster(cluster, image_items, "duplicate"))
+        for cluster in near:
+            flagged.extend(flag_cluster(cluster, image_items, "near-duplicate"))
+        if flagged:
+            save_catalogue(catalogue)
+        print(f"\n已标记 {len(flagged)} 个条目需要重新生成图片")
+        for item in flagged:
+            print(f"  - {item['car-name']} ({item['car-type']})")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({"threshold": args.threshold, "exact": exact, "near": near}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.json_path}")
+
+    return exact, near
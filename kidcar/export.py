@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Vue 应用的网页构建产物导出
+
+把目录和资源导出成适合浏览器长期缓存的形式（默认写到 kid-car-vue/public/catalog，随 vite build 一起发布）：
+
+  index.json                     入口，唯一不带哈希的文件（需要每次验证），列出各分类的数据块和预缓存清单
+  chunks/<序号>.<哈希>.json      每个分类一个数据块，页面只需要加载当前分类
+  assets/images/<名称>.<哈希>.jpg 内容哈希命名的资源，文件内容不变名字就不变，可以永久缓存
+  precache-manifest.<哈希>.json  全部带哈希文件的列表（Workbox 格式），Service Worker 据此预缓存
+
+JSON 文件另外写出 .gz 和 .br（安装了 brotli 时）预压缩版本；图片和 MP3 本身已经压缩，不再预压缩。
+文件名中的哈希取自资源索引（.kidcar/asset-index.json）里的 sha256，不用重新读取资源；
+已存在的带哈希文件内容一定相同，不会重复写入，上一次导出中不再引用的文件会被删除。
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from kidcar.assets import build_case_lookup, resolve_asset, save_asset_index, scan_assets
+from kidcar.catalog import ASSET_FIELDS, CAR_JSON_FILE, iter_catalogue, to_disk_path
+from kidcar.sync import PIPELINE_FIELDS, copy_asset
+
+EXPORT_DIR = "kid-car-vue/public/catalog"
+
+# 页面中引用导出文件的 URL 前缀（对应 public 目录下的位置）
+PUBLIC_PATH = "/catalog/"
+
+INDEX_FILE = "index.json"
+
+# 文件名中保留的哈希长度（十六进制字符）
+HASH_LENGTH = 10
+
+# 需要预压缩的扩展名
+COMPRESSIBLE = (".json",)
+
+
+def content_hash(data):
+    """数据的内容哈希"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(path, digest):
+    """在扩展名前插入哈希: assets/images/小汽车.jpg -> assets/images/小汽车.<哈希>.jpg"""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def encode_json(data):
+    """导出的 JSON 不缩进，减小传输体积"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
+def load_brotli():
+    """brotli 是可选依赖，没有安装时只写 .gz"""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def write_file(path, data):
+    """写入文件，先写临时文件再替换"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_file(path):
+    """读取文件内容"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def precompress(path, data, brotli=None):
+    """写出 .gz 和 .br 版本，返回写出的相对后缀列表"""
+    variants = [(".gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", lambda: brotli.compress(data, quality=11)))
+    written = []
+    for suffix, compress in variants:
+        if not os.path.exists(path + suffix):
+            write_file(path + suffix, compress())
+        written.append(suffix)
+    return written
+
+
+class Export:
+    """一次导出：收集要写出的文件，写入新文件并删除不再引用的旧文件"""
+
+    def __init__(self, out_dir, link=True, brotli=None):
+        self.out_dir = out_dir
+        self.link = link
+        self.brotli = brotli
+        self.files = {}
+        self.written = 0
+        self.bytes = 0
+
+    def add_data(self, name, data, hashed=True):
+        """添加一个数据文件，hashed 为真时文件名带内容哈希，返回相对路径"""
+        relative = hashed_name(name, content_hash(data)) if hashed else name
+        path = os.path.join(self.out_dir, relative)
+        self.files[relative] = len(data)
+        if not os.path.exists(path) or (not hashed and read_file(path) != data):
+            # 入口文件内容变化时，旧的压缩版本不能复用
+            for suffix in (".gz", ".br"):
+                if not hashed and os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            write_file(path, data)
+            self.written += 1
+            self.bytes += len(data)
+        if relative.endswith(COMPRESSIBLE):
+            for suffix in precompress(path, data, self.brotli):
+                self.files[relative + suffix] = None
+        return relative
+
+    def add_asset(self, asset_path, entry):
+        """添加一个资源文件（按资源索引的 sha256 命名），返回相对路径"""
+        relative = hashed_name(asset_path, entry["sha256"])
+        if relative not in self.files:
+            path = os.path.join(self.out_dir, relative)
+            if not os.path.exists(path):
+                copy_asset(to_disk_path(asset_path), path, self.link)
+                self.written += 1
+                self.bytes += entry["size"]
+            self.files[relative] = entry["size"]
+        return relative
+
+    def prune(self):
+        """删除导出目录中这次没有引用的文件，返回删除的文件数"""
+        removed = 0
+        for directory, _, filenames in os.walk(self.out_dir):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                relative = os.path.relpath(path, self.out_dir).replace(os.sep, "/")
+                if relative not in self.files:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+def group_by_category(items):
+    """按 car-type 分组，保持第一次出现的顺序"""
+    categories = {}
+    for item in items:
+        categories.setdefault(item.get("car-type", ""), []).append(item)
+    return categories
+
+
+def export_item(item, export, index, case_lookup, missing):
+    """转换一个条目：去掉流水线字段，资源路径换成带哈希的 URL"""
+    result = {key: value for key, value in item.items() if key not in PIPELINE_FIELDS}
+    for field in ASSET_FIELDS:
+        asset_path = item.get(field)
+        if not asset_path:
+            continue
+        actual_path, entry = resolve_asset(index, case_lookup, asset_path)
+        if entry is None:
+            missing.append((item.get("car-name", ""), field, asset_path))
+            result[field] = ""
+            continue
+        result[field] = PUBLIC_PATH + export.add_asset(actual_path, entry)
+    return result
+
+
+def export_catalogue(items, out_dir=EXPORT_DIR, index=None, link=True, prune=True):
+    """
+    导出目录和资源，返回导出结果统计
+    items 可以是流式读取的目录，只遍历一次
+    """
+    if index is None:
+        index = scan_assets()
+    case_lookup = build_case_lookup(index)
+    brotli = load_brotli()
+    export = Export(out_dir, link=link, brotli=brotli)
+    missing = []
+
+    chunks = []
+    for order, (category, category_items) in enumerate(group_by_category(items).items()):
+        exported = [export_item(item, export, index, case_lookup, missing) for item in category_items]
+        data = encode_json(exported)
+        chunk = export.add_data(f"chunks/{order:02d}.json", data)
+        chunks.append({"name": category, "count": len(exported), "url": PUBLIC_PATH + chunk, "bytes": len(data)})
+
+    # 预缓存清单列出全部带哈希的文件（不含预压缩版本，服务器按 Accept-Encoding 选择）
+    entries = [
+        {"url": PUBLIC_PATH + relative, "revision": None, "size": size}
+        for relative, size in sorted(export.files.items()) if size is not None
+    ]
+    manifest = export.add_data("precache-manifest.json", encode_json(entries))
+
+    entry = {
+        "version": content_hash(encode_json(chunks)),
+        "entries": sum(chunk["count"] for chunk in chunks),
+        "categories": chunks,
+        "precache": PUBLIC_PATH + manifest,
+        "precacheBytes": sum(item["size"] for item in entries),
+    }
+    export.add_data(INDEX_FILE, encode_json(entry), hashed=False)
+
+    removed = export.prune() if prune else 0
+    return {
+        "entries": entry["entries"],
+        "categories": len(chunks),
+        "files": sum(1 for size in export.files.values() if size is not None),
+        "written": export.written,
+        "bytes": export.bytes,
+        "removed": removed,
+        "missing": missing,
+        "brotli": brotli is not None,
+    }
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="导出 Vue 应用的分块目录、带哈希的资源和预缓存清单")
+    parser.add_argument("--json", default=CAR_JSON_FILE, help=f"目录文件，默认 {CAR_JSON_FILE}")
+    parser.add_argument("--out", default=EXPORT_DIR, help=f"导出目录，默认 {EXPORT_DIR}")
+    parser.add_argument("--copy", action="store_true", help="复制资源文件（默认同一文件系统上用硬链接）")
+    parser.add_argument("--keep-old", action="store_true", help="保留上一次导出中不再引用的文件")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index = scan_assets()
+    save_asset_index(index)
+    result = export_catalogue(iter_catalogue(args.json), args.out, index, link=not args.copy, prune=not args.keep_old)
+
+    print(f"导出 {result['entries']} 个条目，{result['categories']} 个分类数据块，共 {result['files']} 个文件")
+    print(f"新写入 {result['written']} 个文件（{result['bytes'] / 1024 / 1024:.1f} MB），删除旧文件 {result['removed']} 个")
+    if not result["brotli"]:
+        print("没有安装 brotli，只生成了 .gz 预压缩文件（pip install brotli）")
+    if result["missing"]:
+        print(f"\n⚠️  {len(result['missing'])} 个资源文件不存在，导出时留空:")
+        for name, field, asset_path in result["missing"][:20]:
+            print(f"  {name} 的 {field}: {asset_path}")
+    print(f"\n导出完成，耗时 {time.perf_counter() - started:.2f} 秒，入口文件: {os.path.join(args.out, INDEX_FILE)}")
+    return result
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+资源输入指纹
+
+每个资源生成时，把它的输入（文本、语音、提示词、模型等）做成指纹记录在
+条目的 asset-fingerprints 字段里。之后只要输入变化（例如把 "taxi" 改成 "Taxi"），
+指纹就对不上，生成脚本的 --regenerate 模式只会重新生成这些资源。
+"""
+
+import hashlib
+import json
+import os
+
+from kidcar.catalog import AUDIO_FIELDS, expected_asset_path
+
+# 条目中保存指纹的字段
+FINGERPRINT_FIELD = "asset-fingerprints"
+
+# 被标记为需要重新生成的资源，指纹记录为这个前缀加原因
+INVALID_PREFIX = "invalid:"
+
+# generate-audio.py 使用的语音参数
+AUDIO_VOICES = {
+    "chinese": "Microsoft+Server+Speech+Text+to+Speech+Voice+(zh-CN,+XiaoxiaoNeural)",
+    "english": "Microsoft+Server+Speech+Text+to+Speech+Voice+(en-US,+JennyNeural)",
+    "english-gb": "Microsoft+Server+Speech+Text+to+Speech+Voice+(en-GB,+SoniaNeural)",
+    "english-slow": "Microsoft+Server+Speech+Text+to+Speech+Voice+(en-US,+JennyNeural)",
+    "chinese-slow": "Microsoft+Server+Speech+Text+to+Speech+Voice+(zh-CN,+XiaoxiaoNeural)",
+}
+AUDIO_PROSODY = {"volume": 0, "rate": 0, "pitch": 0}
+
+# 各语音对默认语速、音量、音调的调整（慢速变体给小朋友跟读）
+VOICE_PROSODY = {
+    "english-slow": {"rate": -30},
+    "chinese-slow": {"rate": -30},
+}
+
+# 音频字段 -> (文本字段, 语音类型)
+AUDIO_SOURCES = {field: (text_field, voice_type) for field, (text_field, voice_type, _) in AUDIO_FIELDS.items()}
+
+# 语音类型 -> 音频字段
+VOICE_FIELDS = {voice_type: field for field, (_, voice_type) in AUDIO_SOURCES.items()}
+
+# 默认生成的语音，其余语音是变体
+BASE_VOICES = ("chinese", "english")
+
+
+def compute_fingerprint(inputs):
+    """对输入参数做稳定的哈希"""
+    payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def voice_prosody(voice_type):
+    """语音的语速、音量、音调（百分比）"""
+    return {**AUDIO_PROSODY, **VOICE_PROSODY.get(voice_type, {})}
+
+
+def edge_voice_inputs(voice_type):
+    """Edge TTS 的语音参数，作为音频指纹的输入"""
+    return {"provider": "edge-tts", "voice": AUDIO_VOICES[voice_type], **voice_prosody(voice_type)}
+
+
+def audio_fingerprint(item, field, voice_inputs=None):
+    """
+    计算音频资源的指纹
+    voice_inputs 为合成引擎的语音参数（见 kidcar.tts.voice_inputs），默认为 Edge TTS
+    """
+    text_field, voice_type = AUDIO_SOURCES[field]
+    if voice_inputs is None:
+        voice_inputs = edge_voice_inputs(voice_type)
+    return compute_fingerprint({"text": item.get(text_field, ""), **voice_inputs})
+
+
+def image_fingerprint(prompt, model):
+    """计算图片资源的指纹"""
+    return compute_fingerprint({"prompt": prompt, "model": model})
+
+
+def get_fingerprint(item, field):
+    """读取条目记录的指纹"""
+    return item.get(FINGERPRINT_FIELD, {}).get(field)
+
+
+def set_fingerprint(item, field, fingerprint):
+    """记录条目的指纹"""
+    item.setdefault(FINGERPRINT_FIELD, {})[field] = fingerprint
+
+
+def invalidate_fingerprint(item, field, reason):
+    """标记资源需要重新生成（例如图片和其它条目几乎一样、没有通过质量检查），下次运行生成脚本时会重新生成它"""
+    set_fingerprint(item, field, f"{INVALID_PREFIX}{reason}")
+
+
+def is_invalidated(item, field):
+    """资源是否被标记为需要重新生成"""
+    recorded = get_fingerprint(item, field)
+    return recorded is not None and recorded.startswith(INVALID_PREFIX)
+
+
+def check_fingerprint(item, field, fingerprint):
+    """
+    比较资源的当前输入和记录的指纹
+    返回:
+      "missing"  - 还没有生成
+      "fresh"    - 指纹一致
+      "stale"    - 输入已变化，需要重新生成
+      "baseline" - 没有指纹记录，但路径和当前文本一致，可以把当前输入作为基线
+    """
+    asset_path = item.get(field, "").strip()
+    if not asset_path:
+        return "missing"
+
+    recorded = get_fingerprint(item, field)
+    if recorded is not None:
+        return "fresh" if recorded == fingerprint else "stale"
+
+    # 没有指纹的旧条目只能比较文件名。这里必须区分大小写：
+    # 在大小写不敏感的文件系统上，"taxi" 改成 "Taxi" 后文件名只差大小写
+    expected = expected_asset_path(item, field)
+    if os.path.splitext(asset_path)[0] == os.path.splitext(expected)[0]:
+        return "baseline"
+    return "stale"
+
+
+def is_asset_up_to_date(item, field, fingerprint, regenerate=False):
+    """
+    判断资源是否可以跳过
+    普通模式下路径非空且没有被标记为需要重新生成即跳过；regenerate 模式下比较输入指纹，
+    没有指纹的旧条目在路径和文本一致时把当前输入记录为基线
+    """
+    if not regenerate:
+        return item.get(field, "").strip() != "" and not is_invalidated(item, field)
+
+    status = check_fingerprint(item, field, fingerprint)
+    if status == "baseline":
+        set_fingerprint(item, field, fingerprint)
+        return True
+    if status == "stale":
+        print(f"  {item.get('car-name', '')} 的 {field} 输入已变化，需要重新生成: {item.get(field)}")
+    return status == "fresh"
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+各服务商的历史吞吐量
+
+生成脚本每成功完成一个条目就记录一次耗时、API调用次数和字节数，
+用指数移动平均保存在 .kidcar/history.json 中，供 plan_generation.py 估算。
+"""
+
+import json
+import os
+
+from kidcar.catalog import STATE_DIR
+
+HISTORY_FILE = os.path.join(STATE_DIR, "history.json")
+
+# 移动平均的权重，越大越偏向最近的记录
+EWMA_ALPHA = 0.2
+
+# 没有历史记录时使用的默认值（单个条目）
+DEFAULT_PROFILES = {
+    "modelscope-chat": {"seconds": 8.0, "calls": 1, "bytes": 0},
+    "modelscope-image": {"seconds": 45.0, "calls": 10, "bytes": 0},
+    "doubao-image": {"seconds": 15.0, "calls": 2, "bytes": 0},
+    "gemini-image": {"seconds": 20.0, "calls": 1, "bytes": 0},
+    "edge-tts": {"seconds": 1.5, "calls": 1, "bytes": 0},
+    "local-tts": {"seconds": 0.5, "calls": 0, "bytes": 0},
+}
+
+
+def load_history(history_file=HISTORY_FILE):
+    """加载吞吐量历史"""
+    if not os.path.exists(history_file):
+        return {}
+    try:
+        with open(history_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取吞吐量历史失败: {e}")
+        return {}
+
+
+def save_history(history, history_file=HISTORY_FILE):
+    """保存吞吐量历史"""
+    os.makedirs(os.path.dirname(history_file), exist_ok=True)
+    tmp_file = f"{history_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_file, history_file)
+
+
+def record_throughput(provider, seconds, nbytes=0, calls=1, history_file=HISTORY_FILE):
+    """记录一个条目的耗时、字节数和API调用次数"""
+    history = load_history(history_file)
+    stats = history.get(provider)
+    if stats is None:
+        stats = {"seconds": seconds, "bytes": nbytes, "calls": calls, "samples": 0}
+    else:
+        stats["seconds"] += EWMA_ALPHA * (seconds - stats["seconds"])
+        stats["bytes"] += EWMA_ALPHA * (nbytes - stats["bytes"])
+        stats["calls"] += EWMA_ALPHA * (calls - stats["calls"])
+    stats["samples"] += 1
+    history[provider] = stats
+
+    try:
+        save_history(history, history_file)
+    except OSError as e:
+        # 记录失败不应该影响生成流程
+        print(f"保存吞吐量历史失败: {e}")
+
+
+def provider_profile(provider, history=None):
+    """
+    获取服务商的单条目估算参数
+    有历史记录时使用历史值，否则使用默认值
+    """
+    if history is None:
+        history = load_history()
+
+    profile = dict(DEFAULT_PROFILES.get(provider, {"seconds": 10.0, "calls": 1, "bytes": 0}))
+    profile["samples"] = 0
+    stats = history.get(provider)
+    if stats:
+        profile.update(stats)
+    return profile
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+生成脚本的运行指标和追踪
+
+每次运行写一个 JSONL 追踪文件（.kidcar/traces/<脚本>-<时间>.jsonl），记录：
+  - span: 每个阶段（提交、轮询、下载、保存JSON等）和每个条目的耗时
+  - counter: API调用次数、重试、字节数、429次数等计数
+metrics_report.py 读取追踪文件，按阶段、服务商和API密钥汇总吞吐量和延迟分布。
+"""
+
+import argparse
+import atexit
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from kidcar.catalog import STATE_DIR
+
+TRACE_DIR = os.path.join(STATE_DIR, "traces")
+
+# 当前运行的追踪状态，没有调用 start_run 时所有记录都会被忽略
+_run = None
+
+# 多个线程同时生成资源时保护计数器和追踪文件
+_lock = threading.Lock()
+
+# 报告中按服务商汇总的计数器
+PROVIDER_COUNTERS = ("api_calls", "http_429", "http_5xx", "retries")
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+
+
+def start_run(script, trace_dir=TRACE_DIR):
+    """开始记录一次运行，返回追踪文件路径"""
+    global _run
+    if _run is not None:
+        return _run["path"]
+
+    os.makedirs(trace_dir, exist_ok=True)
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(trace_dir, f"{script}-{timestamp}-{os.getpid()}.jsonl")
+    _run = {
+        "script": script,
+        "path": path,
+        "file": open(path, 'a', encoding='utf-8'),
+        "counters": {},
+        "started": time.time(),
+    }
+    _write({"type": "run-start", "script": script, "time": _run["started"]})
+    atexit.register(finish_run)
+    return path
+
+
+def finish_run():
+    """写入计数器和运行结束记录"""
+    global _run
+    if _run is None:
+        return
+
+    for (name, provider, key), value in sorted(_run["counters"].items(), key=lambda kv: tuple(str(part) for part in kv[0])):
+        _write({"type": "counter", "name": name, "provider": provider, "key": key, "value": value})
+    _write({"type": "run-end", "script": _run["script"], "time": time.time(), "duration": time.time() - _run["started"]})
+    _run["file"].close()
+    print(f"运行指标已写入: {_run['path']}")
+    _run = None
+
+
+def _write(record):
+    """写入一行追踪记录，每行都刷新，进程崩溃也不会丢失已完成的记录"""
+    if _run is None:
+        return
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _lock:
+        _run["file"].write(line)
+        _run["file"].flush()
+
+
+def key_label(api_key):
+    """API密钥的短标识，追踪文件中不保存密钥本身"""
+    if not api_key:
+        return None
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8]
+
+
+def count(name, value=1, provider=None, key=None):
+    """累加计数器"""
+    if _run is None:
+        return
+    counter = (name, provider, key)
+    with _lock:
+        _run["counters"][counter] = _run["counters"].get(counter, 0) + value
+
+
+@contextmanager
+def span(stage, provider=None, key=None, item=None):
+    """
+    记录一个阶段的耗时
+    调用方可以往返回的字典里写 bytes、status、ok 等字段
+    """
+    record = {"type": "span", "stage": stage, "provider": provider, "key": key, "item": item, "start": time.time()}
+    start = time.perf_counter()
+    try:
+        yield record
+        record.setdefault("ok", True)
+    except BaseException as e:
+        record["ok"] = False
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - start
+        _write(record)
+
+
+def traced_request(method, url, stage, provider, api_key=None, item=None, **kwargs):
+    """
+    发送HTTP请求并记录耗时、状态码、字节数和API调用次数
+    stream=True 的请求不读取响应体，字节数由调用方在读取后用 count 记录
+    429、5xx 和超时同时反馈给服务商的并发控制器（kidcar.concurrency）
+    """
+    import requests
+
+    from kidcar.concurrency import report_error, report_status
+
+    key = key_label(api_key)
+    with span(stage, provider, key, item) as record:
+        try:
+            response = requests.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            report_error(provider, e)
+            raise
+        report_status(provider, response.status_code, response.headers)
+        record["status"] = response.status_code
+        record["ok"] = response.status_code < 400
+        count("api_calls", provider=provider, key=key)
+        if response.status_code == 429:
+            count("http_429", provider=provider, key=key)
+        elif response.status_code >= 500:
+            count("http_5xx", provider=provider, key=key)
+        if not kwargs.get("stream"):
+            record["bytes"] = len(response.content)
+            count("bytes", record["bytes"], provider=provider, key=key)
+    return response
+
+
+def load_trace(paths):
+    """读取追踪文件"""
+    records = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    return records
+
+
+def percentile(sorted_values, fraction):
+    """已排序列表的分位数"""
+    if not sorted_values:
+        return 0.0
+    position = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[position]
+
+
+def latency_histogram(durations):
+    """把耗时分到固定的桶里"""
+    buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+    for duration in durations:
+        for i, upper in enumerate(LATENCY_BUCKETS):
+            if duration <= upper:
+                buckets[i] += 1
+                break
+        else:
+            buckets[-1] += 1
+    return buckets
+
+
+def summarize(records):
+    """
+    汇总追踪记录
+    返回 {"runs", "groups": {(阶段, 服务商, 密钥): 统计}, "counters": {(名称, 服务商, 密钥): 值}}
+    """
+    runs = []
+    groups = {}
+    counters = {}
+    for record in records:
+        kind = record.get("type")
+        if kind == "run-end":
+            runs.append(record)
+        elif kind == "span":
+            group = groups.setdefault((record["stage"], record.get("provider"), record.get("key")), {"durations": [], "errors": 0, "bytes": 0})
+            group["durations"].append(record["duration"])
+            group["bytes"] += record.get("bytes", 0) or 0
+            if not record.get("ok", True):
+                group["errors"] += 1
+        elif kind == "counter":
+            counter = (record["name"], record.get("provider"), record.get("key"))
+            counters[counter] = counters.get(counter, 0) + record["value"]
+
+    for group in groups.values():
+        group["durations"].sort()
+    return {"runs": runs, "groups": groups, "counters": counters}
+
+
+def print_report(summary):
+    """打印汇总报告"""
+    total_seconds = sum(run["duration"] for run in summary["runs"])
+    print(f"运行次数: {len(summary['runs'])}，总耗时: {total_seconds:.1f} 秒")
+
+    print("\n=== 各阶段耗时（按服务商和密钥）===")
+    print(f"{'阶段':<12}{'服务商':<18}{'密钥':<10}{'次数':>6}{'失败':>6}{'总耗时':>10}{'p50':>8}{'p90':>8}{'p99':>8}{'吞吐/分':>9}")
+    for (stage, provider, key), group in sorted(summary["groups"].items(), key=lambda kv: tuple(str(part) for part in kv[0])):
+        durations = group["durations"]
+        total = sum(durations)
+        # 吞吐量按整个运行时间计算，体现串行等待和节流的影响
+        throughput = len(durations) / total_seconds * 60 if total_seconds else 0
+        print(
+            f"{stage:<12}{provider or '-':<18}{key or '-':<10}{len(durations):>6}{group['errors']:>6}{total:>10.1f}"
+            f"{percentile(durations, 0.5):>8.2f}{percentile(durations, 0.9):>8.2f}{percentile(durations, 0.99):>8.2f}{throughput:>9.1f}"
+        )
+
+    print("\n=== 延迟分布 ===")
+    labels = [f"<={upper}s" for upper in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+    for (stage, provider, key), group in sorted(summary["groups"].items(), key=lambda kv: tuple(str(part) for part in kv[0])):
+        buckets = latency_histogram(group["durations"])
+        peak = max(buckets) or 1
+        print(f"\n{stage} / {provider or '-'} / {key or '-'}")
+        for label, value in zip(labels, buckets):
+            if value:
+                print(f"  {label:>8} {'#' * max(1, round(value / peak * 40))} {value}")
+
+    # 每个服务商的调用、拥塞和重试次数放在一起，方便对照
+    providers = {}
+    for (name, provider, _), value in summary["counters"].items():
+        if provider and name in PROVIDER_COUNTERS:
+            totals = providers.setdefault(provider, dict.fromkeys(PROVIDER_COUNTERS, 0))
+            totals[name] += value
+    if providers:
+        print("\n=== 服务商调用、拥塞和重试 ===")
+        print(f"{'服务商':<18}{'API调用':>10}{'429':>8}{'5xx':>8}{'重试':>8}")
+        for provider, totals in sorted(providers.items()):
+            print(f"{provider:<18}" + "".join(f"{totals[name]:>{10 if name == 'api_calls' else 8}}" for name in PROVIDER_COUNTERS))
+
+    if summary["counters"]:
+        print("\n=== 计数器 ===")
+        for (name, provider, key), value in sorted(summary["counters"].items(), key=lambda kv: tuple(str(part) for part in kv[0])):
+            print(f"  {name:<12}{provider or '-':<18}{key or '-':<10}{value:>12}")
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="运行指标报告 - 汇总生成脚本的追踪文件")
+    parser.add_argument("traces", nargs="*", help="追踪文件，默认使用最近一次运行的文件")
+    parser.add_argument("--script", help="只汇总指定脚本的追踪文件（配合 --all）")
+    parser.add_argument("--all", action="store_true", help="汇总 .kidcar/traces 中所有追踪文件")
+    args = parser.parse_args(argv)
+
+    paths = args.traces
+    if not paths:
+        pattern = os.path.join(TRACE_DIR, f"{args.script}-*.jsonl" if args.script else "*.jsonl")
+        paths = sorted(glob.glob(pattern), key=os.path.getmtime)
+        if not args.all:
+            paths = paths[-1:]
+    if not paths:
+        print("没有找到追踪文件，请先运行生成脚本")
+        return None
+
+    print(f"追踪文件: {', '.join(paths)}")
+    summary = summarize(load_trace(paths))
+    print_report(summary)
+    return summary
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+MP3 帧级处理（不解码）
+
+TTS 输出的是固定码率的 MPEG Layer III（目录中的音频为 MPEG-2、24kHz、单声道、96kbps，每帧 288 字节、24 毫秒）。
+每帧的边信息里有 part2_3_length，即这一帧主数据用了多少位；静音帧基本不占用主数据，
+所以不需要解码就能找出静音段，在静音处按帧切开或拼接音频。
+"""
+
+# MPEG 版本位 -> 采样率表
+SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000),   # MPEG-2.5
+}
+
+# Layer III 码率表（kbps），MPEG-1 和 MPEG-2/2.5 不同
+BITRATES_MPEG1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+BITRATES_MPEG2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+
+# part2_3_length 不超过这个值的帧视为静音
+SILENCE_BITS = 0
+
+
+class Frame:
+    """一个 MPEG Layer III 帧"""
+
+    __slots__ = ("offset", "size", "mpeg1", "mono", "sample_rate", "bits_used")
+
+    def __init__(self, offset, size, mpeg1, mono, sample_rate, bits_used):
+        self.offset = offset
+        self.size = size
+        self.mpeg1 = mpeg1
+        self.mono = mono
+        self.sample_rate = sample_rate
+        self.bits_used = bits_used
+
+    @property
+    def duration(self):
+        """帧时长（秒）"""
+        return (1152 if self.mpeg1 else 576) / self.sample_rate
+
+    @property
+    def silent(self):
+        return self.bits_used <= SILENCE_BITS
+
+
+def skip_id3(data):
+    """跳过文件开头的 ID3v2 标签，返回音频数据的起始位置"""
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return 10 + size
+
+
+def _bits_used(side_info, mpeg1, mono):
+    """从边信息中读取各颗粒、各声道的 part2_3_length 之和"""
+    bits = int.from_bytes(side_info, 'big')
+    total_bits = len(side_info) * 8
+    if mpeg1:
+        # main_data_begin 9 位，private_bits 5/3 位，scfsi 4 位/声道
+        position = 9 + (5 if mono else 3) + (4 if mono else 8)
+        granules = 2
+    else:
+        # main_data_begin 8 位，private_bits 1/2 位
+        position = 8 + (1 if mono else 2)
+        granules = 1
+    channels = 1 if mono else 2
+    # 每个颗粒每个声道的边信息: MPEG-1 为 59 位，MPEG-2 为 63 位（scalefac_compress 多 5 位）
+    granule_bits = 59 if mpeg1 else 63
+
+    used = 0
+    for _ in range(granules * channels):
+        used += (bits >> (total_bits - position - 12)) & 0xFFF
+        position += granule_bits
+    return used
+
+
+def parse_frames(data):
+    """
+    解析 MP3 数据中的所有帧
+    遇到无法识别的数据时停止（例如结尾的 ID3v1 标签）
+    """
+    frames = []
+    offset = skip_id3(data)
+    while offset + 4 <= len(data):
+        header = int.from_bytes(data[offset:offset + 4], 'big')
+        version = (header >> 19) & 3
+        layer = (header >> 17) & 3
+        bitrate_index = (header >> 12) & 15
+        rate_index = (header >> 10) & 3
+        if header >> 21 != 0x7FF or version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            break
+
+        mpeg1 = version == 3
+        sample_rate = SAMPLE_RATES[version][rate_index]
+        bitrate = (BITRATES_MPEG1 if mpeg1 else BITRATES_MPEG2)[bitrate_index] * 1000
+        padding = (header >> 9) & 1
+        size = (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+        mono = (header >> 6) & 3 == 3
+        if offset + size > len(data):
+            break
+
+        side_start = offset + 4 + (0 if header & 0x10000 else 2)
+        side_length = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+        bits_used = _bits_used(data[side_start:side_start + side_length], mpeg1, mono)
+        frames.append(Frame(offset, size, mpeg1, mono, sample_rate, bits_used))
+        offset += size
+    return frames
+
+
+def silent_runs(frames, min_frames=1):
+    """连续静音帧的区间 [(起始帧, 结束帧)]，只返回长度不少于 min_frames 的区间"""
+    runs = []
+    start = None
+    for i, frame in enumerate(frames):
+        if frame.silent:
+            if start is None:
+                start = i
+        elif start is not None:
+            if i - start >= min_frames:
+                runs.append((start, i))
+            start = None
+    if start is not None and len(frames) - start >= min_frames:
+        runs.append((start, len(frames)))
+    return runs
+
+
+def trim_silence(frames, lead=2, tail=8):
+    """去掉片段首尾多余的静音帧，只保留 lead / tail 帧"""
+    start = 0
+    while start < len(frames) and frames[start].silent:
+        start += 1
+    end = len(frames)
+    while end > start and frames[end - 1].silent:
+        end -= 1
+    return frames[max(0, start - lead):min(len(frames), end + tail)]
+
+
+def is_info_frame(data, frame):
+    """是否为 Xing / Info / VBRI 标签帧（记录整个文件的帧数，拼接后必须去掉）"""
+    body = data[frame.offset + 4:frame.offset + min(frame.size, 40)]
+    return b'Xing' in body or b'Info' in body or b'VBRI' in body
+
+
+def silent_frame(data, frame):
+    """
+    按 frame 的格式构造一个静音帧
+    帧头相同（去掉CRC和填充位），边信息全为 0：main_data_begin 为 0，不占用也不引用主数据
+    """
+    header = bytearray(data[frame.offset:frame.offset + 4])
+    padding = (header[2] >> 1) & 1
+    header[1] |= 0x01
+    header[2] &= 0xFD
+    return bytes(header) + bytes(frame.size - padding - 4)
+
+
+def join_frames(data, frames):
+    """把帧拼接成新的 MP3 数据"""
+    return b''.join(data[frame.offset:frame.offset + frame.size] for frame in frames)
+
+
+def split_on_silence(data, count, min_gap_seconds=0.5, lead=2, tail=8):
+    """
+    在静音处把一段音频切成 count 段
+    取中间最长的 count-1 个静音段（不含开头和结尾），在静音段中间切开。
+    找不到足够的静音段时返回 None，由调用方退回逐条合成。
+    """
+    frames = parse_frames(data)
+    if not frames:
+        return None
+    if count == 1:
+        return [join_frames(data, trim_silence(frames, lead, tail))]
+
+    min_frames = max(1, int(min_gap_seconds / frames[0].duration))
+    gaps = [run for run in silent_runs(frames, min_frames) if run[0] > 0 and run[1] < len(frames)]
+    if len(gaps) < count - 1:
+        return None
+
+    # 句子内部也可能有较长的停顿，只取最长的 count-1 个
+    gaps = sorted(sorted(gaps, key=lambda run: run[1] - run[0], reverse=True)[:count - 1])
+    cuts = [0] + [(start + end) // 2 for start, end in gaps] + [len(frames)]
+    return [join_frames(data, trim_silence(frames[cuts[i]:cuts[i + 1]], lead, tail)) for i in range(count)]
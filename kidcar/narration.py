@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+描述朗读音频（car-description）
+
+描述有几十到上百个字，整段交给 TTS 一次合成又慢又容易失败（一次失败就要整段重来）。
+这里把描述按句切开，每句单独合成并按句缓存，再按帧拼接成每个条目一个文件:
+
+  - 按 。！？；和换行切句，太短的句子并入前一句，太长的在逗号处再切开（MinChars / MaxChars）
+  - 每句的音频按"文本 + 语音参数"的指纹缓存在 .kidcar/narration/<指纹>.mp3，
+    不同条目中相同的句子只合成一次，中断后重新运行只合成缺少的句子
+  - 句子按服务的自适应并发合成（kidcar.concurrency，和 generate-audio.py 共用 edge-tts 的上限），
+    使用本地引擎（TTS.Providers 或 --provider local）时由本地进程并行合成
+  - 一个条目的句子都准备好后立即拼接：去掉每句结尾的静音，句间停顿统一为 SentenceGap 秒，
+    不解码也不重新编码（见 kidcar.sequence）
+
+结果保存在 description-audio-path（assets/audios/<名称>_<类型>_desc.mp3，同名的不同事物不会互相覆盖），
+description-duration 记录总时长（秒），description-sentences 记录每句的文本和起止时间，
+App 可以据此高亮正在朗读的句子。指纹由各句的指纹和停顿参数计算，描述没变的条目不会重新拼接。
+
+local.yaml 示例（可选）:
+  Narration:
+    Voice: chinese          # 也可以用 chinese-slow
+    SentenceGap: 0.45
+    MinChars: 4
+    MaxChars: 60
+"""
+
+import argparse
+import os
+import time
+
+from kidcar.assets import build_case_lookup, replace_asset_file, resolve_asset, save_asset_index, scan_assets
+from kidcar.catalog import AUDIOS_DIR, DESCRIPTION_FIELD, STATE_DIR, expected_asset_path, load_catalogue, save_catalogue, to_disk_path
+from kidcar.concurrency import run_adaptive
+from kidcar.config import get_section, load_config
+from kidcar.fingerprint import compute_fingerprint, get_fingerprint, set_fingerprint
+from kidcar.mp3 import join_frames, silent_frame
+from kidcar.sequence import clip_frames, lead_seconds
+from kidcar.state import is_quarantined, mark_committed, mark_failed
+from kidcar.tts import EDGE_PROVIDER, check_local_engine, generate_audio, parse_provider_overrides, synthesize_local_many, tts_settings, voice_inputs, voice_provider
+
+# 朗读的文本字段
+TEXT_FIELD = "car-description"
+
+# 总时长和每句起止时间
+DURATION_FIELD = "description-duration"
+SENTENCES_FIELD = "description-sentences"
+
+# 按句缓存的音频
+SENTENCE_CACHE_DIR = os.path.join(STATE_DIR, "narration")
+
+DEFAULT_NARRATION = {
+    "Voice": "chinese",
+    "SentenceGap": 0.45,
+    "MinChars": 4,
+    "MaxChars": 60,
+}
+
+# 句末标点，其后的引号、括号归入同一句
+SENTENCE_ENDINGS = "。！？!?；;\n"
+CLOSING_MARKS = "”’\"'」』）)"
+
+# 太长的句子在这些标点后切开
+CLAUSE_BREAKS = "，,、：:"
+
+# 每拼接这么多个条目保存一次目录
+SAVE_EVERY = 20
+
+
+def narration_settings():
+    """读取 local.yaml 的 Narration 配置"""
+    settings = dict(DEFAULT_NARRATION)
+    settings.update(get_section("Narration"))
+    return settings
+
+
+def _split_long(sentence, max_chars):
+    """在逗号等处把太长的句子切成不超过 max_chars 的几段（没有可切的位置时保持原样）"""
+    parts = []
+    current = ""
+    clause = ""
+    for char in sentence:
+        clause += char
+        if char in CLAUSE_BREAKS:
+            if current and len(current) + len(clause) > max_chars:
+                parts.append(current)
+                current = ""
+            current += clause
+            clause = ""
+    if current and len(current) + len(clause) > max_chars:
+        parts.append(current)
+        current = ""
+    parts.append(current + clause)
+    return parts
+
+
+def split_sentences(text, min_chars=DEFAULT_NARRATION["MinChars"], max_chars=DEFAULT_NARRATION["MaxChars"]):
+    """把描述切成句子，返回句子列表（去掉首尾空白，不含空句）"""
+    sentences = []
+    current = ""
+    length = len(text)
+    for position, char in enumerate(text):
+        current += char
+        # 英文句号只在后面是空白或结尾时算句末，避免切开 3.5 这样的数字
+        ends = char in SENTENCE_ENDINGS or (char == "." and (position + 1 == length or text[position + 1].isspace()))
+        if ends and (position + 1 == length or text[position + 1] not in CLOSING_MARKS + SENTENCE_ENDINGS):
+            sentences.append(current.strip())
+            current = ""
+    sentences.append(current.strip())
+
+    merged = []
+    for sentence in sentences:
+        if not sentence:
+            continue
+        if merged and len(sentence) < min_chars:
+            merged[-1] += sentence
+        else:
+            merged.append(sentence)
+    return [part.strip() for sentence in merged for part in _split_long(sentence, max_chars) if part.strip()]
+
+
+def sentence_fingerprint(text, inputs):
+    """一句话的音频指纹：文本和语音参数"""
+    return compute_fingerprint({"text": text, **inputs})
+
+
+def sentence_cache_path(fingerprint, cache_dir=SENTENCE_CACHE_DIR):
+    return os.path.join(cache_dir, f"{fingerprint}.mp3")
+
+
+def narration_fingerprint(sentence_fingerprints, settings):
+    """朗读音频的指纹：各句的指纹和停顿参数"""
+    return compute_fingerprint({"sentences": sentence_fingerprints, "gap": settings["SentenceGap"]})
+
+
+def compose_narration(clips, gap):
+    """
+    把各句的音频按顺序拼接，句间停顿为 gap 秒
+    返回 (MP3 数据, 总时长, [(开始, 结束)])，时间从第一帧开始计算，开始时间跳过句首的静音
+    各句格式不一致时抛出 ValueError
+    """
+    clipped = [clip_frames(data) for data in clips]
+    first = clipped[0][0]
+    for frames in clipped[1:]:
+        other = frames[0]
+        if (other.mpeg1, other.sample_rate, other.mono) != (first.mpeg1, first.sample_rate, first.mono):
+            raise ValueError(f"句子音频格式不一致: {first.sample_rate}Hz 和 {other.sample_rate}Hz")
+
+    silence = silent_frame(clips[0], first)
+    parts = []
+    timings = []
+    frame_count = 0
+    for position, (data, frames) in enumerate(zip(clips, clipped)):
+        if position:
+            count = max(0, round((gap - lead_seconds(frames)) / first.duration))
+            parts.append(silence * count)
+            frame_count += count
+        start = frame_count * first.duration + lead_seconds(frames)
+        parts.append(join_frames(data, frames))
+        frame_count += len(frames)
+        timings.append((round(start, 3), round(frame_count * first.duration, 3)))
+    # 结尾留一点静音，避免播放器截掉最后一帧
+    parts.append(silence * 4)
+    frame_count += 4
+    return b''.join(parts), round(frame_count * first.duration, 3), timings
+
+
+def collect_narration_tasks(items, index, settings, inputs, force=False, limit=None):
+    """
+    收集需要朗读的条目
+    返回 [(条目, 句子列表, 句子指纹列表, 朗读指纹)]
+    """
+    case_lookup = build_case_lookup(index)
+    tasks = []
+    for item in items:
+        text = item.get(TEXT_FIELD, "").strip()
+        if not text or is_quarantined(item, DESCRIPTION_FIELD):
+            continue
+        sentences = split_sentences(text, settings["MinChars"], settings["MaxChars"])
+        fingerprints = [sentence_fingerprint(sentence, inputs) for sentence in sentences]
+        fingerprint = narration_fingerprint(fingerprints, settings)
+        _, current = resolve_asset(index, case_lookup, item.get(DESCRIPTION_FIELD, ""))
+        if not force and current is not None and not current.get("corrupt") and get_fingerprint(item, DESCRIPTION_FIELD) == fingerprint:
+            continue
+        tasks.append((item, sentences, fingerprints, fingerprint))
+        if limit and len(tasks) >= limit:
+            break
+    return tasks
+
+
+def stitch_item(task, cache_dir=SENTENCE_CACHE_DIR, settings=None):
+    """拼接一个条目的朗读音频并写入目录字段"""
+    settings = settings or DEFAULT_NARRATION
+    item, sentences, fingerprints, fingerprint = task
+    clips = []
+    for sentence_fp in fingerprints:
+        with open(sentence_cache_path(sentence_fp, cache_dir), 'rb') as f:
+            clips.append(f.read())
+    data, duration, timings = compose_narration(clips, settings["SentenceGap"])
+
+    asset_path = expected_asset_path(item, DESCRIPTION_FIELD)
+    output_path = to_disk_path(asset_path)
+    tmp_path = f"{output_path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    replace_asset_file(tmp_path, output_path)
+
+    mark_committed(item, DESCRIPTION_FIELD, asset_path)
+    set_fingerprint(item, DESCRIPTION_FIELD, fingerprint)
+    item[DURATION_FIELD] = duration
+    item[SENTENCES_FIELD] = [
+        {"text": sentence, "start": start, "end": end}
+        for sentence, (start, end) in zip(sentences, timings)
+    ]
+    return duration
+
+
+def synthesize_sentences(jobs, voice_type, tts, workers=None):
+    """
+    合成缺少的句子，jobs 为 [(句子指纹, 文本, 输出文件)]
+    按完成顺序逐个返回 (句子指纹, 错误信息)
+    """
+    if voice_provider(voice_type, tts) == "local":
+        tasks = [(text, voice_type, output_path) for _, text, output_path in jobs]
+        fingerprints = {output_path: sentence_fp for sentence_fp, _, output_path in jobs}
+        for (_, _, output_path), ok, _, error in synthesize_local_many(tasks, tts, workers):
+            yield fingerprints[output_path], None if ok else error
+        return
+
+    config = load_config()
+
+    def synthesize(job):
+        _, text, output_path = job
+        if not generate_audio(text, output_path, voice_type, config):
+            raise RuntimeError("TTS请求失败")
+
+    for (sentence_fp, _, _), _, error in run_adaptive(jobs, synthesize, EDGE_PROVIDER, workers):
+        yield sentence_fp, str(error) if error else None
+
+
+def narrate_catalogue(items, index=None, settings=None, tts=None, workers=None, force=False, limit=None, cache_dir=SENTENCE_CACHE_DIR):
+    """
+    为需要更新的条目生成朗读音频，句子全部就绪的条目立即拼接，每 SAVE_EVERY 个条目保存一次目录
+    返回 (拼接的条目数, 失败的条目数)
+    """
+    if index is None:
+        index = scan_assets()
+    settings = settings or narration_settings()
+    tts = tts or tts_settings()
+    voice_type = settings["Voice"]
+    tasks = collect_narration_tasks(items, index, settings, voice_inputs(voice_type, tts), force, limit)
+    if not tasks:
+        print("所有描述朗读音频都是最新的")
+        return 0, 0
+
+    os.makedirs(cache_dir, exist_ok=True)
+    os.makedirs(AUDIOS_DIR, exist_ok=True)
+    missing = {}
+    waiting = {}
+    for position, (_, sentences, fingerprints, _) in enumerate(tasks):
+        pending = set()
+        for sentence, sentence_fp in zip(sentences, fingerprints):
+            if not os.path.exists(sentence_cache_path(sentence_fp, cache_dir)):
+                missing.setdefault(sentence_fp, sentence)
+                pending.add(sentence_fp)
+        waiting[position] = pending
+
+    total_sentences = sum(len(task[1]) for task in tasks)
+    print(f"需要朗读 {len(tasks)} 个条目的描述，共 {total_sentences} 句，其中 {len(missing)} 句需要合成（其余已缓存）")
+
+    stitched = 0
+    failed = 0
+    unsaved = 0
+
+    def finish(position):
+        nonlocal stitched, failed, unsaved
+        task = tasks[position]
+        try:
+            duration = stitch_item(task, cache_dir, settings)
+        except (OSError, ValueError) as e:
+            print(f"  拼接失败 {task[0].get('car-name', '')}: {e}")
+            mark_failed(task[0], DESCRIPTION_FIELD, str(e))
+            failed += 1
+            return
+        stitched += 1
+        unsaved += 1
+        print(f"  [{stitched}/{len(tasks)}] {task[0].get('car-name', '')}: {len(task[1])} 句，{duration:.1f} 秒")
+        if unsaved >= SAVE_EVERY:
+            save_catalogue(items)
+            unsaved = 0
+
+    # 句子都已缓存的条目直接拼接
+    for position in [position for position, pending in waiting.items() if not pending]:
+        del waiting[position]
+        finish(position)
+
+    users = {}
+    for position, pending in waiting.items():
+        for sentence_fp in pending:
+            users.setdefault(sentence_fp, []).append(position)
+
+    jobs = [(sentence_fp, sentence, sentence_cache_path(sentence_fp, cache_dir)) for sentence_fp, sentence in missing.items()]
+    for sentence_fp, error in synthesize_sentences(jobs, voice_type, tts, workers):
+        for position in users.pop(sentence_fp, []):
+            if position not in waiting:
+                continue
+            if error:
+                # 同一条目的其它句子照常合成并缓存，下次运行时只需重试失败的句子
+                print(f"  {tasks[position][0].get('car-name', '')} 的句子合成失败: {missing[sentence_fp]}")
+                mark_failed(tasks[position][0], DESCRIPTION_FIELD, error)
+                failed += 1
+                del waiting[position]
+                continue
+            waiting[position].discard(sentence_fp)
+            if not waiting[position]:
+                del waiting[position]
+                finish(position)
+
+    if stitched or failed:
+        save_catalogue(items)
+    return stitched, failed
+
+
+def prune_sentence_cache(items, settings, tts, cache_dir=SENTENCE_CACHE_DIR):
+    """删除当前目录中已经用不到的句子缓存，返回删除的文件数"""
+    inputs = voice_inputs(settings["Voice"], tts)
+    used = set()
+    for item in items:
+        text = item.get(TEXT_FIELD, "").strip()
+        if text:
+            used.update(sentence_fingerprint(sentence, inputs) for sentence in split_sentences(text, settings["MinChars"], settings["MaxChars"]))
+    removed = 0
+    if os.path.exists(cache_dir):
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and os.path.splitext(entry.name)[0] not in used:
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="按句并行合成 car-description 的朗读音频，拼接成每个条目一个文件")
+    parser.add_argument("--voice", help="朗读用的语音（chinese / chinese-slow），默认读取 Narration.Voice")
+    parser.add_argument("--provider", action="append", metavar="[语音=]服务商",
+                        help="选择合成引擎 edge/local，和 generate-audio.py 相同")
+    parser.add_argument("--workers", type=int, help="固定的并发数，默认按服务的响应自动调整")
+    parser.add_argument("--limit", type=int, help="最多处理多少个条目")
+    parser.add_argument("--force", action="store_true", help="忽略指纹，重新拼接全部条目（已缓存的句子不会重新合成）")
+    parser.add_argument("--prune-cache", action="store_true", help="删除当前描述已经用不到的句子缓存")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    settings = narration_settings()
+    if args.voice:
+        settings["Voice"] = args.voice
+    try:
+        tts = tts_settings(parse_provider_overrides(args.provider))
+    except ValueError as e:
+        print(f"配置错误: {e}")
+        return None
+    if voice_provider(settings["Voice"], tts) == "local":
+        problems = check_local_engine(tts, (settings["Voice"],))
+        if problems:
+            for problem in problems:
+                print(f"本地合成不可用: {problem}")
+            return None
+
+    items = load_catalogue()
+    if args.prune_cache:
+        removed = prune_sentence_cache(items, settings, tts)
+        print(f"删除了 {removed} 个用不到的句子缓存")
+        return removed
+
+    index = scan_assets()
+    save_asset_index(index)
+    stitched, failed = narrate_catalogue(items, index, settings, tts, args.workers, args.force, args.limit)
+    print(f"描述朗读完成: {stitched} 个，失败 {failed} 个，耗时 {time.perf_counter() - started:.2f} 秒")
+    return stitched
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+生成任务规划（dry-run）
+
+读取事物目录和资源索引，在调用任何API之前列出每个阶段需要处理的条目
+（未生成、文件丢失、损坏或已过期），并根据历史吞吐量估算API调用次数、
+下载字节数和不同并发下的耗时。耗时按每个条目的历史耗时和并发轮数估算，
+另外列出自适应并发的起始上限（.kidcar/concurrency.json 中上次保存的值）下的耗时。
+"""
+
+import argparse
+import json
+import math
+import os
+
+from kidcar.assets import build_case_lookup, load_asset_index, resolve_asset, save_asset_index, scan_assets
+from kidcar.catalog import ASSET_FIELDS, CatalogueReader, expected_asset_path
+from kidcar.concurrency import starting_limit
+from kidcar.fingerprint import AUDIO_SOURCES, FINGERPRINT_FIELD, audio_fingerprint, check_fingerprint, is_invalidated
+from kidcar.history import load_history, provider_profile
+from kidcar.sources import diff_items, load_item_sources
+from kidcar.state import STATE_FIELD, is_quarantined
+from kidcar.tts import tts_settings, voice_inputs
+
+STAGES = ("metadata", "image", "audio")
+
+# 规划用到的条目字段
+PLAN_FIELDS = ("car-name", "car-type", "car-english-name", *ASSET_FIELDS, FINGERPRINT_FIELD, STATE_FIELD)
+
+STAGE_LABELS = {
+    "metadata": "元数据 (car-name.py)",
+    "image": "图片",
+    "audio": "音频 (generate-audio.py)",
+}
+
+# 图片脚本 -> 服务商
+IMAGE_PROVIDERS = {
+    "modelscope": "modelscope-image",
+    "doubao": "doubao-image",
+    "gemini": "gemini-image",
+}
+
+REASON_LABELS = {
+    "missing": "未生成",
+    "file-missing": "文件丢失",
+    "corrupt": "文件损坏",
+    "stale": "已过期",
+    "case": "文件名大小写不一致",
+}
+
+
+def check_asset(item, field, index, case_lookup, settings=None):
+    """
+    检查条目的单个资源
+    settings 为 TTS 配置（见 kidcar.tts.tts_settings），用于计算音频指纹，默认为 Edge TTS
+    返回 (原因, 实际路径)，资源正常时原因为 None
+    """
+    asset_path = item.get(field, "").strip()
+    if not asset_path:
+        return "missing", None
+
+    actual_path, entry = resolve_asset(index, case_lookup, asset_path)
+    if entry is None:
+        return "file-missing", None
+    if entry.get("corrupt"):
+        return "corrupt", actual_path
+    if field in AUDIO_SOURCES:
+        # 音频的输入（文本、语音）有指纹记录
+        inputs = voice_inputs(AUDIO_SOURCES[field][1], settings) if settings else None
+        stale = check_fingerprint(item, field, audio_fingerprint(item, field, inputs)) == "stale"
+    else:
+        # 图片的提示词和模型由各个图片脚本决定，这里只比较按当前文本计算的文件名
+        # （只比较文件名主体，Gemini脚本生成的是PNG）
+        stale = os.path.splitext(asset_path)[0] != os.path.splitext(expected_asset_path(item, field))[0]
+        # 被 dedupe_images.py 等工具标记为需要重新生成
+        stale = stale or is_invalidated(item, field)
+    if stale:
+        return "stale", actual_path
+    if actual_path != asset_path:
+        return "case", actual_path
+    return None, actual_path
+
+
+def plan_metadata(catalogue, item_sources):
+    """计算需要调用大模型生成元数据的条目，item_sources 为 load_item_sources() 的结果"""
+    item_names, renamed = item_sources
+    return [
+        {
+            "item": item_name,
+            "type": item_type,
+            "field": None,
+            "target": None,
+            "reason": "missing",
+        }
+        for item_name, item_type in diff_items(item_names, catalogue, renamed)["added"]
+    ]
+
+
+def plan_assets(catalogue, index, kind):
+    """
+    计算某类资源需要生成的条目
+    返回 (待生成任务, 只需改名的任务)
+    """
+    case_lookup = build_case_lookup(index)
+    tasks = []
+    renames = []
+    # 多个条目可能指向同一个输出文件（例如相同的英文名），只生成一次
+    planned_targets = set()
+    # 音频指纹和当前配置的合成引擎有关
+    settings = tts_settings() if kind == "audio" else None
+
+    for item in catalogue:
+        for field, field_kind in ASSET_FIELDS.items():
+            if field_kind != kind:
+                continue
+            # 没有启用的音频变体不需要生成
+            if field in AUDIO_SOURCES and AUDIO_SOURCES[field][1] not in settings["voice_types"]:
+                continue
+            # 连续失败被隔离的资源不会自动重试（python -m kidcar state 查看）
+            if is_quarantined(item, field):
+                continue
+
+            reason, actual_path = check_asset(item, field, index, case_lookup, settings)
+            if reason is None:
+                continue
+
+            task = {
+                "item": item.get("car-name", ""),
+                "type": item.get("car-type", ""),
+                "field": field,
+                "target": expected_asset_path(item, field),
+                "current": actual_path,
+                "reason": reason,
+            }
+            if reason == "case":
+                renames.append(task)
+                continue
+            if task["target"] in planned_targets:
+                continue
+            planned_targets.add(task["target"])
+            tasks.append(task)
+
+    return tasks, renames
+
+
+def average_asset_bytes(index, kind):
+    """索引中某类资源的平均大小"""
+    sizes = [entry["size"] for entry in index["files"].values() if entry["kind"] == kind and not entry.get("corrupt")]
+    return sum(sizes) / len(sizes) if sizes else 0
+
+
+def estimate_stage(tasks, profile, concurrency):
+    """估算某个阶段在给定并发下的API调用次数、字节数和耗时"""
+    count = len(tasks)
+    rounds = math.ceil(count / max(concurrency, 1))
+    return {
+        "items": count,
+        "calls": int(round(count * profile["calls"])),
+        "bytes": int(count * profile["bytes"]),
+        "seconds": rounds * profile["seconds"],
+    }
+
+
+def build_plan(catalogue, index, item_sources, image_provider="modelscope", stages=STAGES, concurrency_levels=(1,)):
+    """构建完整的生成计划"""
+    history = load_history()
+    plan = {"stages": {}, "renames": []}
+
+    for stage in stages:
+        if stage == "metadata":
+            tasks = plan_metadata(catalogue, item_sources)
+            renames = []
+            provider = "modelscope-chat"
+        else:
+            tasks, renames = plan_assets(catalogue, index, stage)
+            provider = IMAGE_PROVIDERS[image_provider] if stage == "image" else "edge-tts"
+
+        profile = provider_profile(provider, history)
+        # 没有历史字节数时用现有资源的平均大小
+        if stage != "metadata" and not profile["bytes"]:
+            profile["bytes"] = average_asset_bytes(index, stage)
+
+        # 脚本按自适应并发运行，从上次保存的并发上限开始
+        adaptive = max(1, int(starting_limit(provider)))
+        plan["stages"][stage] = {
+            "provider": provider,
+            "profile": profile,
+            "tasks": tasks,
+            "adaptive": adaptive,
+            "estimates": {
+                str(level): estimate_stage(tasks, profile, level)
+                for level in sorted({*concurrency_levels, adaptive})
+            },
+        }
+        plan["renames"].extend(renames)
+
+    return plan
+
+
+def format_bytes(nbytes):
+    """格式化字节数"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if nbytes < 1024 or unit == "GB":
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+def format_seconds(seconds):
+    """格式化耗时"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}小时{minutes}分"
+    if minutes:
+        return f"{minutes}分{seconds}秒"
+    return f"{seconds}秒"
+
+
+def print_plan(plan, limit=20):
+    """打印生成计划"""
+    for stage, stage_plan in plan["stages"].items():
+        tasks = stage_plan["tasks"]
+        profile = stage_plan["profile"]
+        source = f"{profile['samples']} 条历史记录" if profile["samples"] else "默认值"
+        print(f"\n=== {STAGE_LABELS[stage]} - 服务商 {stage_plan['provider']}（估算依据: {source}）===")
+        print(f"待处理: {len(tasks)} 个")
+
+        reasons = {}
+        for task in tasks:
+            reasons[task["reason"]] = reasons.get(task["reason"], 0) + 1
+        for reason, count in sorted(reasons.items()):
+            print(f"  {REASON_LABELS[reason]}: {count}")
+
+        shown = tasks if limit <= 0 else tasks[:limit]
+        for task in shown:
+            target = f" -> {task['target']}" if task["target"] else ""
+            print(f"  - [{REASON_LABELS[task['reason']]}] {task['item']} ({task['type']}){target}")
+        if len(shown) < len(tasks):
+            print(f"  ... 还有 {len(tasks) - len(shown)} 个，使用 --limit 0 显示全部")
+
+        if not tasks:
+            continue
+        print("  并发  API调用  下载量  预计耗时")
+        for level, estimate in stage_plan["estimates"].items():
+            mark = "  <- 自适应并发的起始上限" if int(level) == stage_plan["adaptive"] else ""
+            print(f"  {level:>4}  {estimate['calls']:>7}  {format_bytes(estimate['bytes']):>8}  {format_seconds(estimate['seconds'])}{mark}")
+
+    if plan["renames"]:
+        print(f"\n=== 文件名只差大小写（改名即可，不需要调用API）: {len(plan['renames'])} 个 ===")
+        shown = plan["renames"] if limit <= 0 else plan["renames"][:limit]
+        for task in shown:
+            print(f"  - {task['current']} -> {task['target']}")
+        if len(shown) < len(plan["renames"]):
+            print(f"  ... 还有 {len(plan['renames']) - len(shown)} 个")
+
+
+def parse_concurrency(value):
+    """解析逗号分隔的并发列表"""
+    try:
+        levels = [int(level) for level in value.split(",") if level.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"并发列表格式错误: {value}")
+    if not levels or min(levels) < 1:
+        raise argparse.ArgumentTypeError(f"并发必须是正整数: {value}")
+    return levels
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="生成任务规划 - 在调用API之前列出待生成的资源并估算成本")
+    parser.add_argument("--stages", default=",".join(STAGES), help="要规划的阶段，逗号分隔 (metadata,image,audio)")
+    parser.add_argument("--image-provider", choices=sorted(IMAGE_PROVIDERS), default="modelscope", help="图片生成服务商")
+    parser.add_argument("--concurrency", type=parse_concurrency, default=[1, 2, 4, 8], help="要估算的并发数，逗号分隔")
+    parser.add_argument("--limit", type=int, default=20, help="每个阶段最多显示的条目数，0 表示全部")
+    parser.add_argument("--json", dest="json_path", help="将完整计划写入JSON文件")
+    parser.add_argument("--no-scan", action="store_true", help="直接使用缓存的资源索引，不重新扫描目录")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(unknown)}")
+
+    # 音频的规划依赖 local.yaml 的 TTS 配置（语音变体和服务商），写错时只提示一行
+    if "audio" in stages:
+        try:
+            tts_settings()
+        except ValueError as e:
+            print(f"配置错误: {e}")
+            return None
+
+    # 规划只需要名称、资源路径和状态，流式读取目录，不读入描述等长文本
+    catalogue = CatalogueReader(fields=PLAN_FIELDS)
+    print(f"目录中共有 {sum(1 for _ in catalogue)} 个条目")
+
+    index = load_asset_index()
+    if not args.no_scan:
+        index = scan_assets(index)
+        save_asset_index(index)
+        print(f"资源索引: {len(index['files'])} 个文件，重新计算哈希 {index['rehashed']} 个")
+
+    plan = build_plan(catalogue, index, load_item_sources(), args.image_provider, stages, args.concurrency)
+    print_plan(plan, args.limit)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False, indent=2)
+        print(f"\n计划已写入: {args.json_path}")
+
+    return plan
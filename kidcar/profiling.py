@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+脚本性能分析
+
+各入口脚本通过 run_main 启动，命令行带 --profile 时：
+  - 用 cProfile 做确定性分析，写出 .prof（可用 snakeviz、pstats 打开）和按累计耗时排序的 .txt
+  - 同时用采样线程定时抓取主线程调用栈，写出 .collapsed 折叠栈文件，
+    可直接交给 flamegraph.pl 或 speedscope 生成火焰图
+输出在 .kidcar/profiles/<脚本>-<时间>.* 中。
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+from kidcar.catalog import STATE_DIR
+
+PROFILE_DIR = os.path.join(STATE_DIR, "profiles")
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+# .txt 摘要中显示的函数数量
+SUMMARY_LINES = 40
+
+
+class StackSampler(threading.Thread):
+    """定时采样目标线程的调用栈，统计折叠栈出现次数"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="kidcar-stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # 折叠栈格式: 根;...;叶 次数
+            stack = ";".join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, samples in sorted(self.stacks.items()):
+                f.write(f"{stack} {samples}\n")
+
+
+def profile_call(func, script, output_dir=PROFILE_DIR, interval=SAMPLE_INTERVAL):
+    """在 cProfile 和采样分析器下运行 func，返回 func 的返回值"""
+    os.makedirs(output_dir, exist_ok=True)
+    base_path = os.path.join(output_dir, f"{script}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+    sampler = StackSampler(threading.get_ident(), interval)
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        sampler.stop()
+
+        profiler.dump_stats(f"{base_path}.prof")
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        with open(f"{base_path}.txt", 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+        sampler.write_collapsed(f"{base_path}.collapsed")
+
+        print(f"\n性能分析结果已写入: {base_path}.prof / .txt / .collapsed")
+
+
+def run_main(main, script):
+    """
+    入口函数包装
+    命令行中带 --profile 时去掉该参数，并在分析器下运行 main
+    """
+    if "--profile" not in sys.argv[1:]:
+        return main()
+
+    sys.argv.remove("--profile")
+    return profile_call(main, script)
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+图片质量检查
+
+提示词一直要求"不要出现人物"，但生成的图片从来没有检查过，空白、近乎纯色、带水印或比例不对的图片
+只有在 App 里翻到时才会发现。这里在下载后用 NumPy 计算几个简单的统计量：
+  - 尺寸和比例: 短边不小于 MinSize，宽高比和 Aspects 中的某一个相差不超过 AspectTolerance
+                （目录中有 1024x1024 和 760x1280 两种图片）
+  - 信息熵:     灰度直方图的香农熵（比特），空白或纯色的图片很低（扁平卡通风格本身在 2.4 比特左右）
+  - 单一颜色:   出现最多的颜色（每通道量化到 16 级）占全部像素的比例
+  - 边框:       某一边的窄条几乎没有变化，且和里面的颜色差别很大（黑边、白边、裁切残留）
+  - 角落水印:   下方某个角的边缘密度明显高于其它边缘区域和底边中间（文字水印；底部整条的波浪、地面不算）
+安装了 opencv-python 时，另外用 OpenCV 自带的人脸（Haar）和行人（HOG）检测器在 CPU 上检查是否有人物。
+
+检查结果按图片内容的 sha256 缓存在 .kidcar/image-quality.json，内容和检查参数不变的图片不会重新计算。
+没有通过的图片标记为需要重新生成（生成脚本下次运行时重新生成），
+同一个条目连续 MaxRetries 次没有通过后隔离，等待人工处理（python -m kidcar state --release 解除）。
+
+生成脚本在保存每张图片后把它交给 QualityGate，在后台进程池中检查，不会拖慢生成；
+python -m kidcar qa 检查目录中已有的全部图片。
+
+local.yaml 示例（可选）:
+  Quality:
+    MinSize: 512
+    Aspects: [1.0, 0.59375]
+    MinEntropy: 1.5
+    Detector: true      # 有 OpenCV 时检查人物，false 关闭
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from kidcar.assets import build_case_lookup, resolve_asset, save_asset_index, scan_assets
+from kidcar.catalog import STATE_DIR, expected_asset_path, load_catalogue, save_catalogue, to_disk_path
+from kidcar.config import get_section
+from kidcar.fingerprint import compute_fingerprint, invalidate_fingerprint
+from kidcar.state import is_quarantined, mark_failed
+
+QUALITY_CACHE_FILE = os.path.join(STATE_DIR, "image-quality.json")
+
+FIELD = "car-image-path"
+
+DEFAULT_QUALITY = {
+    "MinSize": 512,
+    "Aspects": [1.0, 0.59375],
+    "AspectTolerance": 0.03,
+    "MinEntropy": 1.5,
+    "MaxDominant": 0.85,
+    "BorderStd": 6.0,
+    "BorderContrast": 40.0,
+    "WatermarkEdges": 0.08,
+    "Detector": True,
+    "MaxRetries": 2,
+}
+
+# 统计量在缩放到这个尺寸后计算，水印的笔画很细，边缘密度在更大的尺寸上计算
+ANALYSIS_SIZE = 256
+EDGE_SIZE = 512
+
+# 边框和角落区域占边长的比例
+BORDER_FRACTION = 0.03
+CORNER_WIDTH = 0.25
+CORNER_HEIGHT = 0.1
+
+# 拉普拉斯响应超过这个值的像素算作边缘
+EDGE_THRESHOLD = 40.0
+
+# 检查算法的版本，修改统计量的计算方法后加 1，缓存的结果随之失效
+QUALITY_VERSION = 1
+
+# 失效指纹中的原因前缀，用来区分质量检查和去重的标记
+REASON_PREFIX = "qa: "
+
+
+def quality_settings():
+    """读取 local.yaml 的 Quality 配置"""
+    settings = dict(DEFAULT_QUALITY)
+    settings.update(get_section("Quality"))
+    return settings
+
+
+def load_detector():
+    """opencv-python 是可选依赖，没有安装时不检查人物"""
+    try:
+        import cv2
+    except ImportError:
+        return None
+    return cv2
+
+
+def _entropy(gray):
+    """灰度直方图的香农熵（比特）"""
+    histogram = np.bincount(gray.reshape(-1), minlength=256).astype(np.float64)
+    probabilities = histogram[histogram > 0] / histogram.sum()
+    return float(-(probabilities * np.log2(probabilities)).sum())
+
+
+def _dominant_fraction(rgb):
+    """出现最多的颜色（每通道 16 级）占全部像素的比例"""
+    quantized = (rgb >> 4).astype(np.int32)
+    codes = (quantized[..., 0] << 8) | (quantized[..., 1] << 4) | quantized[..., 2]
+    return float(np.bincount(codes.reshape(-1), minlength=4096).max() / codes.size)
+
+
+def _border_sides(gray, settings):
+    """几乎没有变化、且和里面颜色差别很大的边，返回边的名称列表"""
+    size = gray.shape[0]
+    width = max(2, int(size * BORDER_FRACTION))
+    strips = {
+        "上": (gray[:width], gray[width:2 * width]),
+        "下": (gray[-width:], gray[-2 * width:-width]),
+        "左": (gray[:, :width], gray[:, width:2 * width]),
+        "右": (gray[:, -width:], gray[:, -2 * width:-width]),
+    }
+    sides = []
+    for side, (strip, inner) in strips.items():
+        if strip.std() < settings["BorderStd"] and abs(float(strip.mean()) - float(inner.mean())) > settings["BorderContrast"]:
+            sides.append(side)
+    return sides
+
+
+def _corner_edges(gray):
+    """
+    下方两个角和其它边缘区域的边缘密度
+    返回 (角落中较高的边缘密度, 上、左、右边缘和底边中间中较高的边缘密度)
+    """
+    gray = gray.astype(np.float32)
+    laplacian = np.abs(gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1] - 4 * gray[1:-1, 1:-1])
+    edges = laplacian > EDGE_THRESHOLD
+    height, width = edges.shape
+    corner_h = max(1, int(height * CORNER_HEIGHT))
+    corner_w = max(1, int(width * CORNER_WIDTH))
+    corners = [edges[-corner_h:, :corner_w], edges[-corner_h:, -corner_w:]]
+    others = [edges[:corner_h], edges[:-corner_h, :corner_h], edges[:-corner_h, -corner_h:], edges[-corner_h:, corner_w:-corner_w]]
+    return max(float(corner.mean()) for corner in corners), max(float(region.mean()) for region in others)
+
+
+def _detect_people(cv2, image):
+    """用 OpenCV 的 Haar 人脸和 HOG 行人检测器，返回 (人脸数, 人物数)"""
+    gray = np.asarray(image.convert("L").resize((512, 512), Image.BILINEAR))
+    faces = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+    face_boxes = faces.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=6, minSize=(40, 40))
+    hog = cv2.HOGDescriptor()
+    hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    people_boxes, weights = hog.detectMultiScale(gray, winStride=(8, 8), padding=(8, 8), scale=1.05)
+    people = sum(1 for weight in np.asarray(weights).reshape(-1) if weight > 0.5)
+    return len(face_boxes), people
+
+
+def analyze_image(image, settings=None, detector=None):
+    """
+    计算一张图片的统计量并检查，返回 (统计量, 问题列表)
+    image 为 PIL 图片，问题列表为空表示通过
+    """
+    settings = settings or DEFAULT_QUALITY
+    width, height = image.size
+    rgb_image = image.convert("RGB").resize((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.BILINEAR)
+    rgb = np.asarray(rgb_image, dtype=np.uint8)
+    gray = np.asarray(rgb_image.convert("L"), dtype=np.uint8)
+
+    corner, band = _corner_edges(np.asarray(image.convert("L").resize((EDGE_SIZE, EDGE_SIZE), Image.BILINEAR)))
+    metrics = {
+        "width": width,
+        "height": height,
+        "entropy": round(_entropy(gray), 3),
+        "dominant": round(_dominant_fraction(rgb), 3),
+        "border": _border_sides(gray, settings),
+        "corner-edges": round(corner, 3),
+        "band-edges": round(band, 3),
+    }
+
+    problems = []
+    if min(width, height) < settings["MinSize"]:
+        problems.append(f"尺寸太小 {width}x{height}")
+    if all(abs(width / height - aspect) > settings["AspectTolerance"] for aspect in settings["Aspects"]):
+        problems.append(f"宽高比 {width / height:.2f}，应为 {' 或 '.join(f'{aspect:.2f}' for aspect in settings['Aspects'])}")
+    if metrics["entropy"] < settings["MinEntropy"]:
+        problems.append(f"几乎空白（熵 {metrics['entropy']:.2f}）")
+    if metrics["dominant"] > settings["MaxDominant"]:
+        problems.append(f"近乎单色（{metrics['dominant']:.0%} 为同一颜色）")
+    if metrics["border"]:
+        problems.append(f"{'、'.join(metrics['border'])}边有边框")
+    if corner > settings["WatermarkEdges"] and corner > 2 * band + 0.02:
+        problems.append(f"角落疑似水印（边缘密度 {corner:.2f}，其它边缘 {band:.2f}）")
+
+    if detector is not None and settings["Detector"]:
+        faces, people = _detect_people(detector, image)
+        metrics["faces"] = faces
+        metrics["people"] = people
+        if faces or people:
+            problems.append(f"检测到人物（人脸 {faces}，人物 {people}）")
+    return metrics, problems
+
+
+def analyze_file(job):
+    """
+    检查一个图片文件（在子进程中运行）
+    job 为 (文件路径, 配置)，返回 (文件路径, 统计量, 问题列表, 错误信息)
+    """
+    disk_path, settings = job
+    try:
+        with Image.open(disk_path) as image:
+            image.load()
+            metrics, problems = analyze_image(image, settings, load_detector())
+    except Exception as e:
+        return disk_path, None, ["无法读取图片"], str(e)
+    return disk_path, metrics, problems, None
+
+
+def settings_fingerprint(settings):
+    """检查参数的指纹，参数、算法版本或检测器可用性变化后缓存失效"""
+    return compute_fingerprint({**settings, "version": QUALITY_VERSION, "detector": load_detector() is not None and settings["Detector"]})
+
+
+def load_quality_cache(settings, cache_file=QUALITY_CACHE_FILE):
+    """
+    加载检查结果缓存
+    {"settings": 参数指纹, "results": {sha256: {"metrics", "problems"}},
+     "attempts": {资源路径: {"count": 连续未通过的图片数, "sha256": 最后一张未通过的图片}}}
+    attempts 按条目应有的资源路径（名称和类型）记录，重名但类型不同的条目分别计数
+    """
+    cache = {"settings": settings_fingerprint(settings), "results": {}, "attempts": {}}
+    if not os.path.exists(cache_file):
+        return cache
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取图片质量缓存失败: {e}")
+        return cache
+    # 旧版本按条目名称记录，重名的条目会共用计数，直接丢弃
+    cache["attempts"] = {key: value for key, value in saved.get("attempts", {}).items() if key.startswith("assets/")}
+    if saved.get("settings") == cache["settings"]:
+        cache["results"] = saved.get("results", {})
+    return cache
+
+
+def save_quality_cache(cache, cache_file=QUALITY_CACHE_FILE):
+    """保存检查结果缓存"""
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_file, cache_file)
+
+
+def apply_result(item, problems, cache, settings, sha256=None, field=FIELD, generated=False):
+    """
+    把检查结果写入条目
+    没有通过时标记为需要重新生成，连续 MaxRetries 张图片没有通过时隔离
+    同一张图片重复检查只算一次；generated 为真表示刚生成的图片，服务商返回了相同的内容也计数
+    返回 "passed"、"requeued" 或 "quarantined"
+    """
+    key = expected_asset_path(item, field)
+    if not problems:
+        cache["attempts"].pop(key, None)
+        return "passed"
+    attempts = cache["attempts"].get(key) or {"count": 0, "sha256": None}
+    if generated or sha256 is None or attempts["sha256"] != sha256:
+        attempts = {"count": attempts["count"] + 1, "sha256": sha256}
+    cache["attempts"][key] = attempts
+    reason = "；".join(problems)
+    if attempts["count"] >= settings["MaxRetries"]:
+        mark_failed(item, field, f"图片质量检查未通过: {reason}", max_failures=1)
+        return "quarantined"
+    invalidate_fingerprint(item, field, REASON_PREFIX + reason)
+    return "requeued"
+
+
+class QualityGate:
+    """
+    生成过程中在后台进程池里检查刚保存的图片
+    submit 立即返回；collect 在主线程中把已完成的结果写入条目，调用方负责保存目录
+    """
+
+    def __init__(self, field=FIELD, settings=None, workers=None):
+        self.field = field
+        self.settings = settings or quality_settings()
+        self.cache = load_quality_cache(self.settings)
+        self.workers = workers
+        self.executor = None
+        self.futures = {}
+        self.counts = {"passed": 0, "requeued": 0, "quarantined": 0}
+
+    def submit(self, item, disk_path):
+        """提交一张刚保存的图片，内容已检查过时直接使用缓存的结果"""
+        with open(disk_path, 'rb') as f:
+            sha256 = hashlib.sha256(f.read()).hexdigest()
+        cached = self.cache["results"].get(sha256)
+        if cached is not None:
+            self._apply(item, disk_path, cached["problems"], sha256)
+            return
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        future = self.executor.submit(analyze_file, (disk_path, self.settings))
+        self.futures[future] = (item, sha256)
+
+    def _apply(self, item, disk_path, problems, sha256):
+        status = apply_result(item, problems, self.cache, self.settings, sha256, self.field, generated=True)
+        self.counts[status] += 1
+        if status != "passed":
+            action = "已隔离" if status == "quarantined" else "将重新生成"
+            print(f"  ⚠️  图片质量检查未通过，{action}: {disk_path}（{'；'.join(problems)}）")
+
+    def collect(self, wait=False):
+        """处理已完成的检查，wait 为真时等待全部完成，返回处理的数量"""
+        done = [future for future in self.futures if wait or future.done()]
+        for future in done:
+            item, sha256 = self.futures.pop(future)
+            disk_path, metrics, problems, error = future.result()
+            if error is None:
+                self.cache["results"][sha256] = {"metrics": metrics, "problems": problems}
+            self._apply(item, disk_path, problems, sha256)
+        return len(done)
+
+    def close(self):
+        """等待全部检查完成，保存缓存，返回各结果的数量"""
+        self.collect(wait=True)
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        save_quality_cache(self.cache)
+        return self.counts
+
+
+def check_images(items, index, settings=None, workers=None, field=FIELD):
+    """
+    检查目录中全部已有的图片（已隔离的跳过），内容和参数不变的直接使用缓存
+    返回 ({资源路径: {"metrics", "problems"}}, 检查缓存)
+    """
+    settings = settings or quality_settings()
+    cache = load_quality_cache(settings)
+    case_lookup = build_case_lookup(index)
+    images = {}
+    for item in items:
+        if is_quarantined(item, field):
+            continue
+        actual_path, entry = resolve_asset(index, case_lookup, item.get(field, ""))
+        if entry is not None and not entry.get("corrupt"):
+            images[actual_path] = entry["sha256"]
+
+    todo = sorted({path for path, sha256 in images.items() if sha256 not in cache["results"]})
+    if todo:
+        print(f"需要检查的图片: {len(todo)} 张（{len(images) - len(todo)} 张使用缓存）")
+        jobs = [(to_disk_path(path), settings) for path in todo]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, (_, metrics, problems, error) in zip(todo, executor.map(analyze_file, jobs, chunksize=8)):
+                if error:
+                    print(f"无法读取图片 {path}: {error}")
+                    continue
+                cache["results"][images[path]] = {"metrics": metrics, "problems": problems}
+    results = {path: cache["results"][sha256] for path, sha256 in images.items() if sha256 in cache["results"]}
+    return results, cache
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="检查图片质量（空白、单色、边框、水印、比例、人物）")
+    parser.add_argument("--workers", type=int, default=None, help="检查图片的进程数，默认为CPU核数")
+    parser.add_argument("--apply", action="store_true", help="把没有通过的图片标记为需要重新生成，多次没有通过的隔离")
+    parser.add_argument("--json", dest="json_path", help="将检查结果写入JSON文件")
+    parser.add_argument("--limit", type=int, default=20, help="最多显示的问题图片数")
+    args = parser.parse_args(argv)
+
+    settings = quality_settings()
+    if settings["Detector"] and load_detector() is None:
+        print("没有安装 opencv-python，不检查人物（pip install opencv-python-headless）")
+
+    items = load_catalogue()
+    index = scan_assets()
+    save_asset_index(index)
+    results, cache = check_images(items, index, settings, args.workers)
+    failed = {path: result for path, result in results.items() if result["problems"]}
+    print(f"共检查 {len(results)} 张图片，未通过 {len(failed)} 张")
+    for path, result in sorted(failed.items())[:args.limit]:
+        print(f"  {path}: {'；'.join(result['problems'])}")
+    if len(failed) > args.limit:
+        print(f"  ... 还有 {len(failed) - args.limit} 张")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"检查结果已写入: {args.json_path}")
+
+    if args.apply:
+        case_lookup = build_case_lookup(index)
+        counts = {"passed": 0, "requeued": 0, "quarantined": 0}
+        for item in items:
+            actual_path, entry = resolve_asset(index, case_lookup, item.get(FIELD, ""))
+            if actual_path in results and not is_quarantined(item, FIELD):
+                counts[apply_result(item, results[actual_path]["problems"], cache, settings, entry["sha256"])] += 1
+        save_catalogue(items)
+        print(f"已标记重新生成 {counts['requeued']} 个条目，隔离 {counts['quarantined']} 个（连续 {settings['MaxRetries']} 次未通过）")
+    save_quality_cache(cache)
+    return results
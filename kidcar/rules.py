@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+目录校验规则引擎
+
+规则写在 validate-rules.yaml 中。校验时先把目录按字段拆成列，每条规则对整列
+做一次检查（正则预编译、重复项用一次计数），而不是对每个条目逐条调用判断函数，
+几万个条目也能立即完成。结果是一份可以写成 JSON 的报告，
+validate_car_data.py 用它删除无效条目，--check 模式下用作流水线的检查关卡。
+"""
+
+import os
+import re
+
+from kidcar.catalog import expected_asset_path
+from kidcar.config import load_config
+
+RULES_FILE = "validate-rules.yaml"
+
+SEVERITIES = ("error", "warning")
+ACTIONS = ("remove", "report")
+
+# 每一行都需要的字段：报告中的名称、重复检查中的类型，以及计算资源路径用到的文本
+ROW_FIELDS = ("car-name", "car-type", "car-english-name")
+
+
+class Columns:
+    """
+    目录按字段拆成的列
+    只遍历一次条目，只保留规则用到的字段，条目可以是流式读取的目录（kidcar.catalog.CatalogueReader）
+    """
+
+    def __init__(self, items, fields):
+        self._columns = {field: [] for field in fields}
+        self.count = 0
+        for item in items:
+            for field, column in self._columns.items():
+                value = item.get(field)
+                column.append(value if isinstance(value, str) else ("" if value is None else str(value)))
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, field):
+        return self._columns[field]
+
+    def row(self, row):
+        """一行中已读取的字段"""
+        return {field: column[row] for field, column in self._columns.items()}
+
+
+# 每个检查返回 [(行号, 字段, 值, 说明)]
+
+def check_required(rule, columns):
+    violations = []
+    for field in rule["fields"]:
+        violations.extend((row, field, value, "为空") for row, value in enumerate(columns[field]) if not value.strip())
+    return violations
+
+
+def check_equals(rule, columns):
+    field = rule["field"]
+    values = set(rule["values"])
+    return [(row, field, value, None) for row, value in enumerate(columns[field]) if value in values]
+
+
+def check_contains(rule, columns):
+    field = rule["field"]
+    needle = rule["value"]
+    return [(row, field, value, None) for row, value in enumerate(columns[field]) if needle in value]
+
+
+def check_length(rule, columns):
+    field = rule["field"]
+    low = rule.get("min", 0)
+    high = rule.get("max")
+    violations = []
+    for row, value in enumerate(columns[field]):
+        length = len(value)
+        if length < low or (high is not None and length > high):
+            violations.append((row, field, value, f"长度 {length}"))
+    return violations
+
+
+def check_pattern(rule, columns):
+    """regex 要求整个字段匹配；forbid 为 true 时反过来，匹配的值是违规"""
+    field = rule["field"]
+    pattern = re.compile(rule["regex"])
+    forbid = rule.get("forbid", False)
+    return [(row, field, value, None) for row, value in enumerate(columns[field])
+            if (pattern.fullmatch(value) is not None) == forbid and (value or forbid)]
+
+
+def check_duplicate(rule, columns):
+    """值和前面的条目重复，报告第一次出现的位置"""
+    field = rule["field"]
+    first_seen = {}
+    violations = []
+    types = columns["car-type"]
+    for row, value in enumerate(columns[field]):
+        if not value:
+            continue
+        first = first_seen.setdefault(value, row)
+        if first != row:
+            violations.append((row, field, value, f"与第 {first} 条（{types[first]}）重复"))
+    return violations
+
+
+def check_case_conflict(rule, columns):
+    """值和前面的条目只差大小写"""
+    field = rule["field"]
+    first_seen = {}
+    violations = []
+    for row, value in enumerate(columns[field]):
+        if not value:
+            continue
+        first = first_seen.setdefault(value.lower(), (row, value))
+        if first[1] != value:
+            violations.append((row, field, value, f"与第 {first[0]} 条的 {first[1]} 只差大小写"))
+    return violations
+
+
+def check_path_mismatch(rule, columns):
+    """资源路径（不含扩展名，区分大小写）和按当前文本计算的路径不一致，空路径不在这里报告"""
+    field = rule["field"]
+    violations = []
+    for row, value in enumerate(columns[field]):
+        if not value:
+            continue
+        expected = expected_asset_path(columns.row(row), field)
+        if os.path.splitext(value)[0] != os.path.splitext(expected)[0]:
+            violations.append((row, field, value, f"应为 {expected}"))
+    return violations
+
+
+CHECKS = {
+    "required": check_required,
+    "equals": check_equals,
+    "contains": check_contains,
+    "length": check_length,
+    "pattern": check_pattern,
+    "duplicate": check_duplicate,
+    "case-conflict": check_case_conflict,
+    "path-mismatch": check_path_mismatch,
+}
+
+
+def load_rules(rules_file=RULES_FILE):
+    """读取并检查规则文件"""
+    rules = load_config(rules_file).get("rules") or []
+    for rule in rules:
+        if rule.get("check") not in CHECKS:
+            raise ValueError(f"规则 {rule.get('id')} 的检查类型未知: {rule.get('check')}")
+        rule.setdefault("severity", "warning")
+        rule.setdefault("action", "report")
+        if rule["severity"] not in SEVERITIES:
+            raise ValueError(f"规则 {rule['id']} 的 severity 应为 {'/'.join(SEVERITIES)}")
+        if rule["action"] not in ACTIONS:
+            raise ValueError(f"规则 {rule['id']} 的 action 应为 {'/'.join(ACTIONS)}")
+    return rules
+
+
+def rule_fields(rules):
+    """规则用到的字段，加上报告和资源路径需要的名称、类型字段"""
+    fields = set(ROW_FIELDS)
+    for rule in rules:
+        fields.update(rule.get("fields") or [rule["field"]])
+    return sorted(fields)
+
+
+def evaluate(items, rules):
+    """
+    对整个目录执行所有规则，返回报告
+    items 可以是条目列表，也可以是流式读取的目录，只遍历一次
+    {
+      "entries": 条目数,
+      "rules": {规则: {"severity", "action", "message", "count"}},
+      "violations": [{"index", "car-name", "rule", "severity", "action", "field", "value", "detail"}],
+      "remove": [要删除的行号],
+      "errors": error 级别的违规数,
+      "warnings": warning 级别的违规数,
+    }
+    """
+    columns = Columns(items, rule_fields(rules))
+    names = columns["car-name"]
+    report = {"entries": len(columns), "rules": {}, "violations": [], "remove": [], "errors": 0, "warnings": 0}
+    remove = set()
+
+    for rule in rules:
+        hits = CHECKS[rule["check"]](rule, columns)
+        report["rules"][rule["id"]] = {
+            "severity": rule["severity"],
+            "action": rule["action"],
+            "message": rule.get("message", ""),
+            "count": len(hits),
+        }
+        report["errors" if rule["severity"] == "error" else "warnings"] += len(hits)
+        for row, field, value, detail in hits:
+            report["violations"].append({
+                "index": row,
+                "car-name": names[row],
+                "rule": rule["id"],
+                "severity": rule["severity"],
+                "action": rule["action"],
+                "field": field,
+                "value": value,
+                "detail": detail,
+            })
+            if rule["action"] == "remove":
+                remove.add(row)
+
+    report["remove"] = sorted(remove)
+    return report
+
+
+def print_report(report, examples=5):
+    """按规则打印校验结果，每条规则只显示几个例子"""
+    by_rule = {}
+    for violation in report["violations"]:
+        by_rule.setdefault(violation["rule"], []).append(violation)
+
+    print(f"共 {report['entries']} 个条目，错误 {report['errors']} 个，警告 {report['warnings']} 个")
+    for rule_id, summary in report["rules"].items():
+        if not summary["count"]:
+            continue
+        action = "删除" if summary["action"] == "remove" else "报告"
+        print(f"\n[{summary['severity']}] {rule_id}（{action}）: {summary['message']} - {summary['count']} 个")
+        for violation in by_rule[rule_id][:examples]:
+            detail = f"（{violation['detail']}）" if violation["detail"] else ""
+            print(f"  #{violation['index']} {violation['car-name']}: {violation['field']} = {violation['value'][:40]!r}{detail}")
+        if summary["count"] > examples:
+            print(f"  ... 还有 {summary['count'] - examples} 个")
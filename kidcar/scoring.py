@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+候选图片本地评分（best-of-N）
+
+服务商一次返回多张候选图片时，在本机用几个简单指标给每张打分，只保存最好的一张：
+  - 清晰度:   拉普拉斯响应的方差，模糊的图片得分低
+  - 色彩度:   Hasler-Süsstrunk colorfulness，儿童卡片需要明亮的颜色
+  - 差异度:   和目录中已有图片的 pHash / dHash 最小汉明距离，和别的条目撞图的候选得分低
+全部在 CPU 上用 NumPy 完成，一张 1024x1024 的图片只需几十毫秒。
+"""
+
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from kidcar.dedupe import HASH_SIZE, PHASH_SIZE, compute_hashes, hamming_to, hash_images
+
+# 计算清晰度和色彩度前先缩放到这个尺寸，不同分辨率的候选可以直接比较
+SCORE_SIZE = 256
+
+# 各指标达到满分的参考值
+SHARPNESS_REFERENCE = 500.0
+COLORFULNESS_REFERENCE = 80.0
+DISTANCE_REFERENCE = 24
+
+# 汉明距离不超过这个值视为和已有图片重复（和 dedupe_images.py 的默认阈值一致）
+DUPLICATE_THRESHOLD = 10
+
+# 综合得分中各指标的权重
+WEIGHTS = {"sharpness": 0.4, "colorfulness": 0.3, "distinctness": 0.3}
+
+
+def image_features(data):
+    """解码一张候选图片，计算清晰度、色彩度和感知哈希"""
+    with Image.open(BytesIO(data)) as image:
+        rgb_image = image.convert("RGB")
+        gray_image = rgb_image.convert("L")
+        rgb = np.asarray(rgb_image.resize((SCORE_SIZE, SCORE_SIZE), Image.BILINEAR), dtype=np.float32)
+        gray = np.asarray(gray_image.resize((SCORE_SIZE, SCORE_SIZE), Image.BILINEAR), dtype=np.float32)
+        pixels_32 = np.asarray(gray_image.resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+        pixels_9x8 = np.asarray(gray_image.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+
+    # 4邻域拉普拉斯
+    laplacian = gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1] - 4 * gray[1:-1, 1:-1]
+
+    red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    rg = red - green
+    yb = (red + green) / 2 - blue
+    colorfulness = np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean())
+
+    phash, dhash = compute_hashes(pixels_32[None], pixels_9x8[None])
+    return {
+        "sharpness": float(laplacian.var()),
+        "colorfulness": float(colorfulness),
+        "phash": int(phash[0]),
+        "dhash": int(dhash[0]),
+    }
+
+
+def load_reference_hashes(index):
+    """目录中已有图片的感知哈希，返回 {资源路径: (phash, dhash)}"""
+    return {
+        path: (int(entry["phash"], 16), int(entry["dhash"], 16))
+        for path, entry in hash_images(index).items()
+    }
+
+
+def nearest_distance(features, reference, exclude=None):
+    """候选图片和已有图片（不含 exclude，即条目自己的旧图片）的最小汉明距离，取 pHash 和 dHash 中较大的一个"""
+    paths = [path for path in reference if exclude is None or path.lower() != exclude.lower()]
+    if not paths:
+        return 64
+    phash_distances = hamming_to(features["phash"], [reference[path][0] for path in paths])
+    dhash_distances = hamming_to(features["dhash"], [reference[path][1] for path in paths])
+    return int(np.maximum(phash_distances, dhash_distances).min())
+
+
+def score_candidates(candidates, reference=None, exclude=None):
+    """
+    给候选图片打分
+    candidates 为图片数据列表，reference 为 load_reference_hashes() 的结果
+    返回按得分从高到低排列的 [(候选下标, 得分, 指标)]，无法解码的候选不在结果中
+    """
+    scored = []
+    for i, data in enumerate(candidates):
+        try:
+            features = image_features(data)
+        except Exception as e:
+            print(f"  无法读取候选图片 {i + 1}: {e}")
+            continue
+
+        distance = nearest_distance(features, reference, exclude) if reference else 64
+        metrics = {
+            "sharpness": min(1.0, np.log1p(features["sharpness"]) / np.log1p(SHARPNESS_REFERENCE)),
+            "colorfulness": min(1.0, features["colorfulness"] / COLORFULNESS_REFERENCE),
+            "distinctness": min(1.0, distance / DISTANCE_REFERENCE),
+        }
+        score = sum(WEIGHTS[name] * value for name, value in metrics.items())
+        # 和已有图片重复的候选只在没有其它选择时使用
+        if distance <= DUPLICATE_THRESHOLD:
+            score -= 1
+        scored.append((i, round(float(score), 4), {**{name: round(float(value), 3) for name, value in metrics.items()}, "distance": distance}))
+
+    return sorted(scored, key=lambda result: result[1], reverse=True)
+
+
+def pick_best(candidates, reference=None, exclude=None):
+    """从候选图片中选出得分最高的一张，返回 (图片数据, 得分)，全部无法解码时返回 (None, None)"""
+    scored = score_candidates(candidates, reference, exclude)
+    if not scored:
+        return None, None
+    for i, score, metrics in scored:
+        print(f"  候选 {i + 1}: 得分 {score:.3f}（清晰度 {metrics['sharpness']:.2f}，色彩 {metrics['colorfulness']:.2f}，"
+              f"差异 {metrics['distinctness']:.2f}，最近距离 {metrics['distance']}）")
+    best, score, _ = scored[0]
+    return candidates[best], score
+
+
+def add_reference(reference, asset_path, data):
+    """把刚保存的图片加入参考哈希，同一次运行中后面的条目也会避开它"""
+    features = image_features(data)
+    reference[asset_path] = (features["phash"], features["dhash"])
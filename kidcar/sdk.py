@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+服务商SDK的延迟导入
+
+openai、google-genai 等SDK导入很慢，只在真正调用对应服务商时才导入，
+这样不调用它们的命令启动更快，没装某个SDK也不影响其它脚本。
+"""
+
+import importlib
+
+
+def require(module_name, package):
+    """导入模块，没有安装时给出需要安装的包名"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"缺少依赖 {package}，请先运行: pip install {package}") from e
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+预先拼接的播放音频（英文 ×3 + 中文）
+
+App 点一下卡片会依次播放英文音频三遍、中文音频一遍，每一段都要重新启动播放器并等待固定间隔。
+这里把四段音频按帧直接拼成一个文件（不解码、不重新编码），段与段之间插入静音帧，
+App 只需要播放一次。
+
+拼接规则:
+  - 每段去掉结尾的静音帧，开头保留（TTS 输出的第一帧 main_data_begin 为 0，后面的帧可能引用它的主数据）
+  - 段间的停顿 = 下一段开头已有的静音 + 插入的静音帧，英文之间 RepeatGap 秒，英文和中文之间 SwitchGap 秒
+  - 所有片段的 MPEG 版本、采样率和声道数必须一致（Edge TTS 和本地合成的输出都是 24kHz 单声道）
+
+拼接结果保存在 sequence-audio-path 字段，指纹由两段输入音频的 sha256 和停顿参数计算，
+输入音频不变时不会重新拼接。
+
+local.yaml 示例:
+  Sequence:
+    Repeats: 3
+    RepeatGap: 0.35
+    SwitchGap: 0.6
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from kidcar.assets import build_case_lookup, replace_asset_file, resolve_asset, save_asset_index, scan_assets
+from kidcar.catalog import SEQUENCE_FIELD, expected_asset_path, load_catalogue, save_catalogue, to_disk_path
+from kidcar.config import get_section
+from kidcar.fingerprint import compute_fingerprint, get_fingerprint, set_fingerprint
+from kidcar.mp3 import is_info_frame, join_frames, parse_frames, silent_frame
+from kidcar.state import mark_committed
+
+# 拼接用到的输入音频
+ENGLISH_FIELD = "english-audio-path"
+CHINESE_FIELD = "chinese-audio-path"
+
+DEFAULT_SEQUENCE = {
+    "Repeats": 3,
+    "RepeatGap": 0.35,
+    "SwitchGap": 0.6,
+}
+
+
+def sequence_settings():
+    """读取 local.yaml 的 Sequence 配置"""
+    settings = dict(DEFAULT_SEQUENCE)
+    settings.update(get_section("Sequence"))
+    return settings
+
+
+def sequence_fingerprint(english_sha256, chinese_sha256, settings):
+    """拼接音频的指纹：输入音频的内容和停顿参数"""
+    return compute_fingerprint({"english": english_sha256, "chinese": chinese_sha256, **settings})
+
+
+def clip_frames(data):
+    """解析一段音频，去掉标签帧和结尾的静音帧"""
+    frames = [frame for frame in parse_frames(data) if not is_info_frame(data, frame)]
+    end = len(frames)
+    while end > 0 and frames[end - 1].silent:
+        end -= 1
+    if end == 0:
+        raise ValueError("音频中没有有效的帧")
+    return frames[:end]
+
+
+def lead_seconds(frames):
+    """片段开头已有的静音时长"""
+    seconds = 0
+    for frame in frames:
+        if not frame.silent:
+            break
+        seconds += frame.duration
+    return seconds
+
+
+def compose_sequence(english, chinese, settings=None):
+    """
+    把英文音频重复 Repeats 遍再接中文音频，返回拼接后的 MP3 数据
+    两段音频的格式不一致时抛出 ValueError
+    """
+    settings = settings or DEFAULT_SEQUENCE
+    english_frames = clip_frames(english)
+    chinese_frames = clip_frames(chinese)
+    first = english_frames[0]
+    other = chinese_frames[0]
+    if (other.mpeg1, other.sample_rate, other.mono) != (first.mpeg1, first.sample_rate, first.mono):
+        raise ValueError(f"音频格式不一致: {first.sample_rate}Hz/{'单' if first.mono else '双'}声道 "
+                         f"和 {other.sample_rate}Hz/{'单' if other.mono else '双'}声道")
+
+    silence = silent_frame(english, first)
+
+    def gap(seconds, next_frames):
+        count = max(0, round((seconds - lead_seconds(next_frames)) / first.duration))
+        return silence * count
+
+    parts = []
+    for repeat in range(settings["Repeats"]):
+        if repeat:
+            parts.append(gap(settings["RepeatGap"], english_frames))
+        parts.append(join_frames(english, english_frames))
+    parts.append(gap(settings["SwitchGap"], chinese_frames))
+    parts.append(join_frames(chinese, chinese_frames))
+    # 结尾留一点静音，避免播放器截掉最后一帧
+    parts.append(silence * 4)
+    return b''.join(parts)
+
+
+def compose_file(job):
+    """
+    拼接一个文件（在子进程中运行）
+    job 为 (输出文件, 英文音频文件, 中文音频文件, 配置)，返回 (输出文件, 错误信息)
+    """
+    output_path, english_path, chinese_path, settings = job
+    try:
+        with open(english_path, 'rb') as f:
+            english = f.read()
+        with open(chinese_path, 'rb') as f:
+            chinese = f.read()
+        data = compose_sequence(english, chinese, settings)
+        tmp_path = f"{output_path}.part"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        replace_asset_file(tmp_path, output_path)
+    except (OSError, ValueError) as e:
+        return output_path, str(e)
+    return output_path, None
+
+
+def collect_sequence_tasks(items, index, settings, force=False):
+    """
+    收集需要拼接的条目，按输出文件合并
+    返回 {输出文件: (英文音频文件, 中文音频文件, [(条目, 指纹)])}
+    """
+    case_lookup = build_case_lookup(index)
+    tasks = {}
+    for item in items:
+        english_path, english = resolve_asset(index, case_lookup, item.get(ENGLISH_FIELD, ""))
+        chinese_path, chinese = resolve_asset(index, case_lookup, item.get(CHINESE_FIELD, ""))
+        if english is None or chinese is None or english.get("corrupt") or chinese.get("corrupt"):
+            continue
+        fingerprint = sequence_fingerprint(english["sha256"], chinese["sha256"], settings)
+        _, current = resolve_asset(index, case_lookup, item.get(SEQUENCE_FIELD, ""))
+        if not force and current is not None and get_fingerprint(item, SEQUENCE_FIELD) == fingerprint:
+            continue
+        output_path = to_disk_path(expected_asset_path(item, SEQUENCE_FIELD))
+        task = tasks.setdefault(output_path, (to_disk_path(english_path), to_disk_path(chinese_path), []))
+        task[2].append((item, fingerprint))
+    return tasks
+
+
+def build_sequences(items, index=None, settings=None, workers=None, force=False):
+    """
+    拼接所有需要更新的播放音频，用多个进程并行
+    返回 (拼接的文件数, 失败的文件数)，调用方负责保存目录
+    """
+    if index is None:
+        index = scan_assets()
+    settings = settings or sequence_settings()
+    tasks = collect_sequence_tasks(items, index, settings, force)
+    if not tasks:
+        return 0, 0
+
+    print(f"拼接 {len(tasks)} 个播放音频（英文 ×{settings['Repeats']} + 中文）")
+    jobs = [(output_path, english_path, chinese_path, settings) for output_path, (english_path, chinese_path, _) in tasks.items()]
+    composed = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for output_path, error in executor.map(compose_file, jobs, chunksize=16):
+            if error:
+                print(f"  拼接失败 {output_path}: {error}")
+                failed += 1
+                continue
+            asset_path = expected_asset_path(tasks[output_path][2][0][0], SEQUENCE_FIELD)
+            for item, fingerprint in tasks[output_path][2]:
+                mark_committed(item, SEQUENCE_FIELD, asset_path)
+                set_fingerprint(item, SEQUENCE_FIELD, fingerprint)
+            composed += 1
+    return composed, failed
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="把英文音频三遍和中文音频一遍拼接成一个播放音频")
+    parser.add_argument("--workers", type=int, help="并行进程数，默认 CPU 核数")
+    parser.add_argument("--force", action="store_true", help="忽略指纹，全部重新拼接")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    items = load_catalogue()
+    index = scan_assets()
+    save_asset_index(index)
+    composed, failed = build_sequences(items, index, workers=args.workers, force=args.force)
+    if composed:
+        save_catalogue(items)
+    print(f"拼接完成: {composed} 个，失败 {failed} 个，耗时 {time.perf_counter() - started:.2f} 秒")
+    return composed
@@ -0,0 +1,544 @@
+# -*- coding: utf-8 -*-
+"""
+本地目录服务: 开发和展台（kiosk）部署时直接从仓库提供目录和资源
+
+python -m kidcar serve 启动一个只用标准库的 HTTP/1.1 服务（asyncio，单线程，可以同时保持大量连接）:
+
+  GET /api/categories                         分类列表和各分类的条目数
+  GET /api/items?category=&q=&page=&size=     按分类筛选、按名称/英文名/类型搜索、分页（size 最大 200）
+  GET /api/items/<名称>?type=                 单个条目，重名的条目用 type（分类）区分，不指定时返回目录中的第一个
+  GET /assets/...                             kid_car_flutter/assets 下的图片和音频
+  GET /catalog/...                            python -m kidcar export 的导出目录
+
+条目中的资源路径保持 assets/... 的形式，页面可以直接按路径懒加载。
+文件响应支持 Range（单个范围，206 / 416）、ETag 和 If-None-Match（304），ETag 取自资源索引中的 sha256，
+文件大小或修改时间和索引不一致时改用弱 ETag。导出目录中的 .br / .gz 预压缩文件按 Accept-Encoding 选择；
+带哈希的导出文件设置永久缓存，其它响应每次验证。文件内容用 loop.sendfile 发送（Linux 上是 sendfile 零拷贝，
+其它平台自动退回分块读写）。car.json 或资源目录变化后自动在线程池中重新加载，
+加载期间的请求继续使用旧数据，不阻塞正在发送的文件，不需要重启服务。
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from kidcar.assets import build_case_lookup, resolve_asset, save_asset_index, scan_assets
+from kidcar.catalog import AUDIOS_DIR, CAR_JSON_FILE, FLUTTER_DIR, IMAGES_DIR, iter_catalogue
+from kidcar.export import EXPORT_DIR, INDEX_FILE, PUBLIC_PATH, encode_json
+from kidcar.sync import vue_catalogue
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+# URL 前缀 -> 本地目录
+STATIC_ROOTS = {
+    "/assets/": os.path.join(FLUTTER_DIR, "assets"),
+    PUBLIC_PATH: EXPORT_DIR,
+}
+
+# 分页大小
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 搜索匹配的字段
+SEARCH_FIELDS = ("car-name", "car-english-name", "car-type")
+
+# 请求头最大长度、空闲连接保持时间（秒）
+MAX_HEADER_BYTES = 16 * 1024
+KEEPALIVE_TIMEOUT = 15
+
+# 超过这个大小的 JSON 响应按 Accept-Encoding 用 gzip 压缩
+COMPRESS_MIN_BYTES = 1024
+
+# 预压缩文件的后缀，按优先顺序
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# 带哈希的导出文件名: 名称.<10位十六进制>.扩展名
+HASHED_NAME = re.compile(r"\.[0-9a-f]{10}\.[A-Za-z0-9]+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+STATUS_TEXT = {
+    200: "OK",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    416: "Range Not Satisfiable",
+    500: "Internal Server Error",
+}
+
+mimetypes.add_type("audio/mpeg", ".mp3")
+mimetypes.add_type("application/json", ".json")
+mimetypes.add_type("image/webp", ".webp")
+
+
+class HttpError(Exception):
+    """直接以状态码返回给客户端的错误"""
+
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+
+
+class Catalogue:
+    """
+    内存中的目录和资源索引
+    每个请求只检查 car.json 和资源目录的修改时间，变化后才重新读取
+    """
+
+    def __init__(self, json_file=CAR_JSON_FILE):
+        self.json_file = json_file
+        self.signature = None
+        self.items = []
+        self.by_name = {}
+        self.categories = []
+        self.search_text = []
+        self.index = {"files": {}}
+        self.case_lookup = {}
+        self.version = ""
+        self.reloading = False
+
+    def current_signature(self):
+        """car.json 和资源目录的修改时间（目录的修改时间在增删文件时变化）"""
+        signature = []
+        for path in (self.json_file, IMAGES_DIR, AUDIOS_DIR):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def load(self, signature):
+        """
+        读取目录和资源索引，返回新的状态，不修改当前状态
+        扫描资源目录会阻塞，服务运行时在线程池中调用（见 refresh_async）
+        """
+        started = time.perf_counter()
+        # 传入副本，扫描期间事件循环中的请求仍然使用旧的索引
+        index = scan_assets(dict(self.index) if self.signature is not None else None)
+        if index.get("rehashed"):
+            save_asset_index(index)
+
+        items = vue_catalogue(iter_catalogue(self.json_file))
+        by_name = {}
+        counts = {}
+        search_text = []
+        for item in items:
+            by_name.setdefault(item.get("car-name", ""), []).append(item)
+            category = item.get("car-type", "")
+            counts[category] = counts.get(category, 0) + 1
+            search_text.append(" ".join(str(item.get(field, "")) for field in SEARCH_FIELDS).lower())
+        print(f"已加载 {len(items)} 个条目、{len(index['files'])} 个资源文件（{time.perf_counter() - started:.2f} 秒）")
+        return {
+            "signature": signature,
+            "index": index,
+            "case_lookup": build_case_lookup(index),
+            "items": items,
+            "by_name": by_name,
+            "categories": [{"name": name, "count": count} for name, count in counts.items()],
+            "search_text": search_text,
+            "version": hashlib.sha256(encode_json([items, signature])).hexdigest()[:16],
+        }
+
+    def refresh(self):
+        """需要时重新加载（阻塞），返回是否重新加载了"""
+        signature = self.current_signature()
+        if signature == self.signature:
+            return False
+        self.__dict__.update(self.load(signature))
+        return True
+
+    async def refresh_async(self):
+        """
+        需要时在线程池中重新加载，不阻塞正在发送的文件和其它连接
+        加载期间到达的请求继续使用旧的数据，加载完成后一次替换
+        """
+        if self.reloading:
+            return False
+        signature = self.current_signature()
+        if signature == self.signature:
+            return False
+        self.reloading = True
+        try:
+            state = await asyncio.get_running_loop().run_in_executor(None, self.load, signature)
+        finally:
+            self.reloading = False
+        self.__dict__.update(state)
+        return True
+
+    def find(self, name, category=None):
+        """按名称（和分类）查找条目，重名时不指定分类返回目录中的第一个"""
+        for item in self.by_name.get(name, []):
+            if not category or item.get("car-type", "") == category:
+                return item
+        return None
+
+    def query(self, category=None, q=None):
+        """按分类和关键字筛选，返回条目列表"""
+        q = (q or "").strip().lower()
+        return [
+            item for item, text in zip(self.items, self.search_text)
+            if (not category or item.get("car-type", "") == category) and (not q or q in text)
+        ]
+
+    def asset_etag(self, url_path, stat):
+        """
+        资源文件的 ETag：索引中大小和修改时间一致时用 sha256（强 ETag），
+        否则用大小和修改时间（弱 ETag）
+        """
+        if url_path.startswith("/assets/"):
+            _, entry = resolve_asset(self.index, self.case_lookup, url_path[1:])
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                return f'"{entry["sha256"][:32]}"'
+        return f'W/"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    解析 Range 请求头，只支持单个字节范围
+    返回 (起始, 结束) 闭区间；不是可识别的 bytes 范围时返回 None（按整个文件响应）
+    范围不可满足时抛出 HttpError(416)
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, sep, end = header[6:].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start == "":
+            # bytes=-500: 最后 500 字节
+            length = int(end)
+            if length <= 0:
+                raise HttpError(416)
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HttpError(416)
+    return start, min(end, size - 1)
+
+
+def etag_matches(header, etag):
+    """If-None-Match 是否命中（弱比较）"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    strip = lambda tag: tag.strip().removeprefix("W/")
+    return strip(etag) in {strip(tag) for tag in header.split(",")}
+
+
+def accepted_encodings(header):
+    """Accept-Encoding 中可以接受的编码（忽略 q=0）"""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def resolve_static(url_path):
+    """URL 路径 -> (磁盘路径, URL 前缀)，不在静态目录下或试图跳出目录时返回 (None, None)"""
+    for prefix, root in STATIC_ROOTS.items():
+        if not url_path.startswith(prefix):
+            continue
+        relative = url_path[len(prefix):]
+        if not relative or "\0" in relative:
+            return None, None
+        root = os.path.abspath(root)
+        disk_path = os.path.abspath(os.path.join(root, *relative.split("/")))
+        if os.path.commonpath([root, disk_path]) != root:
+            return None, None
+        return disk_path, prefix
+    return None, None
+
+
+def cache_control(url_path, prefix):
+    """带哈希的导出文件永久缓存，其它文件每次验证"""
+    if prefix == PUBLIC_PATH and not url_path.endswith("/" + INDEX_FILE) and HASHED_NAME.search(url_path):
+        return IMMUTABLE
+    return REVALIDATE
+
+
+class Request:
+    """解析后的请求"""
+
+    def __init__(self, method, target, version, headers):
+        self.method = method
+        self.version = version
+        self.headers = headers
+        parts = urlsplit(target)
+        self.path = unquote(parts.path)
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+async def read_request(reader):
+    """读取一个请求，连接关闭时返回 None"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(413, "请求头过长")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HttpError(400, "无法解析请求行")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    # 只读服务，请求体直接丢弃
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HttpError(400, "Content-Length 不是整数")
+    if length < 0:
+        raise HttpError(400, "Content-Length 不能为负数")
+    if length > MAX_HEADER_BYTES:
+        raise HttpError(413, "请求体过大")
+    if length:
+        await reader.readexactly(length)
+    return Request(method, target, version, headers)
+
+
+class Server:
+    """目录 HTTP 服务"""
+
+    def __init__(self, catalogue, cors=True):
+        self.catalogue = catalogue
+        self.cors = cors
+        self.gzip_cache = {}
+        self.connections = 0
+        self.requests = 0
+
+    def base_headers(self, request):
+        headers = {"Server": "kidcar", "Connection": "keep-alive" if request.keep_alive else "close"}
+        if self.cors:
+            headers["Access-Control-Allow-Origin"] = "*"
+        return headers
+
+    async def write_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8"))
+        await writer.drain()
+
+    async def send_error(self, writer, request, status, message=""):
+        body = encode_json({"error": message or STATUS_TEXT.get(status, "")})
+        headers = self.base_headers(request) if request else {"Server": "kidcar", "Connection": "close"}
+        headers.update({"Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(body))})
+        await self.write_head(writer, status, headers)
+        if not request or request.method != "HEAD":
+            writer.write(body)
+            await writer.drain()
+
+    async def send_json(self, writer, request, data):
+        """JSON 响应：ETag 为内容哈希，客户端接受时 gzip 压缩"""
+        body = encode_json(data)
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        headers = self.base_headers(request)
+        headers.update({"ETag": etag, "Cache-Control": REVALIDATE, "Vary": "Accept-Encoding"})
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            await self.write_head(writer, 304, headers)
+            return
+        if len(body) >= COMPRESS_MIN_BYTES and "gzip" in accepted_encodings(request.headers.get("accept-encoding")):
+            compressed = self.gzip_cache.get(etag)
+            if compressed is None:
+                compressed = gzip.compress(body, compresslevel=6, mtime=0)
+                if len(self.gzip_cache) >= 256:
+                    self.gzip_cache.clear()
+                self.gzip_cache[etag] = compressed
+            body = compressed
+            headers["Content-Encoding"] = "gzip"
+        headers.update({"Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(body))})
+        await self.write_head(writer, 200, headers)
+        if request.method != "HEAD":
+            writer.write(body)
+            await writer.drain()
+
+    def handle_api(self, request):
+        """API 请求，返回要输出的 JSON 数据"""
+        catalogue = self.catalogue
+        path = request.path.rstrip("/")
+        if path == "/api/categories":
+            return {"version": catalogue.version, "categories": catalogue.categories}
+        if path == "/api/items":
+            try:
+                page = max(int(request.query.get("page", 1)), 1)
+                size = min(max(int(request.query.get("size", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            except ValueError:
+                raise HttpError(400, "page 和 size 必须是整数")
+            matched = catalogue.query(request.query.get("category"), request.query.get("q"))
+            start = (page - 1) * size
+            return {
+                "version": catalogue.version,
+                "total": len(matched),
+                "page": page,
+                "size": size,
+                "pages": (len(matched) + size - 1) // size,
+                "items": matched[start:start + size],
+            }
+        if path.startswith("/api/items/"):
+            item = catalogue.find(path[len("/api/items/"):], request.query.get("type"))
+            if item is None:
+                raise HttpError(404, "没有这个条目")
+            return item
+        raise HttpError(404)
+
+    async def send_file(self, writer, request):
+        """静态文件：预压缩版本、ETag、Range，内容用 sendfile 发送"""
+        disk_path, prefix = resolve_static(request.path)
+        if disk_path is None or not os.path.isfile(disk_path):
+            raise HttpError(404)
+
+        stat = os.stat(disk_path)
+        etag = self.catalogue.asset_etag(request.path, stat)
+        content_type = mimetypes.guess_type(disk_path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/json":
+            content_type += "; charset=utf-8"
+        headers = self.base_headers(request)
+        headers.update({"ETag": etag, "Cache-Control": cache_control(request.path, prefix), "Accept-Ranges": "bytes"})
+
+        # 预压缩版本只在整个文件响应时使用，Range 总是针对原始内容
+        range_header = request.headers.get("range")
+        send_path = disk_path
+        if prefix == PUBLIC_PATH:
+            headers["Vary"] = "Accept-Encoding"
+            if not range_header:
+                accepted = accepted_encodings(request.headers.get("accept-encoding"))
+                for encoding, suffix in ENCODINGS:
+                    if encoding in accepted and os.path.isfile(disk_path + suffix):
+                        send_path = disk_path + suffix
+                        headers["Content-Encoding"] = encoding
+                        # 不同编码的响应内容不同，ETag 也要区分
+                        headers["ETag"] = etag[:-1] + f'-{encoding}"'
+                        stat = os.stat(send_path)
+                        break
+
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            headers.pop("Content-Encoding", None)
+            await self.write_head(writer, 304, headers)
+            return
+
+        size = stat.st_size
+        status = 200
+        offset, count = 0, size
+        if range_header and etag_matches(request.headers.get("if-range", headers["ETag"]), headers["ETag"]):
+            try:
+                byte_range = parse_range(range_header, size)
+            except HttpError:
+                headers["Content-Range"] = f"bytes */{size}"
+                headers["Content-Length"] = "0"
+                await self.write_head(writer, 416, headers)
+                return
+            if byte_range is not None:
+                offset, end = byte_range
+                count = end - offset + 1
+                status = 206
+                headers["Content-Range"] = f"bytes {offset}-{end}/{size}"
+
+        headers.update({"Content-Type": content_type, "Content-Length": str(count)})
+        await self.write_head(writer, status, headers)
+        if request.method == "HEAD" or count == 0:
+            return
+        with open(send_path, "rb") as f:
+            await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+
+    async def handle_request(self, writer, request):
+        if request.method not in ("GET", "HEAD"):
+            raise HttpError(405)
+        await self.catalogue.refresh_async()
+        if request.path.startswith("/api/"):
+            await self.send_json(writer, request, self.handle_api(request))
+        else:
+            await self.send_file(writer, request)
+
+    async def handle_connection(self, reader, writer):
+        """一个连接上依次处理请求，直到客户端关闭或请求 Connection: close"""
+        self.connections += 1
+        request = None
+        try:
+            while True:
+                request = None
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    self.requests += 1
+                    await self.handle_request(writer, request)
+                except HttpError as e:
+                    await self.send_error(writer, request, e.status, str(e))
+                    if request is None:
+                        break
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"处理请求失败: {request.method + ' ' + request.path if request else ''} {e}")
+            try:
+                await self.send_error(writer, None, 500)
+            except ConnectionError:
+                pass
+        finally:
+            self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+async def serve(host, port, catalogue, cors=True):
+    """启动服务并一直运行"""
+    server = Server(catalogue, cors=cors)
+    listener = await asyncio.start_server(server.handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+    addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in listener.sockets)
+    print(f"目录服务已启动: {addresses}（Ctrl+C 退出）")
+    print(f"  {addresses.split(', ')[0]}/api/categories")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="本地目录服务：分类、搜索、分页 API，以及支持 Range 和 ETag 的资源文件")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"监听地址，默认 {DEFAULT_HOST}（展台部署给其它设备访问时用 0.0.0.0）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"端口，默认 {DEFAULT_PORT}")
+    parser.add_argument("--json", default=CAR_JSON_FILE, help=f"目录文件，默认 {CAR_JSON_FILE}")
+    parser.add_argument("--no-cors", action="store_true", help="不返回 Access-Control-Allow-Origin（默认允许其它端口的开发服务器访问）")
+    args = parser.parse_args(argv)
+
+    catalogue = Catalogue(args.json)
+    catalogue.refresh()
+    try:
+        asyncio.run(serve(args.host, args.port, catalogue, cors=not args.no_cors))
+    except KeyboardInterrupt:
+        print("\n已停止目录服务")
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+事物清单（items/ 目录）
+
+每个分类一个 YAML 文件，文件名的序号决定分类在目录中的顺序：
+
+  items/01-小型车辆.yaml
+    type: 小型车辆
+    items:
+      - 小汽车
+      - 出租车
+    renamed:          # 可选，旧名称 -> 新名称，目录中的条目直接改名，不重新生成元数据
+      吊车: 汽车吊
+
+增加分类只需要新建一个文件。清单和目录比较后得到差异：
+  added    清单中有、目录中没有的事物，car-name.py 只生成这些
+  removed  目录中有、清单中已经没有的事物
+  renamed  renamed 中声明的改名
+  moved    清单中换了分类的事物
+python -m kidcar items 查看差异，--apply 把改名和换分类写入目录，--prune 同时删除 removed 的条目。
+"""
+
+import argparse
+import glob
+import os
+
+from kidcar.catalog import CAR_JSON_FILE, CatalogueReader, load_catalogue, save_catalogue
+from kidcar.cleanup import trash_entry_assets
+from kidcar.config import load_config
+
+SOURCES_DIR = "items"
+
+
+def source_files(sources_dir=SOURCES_DIR):
+    """清单文件，按文件名排序"""
+    return sorted(glob.glob(os.path.join(sources_dir, "*.yaml")))
+
+
+def load_source(path):
+    """读取并检查一个清单文件，返回 (分类, 名称列表, 改名)"""
+    source = load_config(path)
+    item_type = source.get("type")
+    if not isinstance(item_type, str) or not item_type.strip():
+        raise ValueError(f"清单 {path} 缺少 type")
+    names = source.get("items") or []
+    for name in names:
+        # 例如 yes、no、123 会被 YAML 读成布尔值和数字，需要加引号
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError(f"清单 {path} 中的 {name!r} 不是文本，请加引号")
+    renamed = source.get("renamed") or {}
+    return item_type, names, {str(old): str(new) for old, new in renamed.items()}
+
+
+def load_item_sources(sources_dir=SOURCES_DIR):
+    """
+    读取全部清单
+    返回 (事物列表 [(名称, 分类)]，改名 {旧名称: 新名称})，事物列表中可能有出现在多个分类的名称
+    """
+    item_names = []
+    renamed = {}
+    for path in source_files(sources_dir):
+        item_type, names, source_renamed = load_source(path)
+        item_names.extend((name, item_type) for name in names)
+        renamed.update(source_renamed)
+    return item_names, renamed
+
+
+def load_item_names(sources_dir=SOURCES_DIR):
+    """清单中的全部 (名称, 分类)"""
+    return load_item_sources(sources_dir)[0]
+
+
+def diff_items(item_names, catalogue, renamed=None):
+    """
+    比较清单和目录（按名称）
+    同一个名称出现在多个分类时以第一个为准，目录中的分类是其中任何一个都不算换分类
+    返回 {"added": [(名称, 分类)], "removed": [(名称, 分类)], "renamed": [(旧名称, 新名称, 分类)], "moved": [(名称, 原分类, 新分类)]}
+    """
+    renamed = renamed or {}
+    catalogue_types = {}
+    for item in catalogue:
+        catalogue_types.setdefault(item.get("car-name", ""), item.get("car-type", ""))
+
+    source_types = {}
+    for name, item_type in item_names:
+        source_types.setdefault(name, []).append(item_type)
+
+    renames = [
+        (old, new, source_types[new][0])
+        for old, new in renamed.items()
+        if old in catalogue_types and new not in catalogue_types and new in source_types
+    ]
+    renamed_old = {old for old, _, _ in renames}
+    renamed_new = {new for _, new, _ in renames}
+
+    added = []
+    for name, types in source_types.items():
+        if name not in catalogue_types and name not in renamed_new:
+            added.append((name, types[0]))
+    removed = [
+        (name, item_type) for name, item_type in catalogue_types.items()
+        if name not in source_types and name not in renamed_old
+    ]
+    moved = [
+        (name, item_type, source_types[name][0]) for name, item_type in catalogue_types.items()
+        if name in source_types and item_type not in source_types[name]
+    ]
+    return {"added": added, "removed": removed, "renamed": renames, "moved": moved}
+
+
+def apply_diff(items, diff, prune=False):
+    """
+    把改名和换分类写入目录，prune 为真时删除清单中已经没有的条目
+    返回删除的 [(原位置, 条目)]
+    """
+    renames = {old: (new, item_type) for old, new, item_type in diff["renamed"]}
+    moves = {name: new_type for name, _, new_type in diff["moved"]}
+    removed_names = {name for name, _ in diff["removed"]} if prune else set()
+
+    removed = []
+    kept = []
+    for position, item in enumerate(items):
+        name = item.get("car-name", "")
+        if name in removed_names:
+            removed.append((position, item))
+            continue
+        if name in renames:
+            item["car-name"], item["car-type"] = renames[name]
+        elif name in moves:
+            item["car-type"] = moves[name]
+        kept.append(item)
+    items[:] = kept
+    return removed
+
+
+def print_diff(diff, limit=20):
+    """打印清单和目录的差异"""
+    labels = {"added": "新增（待生成）", "removed": "清单中已删除", "renamed": "改名", "moved": "换分类"}
+    for key, label in labels.items():
+        entries = diff[key]
+        print(f"{label}: {len(entries)}")
+        for entry in entries[:limit]:
+            if key == "renamed":
+                print(f"  {entry[0]} -> {entry[1]} ({entry[2]})")
+            elif key == "moved":
+                print(f"  {entry[0]}: {entry[1]} -> {entry[2]}")
+            else:
+                print(f"  {entry[0]} ({entry[1]})")
+        if len(entries) > limit:
+            print(f"  ... 还有 {len(entries) - limit} 个")
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="比较 items/ 中的事物清单和 car.json")
+    parser.add_argument("--apply", action="store_true", help="把改名和换分类写入 car.json")
+    parser.add_argument("--prune", action="store_true", help="同时删除清单中已经没有的条目，资源移到回收站")
+    parser.add_argument("--yes", "-y", action="store_true", help="删除资源时不询问")
+    parser.add_argument("--limit", type=int, default=20, help="每类最多显示的条目数")
+    args = parser.parse_args(argv)
+
+    item_names, renamed = load_item_sources()
+    diff = diff_items(item_names, CatalogueReader(fields=("car-name", "car-type")), renamed)
+    print(f"清单中共有 {len(item_names)} 个事物（{len(source_files())} 个分类文件）")
+    print_diff(diff, args.limit)
+
+    if not (args.apply or args.prune):
+        if diff["added"]:
+            print("\n运行 car-name.py 生成新增的事物")
+        return diff
+
+    items = load_catalogue()
+    removed = apply_diff(items, diff, prune=args.prune)
+    if removed:
+        if trash_entry_assets(items, removed, CAR_JSON_FILE, yes=args.yes) is None:
+            print("已取消")
+            return diff
+    save_catalogue(items)
+    print(f"\n已写入 car.json: 改名 {len(diff['renamed'])} 个，换分类 {len(diff['moved'])} 个，删除 {len(removed)} 个")
+    return diff
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+资源生成状态（断点续跑）
+
+每个条目的每个资源在 asset-state 字段中记录生成进度，代替"路径为空就重新生成"：
+
+  pending     没有记录，需要生成
+  submitted   已提交到服务商，记录 task_id（ModelScope 的异步任务），重启后直接轮询，不用重新付费生成
+  downloaded  文件已下载到 <目标>.part，还没有写入目录；重启后把 .part 改名并提交
+  committed   文件已就位，路径和指纹已写入目录（状态记录随之删除）
+  failed      失败次数 failures，下次运行重试
+  quarantined 连续失败达到上限，不再自动重试，用 python -m kidcar state --release 解除
+
+状态和目录保存在同一个 car.json 中，每次状态变化后保存目录，进程在任何位置崩溃都能恢复。
+"""
+
+import argparse
+import os
+import time
+
+from kidcar.assets import replace_asset_file
+from kidcar.catalog import ASSET_FIELDS, CAR_JSON_FILE, load_catalogue, save_catalogue, to_asset_path
+
+# 条目中保存状态的字段
+STATE_FIELD = "asset-state"
+
+STATES = ("submitted", "downloaded", "failed", "quarantined")
+
+# 连续失败多少次后隔离
+DEFAULT_MAX_FAILURES = 3
+
+STATE_LABELS = {
+    "submitted": "已提交",
+    "downloaded": "已下载未提交",
+    "failed": "失败待重试",
+    "quarantined": "已隔离",
+}
+
+
+def get_state(item, field):
+    """读取资源的状态记录，没有记录时返回空字典（pending 或 committed）"""
+    return item.get(STATE_FIELD, {}).get(field, {})
+
+
+def _set_state(item, field, state, **values):
+    record = {**get_state(item, field), "state": state, "updated": time.time(), **values}
+    item.setdefault(STATE_FIELD, {})[field] = record
+    return record
+
+
+def clear_state(item, field):
+    """删除资源的状态记录"""
+    states = item.get(STATE_FIELD)
+    if not states:
+        return
+    states.pop(field, None)
+    if not states:
+        del item[STATE_FIELD]
+
+
+def mark_submitted(item, field, provider, task_id, key=None):
+    """记录已提交的服务商任务，key 为提交时所用API密钥的标识（不保存密钥本身）"""
+    return _set_state(item, field, "submitted", provider=provider, task_id=task_id, key=key)
+
+
+def submitted_task(item, field, provider):
+    """同一服务商已提交但还没有下载的任务，返回 (task_id, 密钥标识)，没有时返回 (None, None)"""
+    record = get_state(item, field)
+    if record.get("state") == "submitted" and record.get("provider") == provider:
+        return record.get("task_id"), record.get("key")
+    return None, None
+
+
+def mark_downloaded(item, field, disk_path):
+    """记录已下载到 <disk_path>.part、等待提交的文件"""
+    return _set_state(item, field, "downloaded", target=disk_path)
+
+
+def mark_committed(item, field, asset_path):
+    """文件已就位：写入路径，删除状态记录"""
+    item[field] = asset_path
+    clear_state(item, field)
+
+
+def write_asset(items, item, field, disk_path, content, json_file=CAR_JSON_FILE):
+    """
+    按 downloaded -> committed 的顺序写入资源文件
+    先写 .part 并保存状态，再改名并写入路径，返回资源路径
+    调用方记录指纹后还需要再保存一次目录
+    """
+    os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+    tmp_path = f"{disk_path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    mark_downloaded(item, field, disk_path)
+    save_catalogue(items, json_file)
+    replace_asset_file(tmp_path, disk_path)
+    asset_path = to_asset_path(disk_path)
+    mark_committed(item, field, asset_path)
+    return asset_path
+
+
+def mark_failed(item, field, error, max_failures=DEFAULT_MAX_FAILURES):
+    """
+    记录一次失败，达到 max_failures 次后隔离
+    返回是否已隔离
+    """
+    record = get_state(item, field)
+    failures = record.get("failures", 0) + 1
+    state = "quarantined" if max_failures and failures >= max_failures else "failed"
+    # 失败后已提交的任务不再有效
+    _set_state(item, field, state, failures=failures, error=str(error)[:200], task_id=None)
+    if state == "quarantined":
+        print(f"  {item.get('car-name', '')} 的 {field} 已连续失败 {failures} 次，已隔离")
+    return state == "quarantined"
+
+
+def is_quarantined(item, field):
+    """资源是否已被隔离"""
+    return get_state(item, field).get("state") == "quarantined"
+
+
+def recover_downloads(items, fields=ASSET_FIELDS):
+    """
+    恢复上次中断在下载和提交之间的资源
+    .part 文件还在时改名提交；最终文件已在时直接提交；都不在时回到 pending（有 task_id 的回到 submitted）
+    返回 [(条目, 字段, 资源路径)]，调用方负责记录指纹并保存目录
+    """
+    recovered = []
+    for item in items:
+        for field in fields:
+            record = get_state(item, field)
+            if record.get("state") != "downloaded":
+                continue
+            disk_path = record["target"]
+            tmp_path = f"{disk_path}.part"
+            if os.path.exists(tmp_path):
+                replace_asset_file(tmp_path, disk_path)
+            if os.path.exists(disk_path):
+                asset_path = to_asset_path(disk_path)
+                mark_committed(item, field, asset_path)
+                recovered.append((item, field, asset_path))
+            elif record.get("task_id"):
+                _set_state(item, field, "submitted")
+            else:
+                clear_state(item, field)
+    return recovered
+
+
+def summarize(items):
+    """按资源字段和状态统计条目数"""
+    summary = {}
+    for item in items:
+        for field, record in item.get(STATE_FIELD, {}).items():
+            counts = summary.setdefault(field, {})
+            counts[record["state"]] = counts.get(record["state"], 0) + 1
+    return summary
+
+
+def release(items, field=None):
+    """解除隔离（只重置失败次数），返回解除的资源数"""
+    released = 0
+    for item in items:
+        for state_field, record in list(item.get(STATE_FIELD, {}).items()):
+            if record.get("state") == "quarantined" and field in (None, state_field):
+                clear_state(item, state_field)
+                released += 1
+    return released
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="查看和管理资源生成状态")
+    parser.add_argument("--list", choices=STATES, help="列出某个状态的资源")
+    parser.add_argument("--field", choices=list(ASSET_FIELDS), help="只处理某个资源字段")
+    parser.add_argument("--release", action="store_true", help="解除隔离，下次运行时重新生成")
+    args = parser.parse_args(argv)
+
+    items = load_catalogue()
+    if args.release:
+        released = release(items, args.field)
+        if released:
+            save_catalogue(items)
+        print(f"已解除隔离 {released} 个资源")
+        return released
+
+    summary = summarize(items)
+    if not summary:
+        print("没有进行中、失败或隔离的资源")
+    for field, counts in sorted(summary.items()):
+        if args.field and field != args.field:
+            continue
+        print(f"{field}: " + "，".join(f"{STATE_LABELS.get(state, state)} {count}" for state, count in sorted(counts.items())))
+
+    if args.list:
+        for item in items:
+            for field, record in item.get(STATE_FIELD, {}).items():
+                if record["state"] != args.list or (args.field and field != args.field):
+                    continue
+                detail = record.get("task_id") or record.get("error") or record.get("target") or ""
+                failures = f"失败 {record['failures']} 次 " if record.get("failures") else ""
+                print(f"  {item.get('car-name', '')} ({item.get('car-type', '')}) {field}: {failures}{detail}")
+    return summary
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Flutter -> Vue 资源增量同步
+
+kid-car-vue/public/assets 和 kid-car-vue/src/data/car.json 是 Flutter 资源的副本。
+同步时分别为源目录和目标目录维护资源索引（目标索引缓存在 .kidcar/sync-<目标>-index.json），
+按 sha256 比较，只复制（或硬链接）新增和变化的文件，删除目标中多余的文件，
+再把目录转换成目标需要的格式写入目标的 car.json（内容没变时不写，避免触发前端重新构建）。
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kidcar.assets import load_asset_index, save_asset_index, scan_assets
+from kidcar.catalog import CAR_JSON_FILE, STATE_DIR, load_catalogue, to_disk_path
+from kidcar.fingerprint import FINGERPRINT_FIELD
+from kidcar.state import STATE_FIELD
+
+# 只在生成流水线中使用、前端不需要的字段
+PIPELINE_FIELDS = (FINGERPRINT_FIELD, STATE_FIELD)
+
+
+def vue_catalogue(items):
+    """Vue 应用使用的目录：去掉流水线内部字段，资源路径保持 assets/... 的形式"""
+    return [{key: value for key, value in item.items() if key not in PIPELINE_FIELDS} for item in items]
+
+
+# 同步目标：资源根目录（其下是 assets/images 和 assets/audios）、目录文件和目录转换函数
+TARGETS = {
+    "vue": {
+        "root": "kid-car-vue/public",
+        "catalogue": "kid-car-vue/src/data/car.json",
+        "transform": vue_catalogue,
+    },
+}
+
+# 并行复制的线程数
+DEFAULT_WORKERS = 8
+
+
+def target_index_file(name):
+    """目标资源索引的缓存文件"""
+    return os.path.join(STATE_DIR, f"sync-{name}-index.json")
+
+
+def target_directories(root):
+    """目标的资源目录"""
+    return (os.path.join(root, "assets", "images"), os.path.join(root, "assets", "audios"))
+
+
+def plan_sync(source_index, target_index):
+    """
+    比较源和目标的资源索引
+    返回 (需要复制的路径列表, 需要删除的路径列表, 已一致的文件数)
+    """
+    source_files = source_index["files"]
+    target_files = target_index["files"]
+
+    copies = []
+    unchanged = 0
+    for asset_path, entry in sorted(source_files.items()):
+        target = target_files.get(asset_path)
+        if target is not None and target["sha256"] == entry["sha256"]:
+            unchanged += 1
+        else:
+            copies.append(asset_path)
+
+    deletes = sorted(path for path in target_files if path not in source_files)
+    return copies, deletes, unchanged
+
+
+def copy_asset(source_path, target_path, link=False):
+    """
+    复制单个文件，先写到临时文件再替换，中断时不会留下半个文件
+    link=True 时优先创建硬链接，跨文件系统等失败时退回复制
+    """
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    tmp_path = f"{target_path}.part"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    linked = False
+    if link:
+        try:
+            os.link(source_path, tmp_path)
+            linked = True
+        except OSError:
+            pass
+    if not linked:
+        shutil.copy2(source_path, tmp_path)
+    os.replace(tmp_path, target_path)
+    return linked
+
+
+def sync_catalogue(items, target):
+    """转换目录并写入目标，内容没变时不写。返回是否写入"""
+    content = json.dumps(target["transform"](items), ensure_ascii=False, indent=2)
+    catalogue_file = target["catalogue"]
+    if os.path.exists(catalogue_file):
+        with open(catalogue_file, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+
+    tmp_file = f"{catalogue_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_file, catalogue_file)
+    return True
+
+
+def sync_target(name, source_index, items, link=False, workers=DEFAULT_WORKERS, delete=True, dry_run=False):
+    """同步一个目标，返回同步结果统计"""
+    target = TARGETS[name]
+    root = target["root"]
+    index_file = target_index_file(name)
+
+    target_index = scan_assets(load_asset_index(index_file), target_directories(root), root=root)
+    copies, deletes, unchanged = plan_sync(source_index, target_index)
+    result = {
+        "target": name,
+        "unchanged": unchanged,
+        "copied": len(copies),
+        "linked": 0,
+        "deleted": len(deletes) if delete else 0,
+        "orphans": len(deletes),
+        "bytes": sum(source_index["files"][path]["size"] for path in copies),
+        "catalogue": False,
+    }
+
+    print(f"\n[{name}] 已一致: {unchanged}，需要复制: {len(copies)}，目标中多余的文件: {len(deletes)}")
+    for asset_path in copies[:20]:
+        print(f"  + {asset_path}")
+    for asset_path in deletes[:20]:
+        print(f"  - {asset_path}")
+    if len(copies) > 20 or len(deletes) > 20:
+        print("  ...")
+
+    if dry_run:
+        return result
+
+    # 先删除多余文件再复制：在大小写不敏感的文件系统上，
+    # taxi_en.mp3 -> Taxi_en.mp3 这种改名需要先删掉旧文件
+    if delete:
+        for asset_path in deletes:
+            disk_path = os.path.join(root, asset_path)
+            if os.path.exists(disk_path):
+                os.remove(disk_path)
+            del target_index["files"][asset_path]
+
+    def copy_one(asset_path):
+        target_path = os.path.join(root, asset_path)
+        linked = copy_asset(to_disk_path(asset_path), target_path, link)
+        return asset_path, target_path, linked
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for asset_path, target_path, linked in executor.map(copy_one, copies):
+            # 复制后的内容和源文件一致，直接记录索引，下次同步不用重新计算哈希
+            stat = os.stat(target_path)
+            target_index["files"][asset_path] = {
+                **source_index["files"][asset_path],
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+            if linked:
+                result["linked"] += 1
+
+    save_asset_index(target_index, index_file)
+    result["catalogue"] = sync_catalogue(items, target)
+    print(f"[{name}] 复制 {result['copied']} 个文件（硬链接 {result['linked']} 个，{result['bytes'] / 1024 / 1024:.1f} MB），"
+          f"删除 {result['deleted']} 个，目录{'已更新' if result['catalogue'] else '没有变化'}")
+    return result
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="资源同步 - 把 Flutter 的资源和目录增量同步到 Vue 应用")
+    parser.add_argument("--target", choices=sorted(TARGETS), action="append", help="同步目标，可重复，默认全部")
+    parser.add_argument("--link", action="store_true", help="用硬链接代替复制（同一文件系统上不占额外空间）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"并行复制的线程数，默认 {DEFAULT_WORKERS}")
+    parser.add_argument("--keep-orphans", action="store_true", help="不删除目标中多余的文件")
+    parser.add_argument("--dry-run", action="store_true", help="只显示需要同步的文件，不做修改")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    source_index = scan_assets()
+    if not args.dry_run:
+        save_asset_index(source_index)
+    items = load_catalogue(CAR_JSON_FILE)
+
+    results = []
+    for name in args.target or sorted(TARGETS):
+        results.append(sync_target(
+            name, source_index, items,
+            link=args.link, workers=args.workers, delete=not args.keep_orphans, dry_run=args.dry_run,
+        ))
+
+    print(f"\n同步完成，耗时 {time.perf_counter() - started:.2f} 秒")
+    return results
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+语音合成服务商选择和本地离线合成
+
+generate-audio.py 按语音类型（chinese / english）选择合成引擎：
+  - edge:  远程 Edge TTS 转发服务（默认，受限于远程配额和网络），见 generate_audio
+  - local: 本地命令行合成引擎（piper、espeak-ng、macOS 的 say 或自定义命令），再编码成和 Edge 输出一致的 MP3。
+           多条文本同时启动多个合成进程，吞吐量随本机核数增长。慢速变体的语速同样传给本地引擎
+           （piper --length_scale、espeak-ng -s、say -r）。
+
+除了基本的中文、英文音频，还可以在 TTS.Variants 中启用口音和语速变体
+（english-gb 英式发音、english-slow / chinese-slow 慢速），每个变体保存在条目单独的字段中。
+启用新变体时只需生成这一个字段，已有的音频不受影响。
+
+local.yaml 示例:
+  TTS:
+    Variants: [english-gb, english-slow]
+    Providers:
+      chinese: edge
+      english: local
+    Local:
+      Engine: piper            # piper / espeak-ng / say，或用 Command 自定义（可用 {wpm}、{length_scale}）
+      Voices:
+        english: models/en_US-lessac-medium.onnx
+      Encoder: ffmpeg          # ffmpeg / lame
+      Workers: 8
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from kidcar.assets import replace_asset_file
+from kidcar.config import get_section
+from kidcar.fingerprint import AUDIO_SOURCES, AUDIO_VOICES, BASE_VOICES, VOICE_FIELDS, edge_voice_inputs, voice_prosody
+from kidcar.metrics import count, key_label, traced_request
+
+# Edge TTS 在并发控制器和统计中的名称
+EDGE_PROVIDER = "edge-tts"
+
+PROVIDERS = ("edge", "local")
+DEFAULT_PROVIDER = "edge"
+
+# 本地合成引擎: 命令模板以及文本是否从标准输入传入
+# {voice}、{wav}、{text} 会被替换；语速用 {wpm}（每分钟词数）或 {length_scale}（时长倍数）
+# 内置引擎都从标准输入读取文本，以 - 开头的文本不会被当成选项
+LOCAL_ENGINES = {
+    "piper": {"command": ["piper", "--model", "{voice}", "--length_scale", "{length_scale}", "--output_file", "{wav}"], "stdin": True},
+    "espeak-ng": {"command": ["espeak-ng", "-v", "{voice}", "-s", "{wpm}", "-w", "{wav}", "--stdin"], "stdin": True},
+    "say": {"command": ["say", "-v", "{voice}", "-r", "{wpm}", "-o", "{wav}", "--file-format=WAVE", "--data-format=LEI16@24000", "-f", "-"], "stdin": True},
+}
+
+# espeak-ng 和 say 的默认语速（每分钟词数），按语音的 rate 百分比调整
+LOCAL_WPM = 175
+
+# 各引擎的默认语音，慢速变体和对应的基本语音相同，只是语速不同
+DEFAULT_LOCAL_VOICES = {
+    "piper": {"chinese": "zh_CN-huayan-medium.onnx", "english": "en_US-lessac-medium.onnx",
+              "english-gb": "en_GB-alba-medium.onnx", "english-slow": "en_US-lessac-medium.onnx",
+              "chinese-slow": "zh_CN-huayan-medium.onnx"},
+    "espeak-ng": {"chinese": "cmn", "english": "en-us", "english-gb": "en-gb",
+                  "english-slow": "en-us", "chinese-slow": "cmn"},
+    "say": {"chinese": "Tingting", "english": "Samantha", "english-gb": "Daniel",
+            "english-slow": "Samantha", "chinese-slow": "Tingting"},
+}
+
+# WAV -> MP3 编码命令，输出和 Edge TTS 一致（24kHz、单声道、96kbps）
+ENCODERS = {
+    "ffmpeg": ["ffmpeg", "-y", "-loglevel", "error", "-i", "{wav}", "-ac", "1", "-ar", "24000", "-b:a", "96k", "{mp3}"],
+    "lame": ["lame", "--quiet", "-m", "m", "--resample", "24", "-b", "96", "{wav}", "{mp3}"],
+}
+
+
+def parse_voice_types(values):
+    """检查语音类型列表，返回去重后的元组"""
+    voice_types = []
+    for voice_type in values:
+        if voice_type not in VOICE_FIELDS:
+            raise ValueError(f"未知的语音类型: {voice_type}（可选 {'/'.join(VOICE_FIELDS)}）")
+        if voice_type not in voice_types:
+            voice_types.append(voice_type)
+    return tuple(voice_types)
+
+
+def tts_settings(overrides=None, voice_types=None):
+    """
+    读取 local.yaml 的 TTS 配置
+    overrides 为命令行指定的 {语音类型: 服务商}，优先于配置文件
+    voice_types 为命令行指定的要生成的语音，默认为基本语音加上 TTS.Variants 中的变体
+    """
+    section = get_section("TTS")
+    if voice_types is None:
+        voice_types = BASE_VOICES + tuple(section.get("Variants") or ())
+    providers = {voice_type: DEFAULT_PROVIDER for _, voice_type in AUDIO_SOURCES.values()}
+    providers.update(section.get("Providers") or {})
+    providers.update(overrides or {})
+    for voice_type, provider in providers.items():
+        if provider not in PROVIDERS:
+            raise ValueError(f"{voice_type} 的TTS服务商未知: {provider}（可选 {'/'.join(PROVIDERS)}）")
+
+    local = section.get("Local") or {}
+    engine = local.get("Engine", "piper")
+    voices = dict(DEFAULT_LOCAL_VOICES.get(engine, {}))
+    voices.update(local.get("Voices") or {})
+    return {
+        "voice_types": parse_voice_types(voice_types),
+        "providers": providers,
+        "engine": engine,
+        "command": local.get("Command") or LOCAL_ENGINES.get(engine, {}).get("command"),
+        "stdin": local.get("Stdin", LOCAL_ENGINES.get(engine, {}).get("stdin", False)),
+        "voices": voices,
+        "encoder": local.get("Encoder", "ffmpeg"),
+        "workers": local.get("Workers") or os.cpu_count() or 1,
+    }
+
+
+def parse_provider_overrides(values):
+    """解析 --provider 参数: "local" 表示全部语音，"english=local" 表示单个语音"""
+    overrides = {}
+    for value in values or []:
+        if "=" in value:
+            voice_type, provider = value.split("=", 1)
+            overrides[voice_type.strip()] = provider.strip()
+        else:
+            for _, voice_type in AUDIO_SOURCES.values():
+                overrides[voice_type] = value.strip()
+    return overrides
+
+
+def voice_provider(voice_type, settings):
+    """语音类型使用的服务商"""
+    return settings["providers"].get(voice_type, DEFAULT_PROVIDER)
+
+
+def voice_inputs(voice_type, settings):
+    """语音类型当前使用的合成参数，作为音频指纹的输入"""
+    if voice_provider(voice_type, settings) == "local":
+        inputs = {"provider": f"local:{settings['engine']}", "voice": settings["voices"].get(voice_type)}
+        # 默认语速不写入，已有的正常语速本地音频指纹保持不变
+        rate = voice_prosody(voice_type)["rate"]
+        if rate:
+            inputs["rate"] = rate
+        return inputs
+    return edge_voice_inputs(voice_type)
+
+
+def local_rate_values(voice_type):
+    """语音的语速（百分比）换算成本地引擎的参数"""
+    speed = 1 + voice_prosody(voice_type)["rate"] / 100
+    return {"wpm": str(round(LOCAL_WPM * speed)), "length_scale": f"{1 / speed:.2f}"}
+
+
+def generate_audio(text, output_path, voice_type="chinese", config=None):
+    """
+    调用微软TTS生成音频文件
+    使用Python requests库替代curl
+    """
+    import requests
+
+    if config is None:
+        raise ValueError("配置不能为空")
+    
+    # 从配置中获取Edge设置
+    edge_config = config.get('Edge', {})
+    base_url = edge_config.get('BaseUrl', 'https://ms-ra-forwarder-silk-ten.vercel.app')
+    token = edge_config.get('Token', '')
+    
+    if not token:
+        raise ValueError("Edge配置中缺少Token")
+    
+    # 根据语言类型选择不同的语音
+    voice = AUDIO_VOICES[voice_type]
+    
+    # 构建请求URL - 手动构建查询字符串以避免requests的自动编码
+    prosody = "&".join(f"{key}={value}" for key, value in voice_prosody(voice_type).items())
+    query_string = f"voice={voice}&{prosody}&text={quote(text)}"
+    api_url = f"{base_url}/api/text-to-speech?{query_string}"
+    
+    headers = {
+        'Authorization': f'Bearer {token}'
+    }
+    
+    try:
+        print(f"  请求URL: {api_url}")
+        
+        # 发送GET请求
+        response = traced_request("GET", api_url, "tts", EDGE_PROVIDER, token, text, headers=headers, stream=True)
+        response.raise_for_status()
+        
+        # 先写入临时文件，下载完整后再替换，失败时不会破坏旧文件
+        tmp_path = f"{output_path}.part"
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                if chunk:
+                    f.write(chunk)
+        
+        # 检查文件是否成功创建且大小大于0
+        if os.path.exists(tmp_path) and os.path.getsize(tmp_path) > 0:
+            count("bytes", os.path.getsize(tmp_path), provider=EDGE_PROVIDER, key=key_label(token))
+            replace_asset_file(tmp_path, output_path)
+            print(f"  成功生成音频文件: {output_path} (大小: {os.path.getsize(output_path)} bytes)")
+            return True
+        else:
+            print(f"  生成音频文件失败: {output_path}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+            
+    except requests.exceptions.RequestException as e:
+        print(f"  调用TTS API失败: {e}")
+        if hasattr(e, 'response') and e.response is not None:
+            print(f"  响应状态码: {e.response.status_code}")
+            print(f"  响应内容: {e.response.text}")
+        return False
+    except Exception as e:
+        print(f"  生成音频时发生错误: {e}")
+        return False
+
+
+def check_local_engine(settings, voice_types):
+    """检查本地合成需要的命令和语音是否可用，返回问题列表"""
+    problems = []
+    if not settings["command"]:
+        problems.append(f"未知的本地合成引擎 {settings['engine']}，请在 TTS.Local.Command 中指定命令")
+    elif shutil.which(settings["command"][0]) is None:
+        problems.append(f"找不到本地合成命令: {settings['command'][0]}")
+    encoder = ENCODERS.get(settings["encoder"])
+    if encoder is None:
+        problems.append(f"未知的编码器 {settings['encoder']}（可选 {'/'.join(ENCODERS)}）")
+    elif shutil.which(encoder[0]) is None:
+        problems.append(f"找不到MP3编码命令: {encoder[0]}")
+    for voice_type in voice_types:
+        if not settings["voices"].get(voice_type):
+            problems.append(f"没有配置 {voice_type} 的本地语音（TTS.Local.Voices.{voice_type}）")
+    return problems
+
+
+def _fill(template, **values):
+    return [part.format(**values) for part in template]
+
+
+def synthesize_local(text, voice_type, output_path, settings):
+    """
+    用本地引擎合成一条文本并编码成MP3
+    返回 (是否成功, 耗时秒数, 错误信息)
+    """
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="kidcar-tts-") as tmp_dir:
+        wav_path = os.path.join(tmp_dir, "speech.wav")
+        mp3_path = os.path.join(tmp_dir, "speech.mp3")
+        voice = settings["voices"][voice_type]
+        try:
+            subprocess.run(
+                _fill(settings["command"], voice=voice, wav=wav_path, text=text, **local_rate_values(voice_type)),
+                input=text.encode('utf-8') if settings["stdin"] else None,
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True,
+            )
+            subprocess.run(
+                _fill(ENCODERS[settings["encoder"]], wav=wav_path, mp3=mp3_path),
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, "stderr", None)
+            message = stderr.decode('utf-8', 'replace').strip() if stderr else str(e)
+            return False, time.perf_counter() - start, message
+
+        if not os.path.exists(mp3_path) or os.path.getsize(mp3_path) == 0:
+            return False, time.perf_counter() - start, "没有生成音频"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tmp_path = f"{output_path}.part"
+        shutil.move(mp3_path, tmp_path)
+        replace_asset_file(tmp_path, output_path)
+    return True, time.perf_counter() - start, None
+
+
+def synthesize_local_many(tasks, settings, workers=None):
+    """
+    并行合成多条文本，tasks 为 [(文本, 语音类型, 输出文件)]
+    合成引擎是独立进程，这里用线程同时驱动多个进程
+    按提交顺序逐个返回 (任务, 是否成功, 耗时秒数, 错误信息)
+    """
+    workers = workers or settings["workers"]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(task, executor.submit(synthesize_local, *task, settings)) for task in tasks]
+        for task, future in futures:
+            yield (task, *future.result())
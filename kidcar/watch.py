@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+监视模式: 编辑 car.json 或资源文件后自动增量更新
+
+手工修改 car.json（例如改正一个名称）以后，不需要再记住清空哪些路径、运行哪些脚本。
+python -m kidcar watch 每秒检查一次 car.json 和资源目录（只读取文件的大小和修改时间），
+发现变化并稳定 Debounce 秒后，和上一次记录的状态比较：
+
+  - 名称、英文名、类型或资源路径变化的条目，以及引用了被修改、删除的资源文件的条目，
+    用 kidcar.plan 判断哪些资源需要重新生成（只看这些条目，不扫描整个目录）；
+    文件被删除或损坏的资源先清空路径，脚本才会重新生成
+  - 需要的图片、音频任务用 --regenerate 运行对应脚本，脚本按指纹只生成过期的资源
+  - 音频文件被手工替换时重新拼接播放音频
+  - 任何变化之后更新资源索引并重新导出网页目录（python -m kidcar export）
+
+状态记录在 .kidcar/watch-state.json，重新启动时先处理停止期间的修改。
+流水线脚本自己写入的变化在任务结束后记为新的基线，不会再次触发。
+
+local.yaml 示例（可选）:
+  Watch:
+    Image: doubao-image     # 生成图片用的命令，默认 image（ModelScope）
+    Interval: 1.0
+    Debounce: 0.5
+    Export: true
+    Sync: false             # 同时运行 python -m kidcar sync
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from kidcar.assets import build_case_lookup, resolve_asset, save_asset_index, scan_assets
+from kidcar.catalog import ASSET_FIELDS, AUDIO_FIELDS, AUDIOS_DIR, CAR_JSON_FILE, FLUTTER_DIR, IMAGES_DIR, STATE_DIR, load_catalogue, save_catalogue, to_asset_path
+from kidcar.config import get_section
+from kidcar.fingerprint import compute_fingerprint
+from kidcar.plan import plan_assets
+from kidcar.tts import tts_settings
+
+WATCH_STATE_FILE = os.path.join(STATE_DIR, "watch-state.json")
+
+DEFAULT_WATCH = {
+    "Image": "image",
+    "Interval": 1.0,
+    "Debounce": 0.5,
+    "Export": True,
+    "Sync": False,
+}
+
+# 影响资源生成的字段：名称和类型决定提示词和文件名，文本字段决定音频内容
+SOURCE_FIELDS = ("car-name", "car-type", *sorted({text_field for text_field, _, _ in AUDIO_FIELDS.values()} - {"car-name"}), *ASSET_FIELDS)
+
+# 任务按这个顺序运行：先生成资源，再拼接、导出
+JOB_ORDER = ("image", "audio", "sequences", "export", "sync")
+
+
+def watch_settings():
+    """读取 local.yaml 的 Watch 配置"""
+    settings = dict(DEFAULT_WATCH)
+    settings.update(get_section("Watch"))
+    return settings
+
+
+def item_key(item, seen):
+    """条目的键：名称，重名的条目加序号"""
+    name = item.get("car-name", "")
+    count = seen.get(name, 0)
+    seen[name] = count + 1
+    return name if count == 0 else f"{name}#{count}"
+
+
+def snapshot_catalogue(items):
+    """目录的快照 {键: {"digest": 整个条目的指纹, "fields": 影响资源的字段}}"""
+    seen = {}
+    return {
+        item_key(item, seen): {
+            "digest": compute_fingerprint(item),
+            "fields": {field: item.get(field, "") for field in SOURCE_FIELDS},
+        }
+        for item in items
+    }
+
+
+def snapshot_files(directories=(IMAGES_DIR, AUDIOS_DIR)):
+    """资源文件的快照 {资源路径: [大小, 修改时间]}，只读取目录项，不打开文件"""
+    files = {}
+    for directory in directories:
+        if not os.path.exists(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith(".part"):
+                stat = entry.stat()
+                files[to_asset_path(entry.path, FLUTTER_DIR)] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+def catalogue_signature(json_file=CAR_JSON_FILE):
+    """car.json 的大小和修改时间，不变时不需要重新读取"""
+    try:
+        stat = os.stat(json_file)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_watch_state(state_file=WATCH_STATE_FILE):
+    """上一次处理完成时的状态，没有时返回 None"""
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取监视状态失败: {e}")
+        return None
+
+
+def save_watch_state(state, state_file=WATCH_STATE_FILE):
+    """保存状态"""
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, state_file)
+
+
+def take_state(items, json_file=CAR_JSON_FILE):
+    """当前的完整状态"""
+    return {
+        "catalogue": catalogue_signature(json_file),
+        "items": snapshot_catalogue(items),
+        "files": snapshot_files(),
+    }
+
+
+def diff_state(old, new):
+    """
+    比较两次状态
+    返回 {"items": 影响资源的字段有变化或新增的条目键, "edited": 任何内容有变化的条目数,
+          "removed": 删除的条目数, "files": 新增或修改的资源路径, "deleted": 删除的资源路径}
+    """
+    old_items = old["items"]
+    new_items = new["items"]
+    changed = {key for key, entry in new_items.items() if key not in old_items or old_items[key]["fields"] != entry["fields"]}
+    edited = sum(1 for key, entry in new_items.items() if key not in old_items or old_items[key]["digest"] != entry["digest"])
+    old_files = old["files"]
+    new_files = new["files"]
+    return {
+        "items": changed,
+        "edited": edited,
+        "removed": sum(1 for key in old_items if key not in new_items),
+        "files": sorted(path for path, stat in new_files.items() if old_files.get(path) != stat),
+        "deleted": sorted(path for path in old_files if path not in new_files),
+    }
+
+
+def affected_items(items, diff):
+    """字段有变化的条目，以及引用了变化的资源文件的条目"""
+    touched = {path.lower() for path in diff["files"] + diff["deleted"]}
+    seen = {}
+    result = []
+    for item in items:
+        key = item_key(item, seen)
+        if key in diff["items"] or any(item.get(field, "").lower() in touched for field in ASSET_FIELDS if item.get(field)):
+            result.append(item)
+    return result
+
+
+def clear_missing_assets(items, index):
+    """
+    清空文件已不存在或已损坏的资源路径（生成脚本只生成路径为空或输入已变化的资源）
+    返回清空的路径数
+    """
+    case_lookup = build_case_lookup(index)
+    cleared = 0
+    for item in items:
+        for field, kind in ASSET_FIELDS.items():
+            if kind in ("sequence", "narration") or not item.get(field):
+                continue
+            _, entry = resolve_asset(index, case_lookup, item[field])
+            if entry is None or entry.get("corrupt"):
+                print(f"  {item.get('car-name', '')} 的 {field} 文件不存在或已损坏，清空路径: {item[field]}")
+                item[field] = ""
+                cleared += 1
+    return cleared
+
+
+def plan_jobs(affected, diff, index, settings):
+    """
+    根据差异决定要运行的任务，affected 为受影响的条目（见 affected_items）
+    返回 ([任务名称], {任务: 待生成的资源数})
+    """
+    jobs = set()
+    counts = {}
+    for kind in ("image", "audio"):
+        tasks, _ = plan_assets(affected, index, kind)
+        if tasks:
+            jobs.add(kind)
+            counts[kind] = len(tasks)
+    # 音频文件被替换后重新拼接播放音频（运行音频任务时会自动拼接）
+    if "audio" not in jobs and any(path.endswith(".mp3") and not path.endswith("_seq.mp3") for path in diff["files"]):
+        jobs.add("sequences")
+    if diff["items"] or diff["edited"] or diff["removed"] or diff["files"] or diff["deleted"]:
+        if settings["Export"]:
+            jobs.add("export")
+        if settings["Sync"]:
+            jobs.add("sync")
+    return [job for job in JOB_ORDER if job in jobs], counts
+
+
+def job_command(job, settings):
+    """任务对应的 python -m kidcar 命令参数"""
+    commands = {
+        "image": [settings["Image"], "--regenerate"],
+        "audio": ["audio", "--regenerate"],
+        "sequences": ["sequences"],
+        "export": ["export"],
+        "sync": ["sync"],
+    }
+    return commands[job]
+
+
+def run_jobs(jobs, settings):
+    """依次运行任务（子进程），返回失败的任务"""
+    failed = []
+    for job in jobs:
+        command = [sys.executable, "-m", "kidcar", *job_command(job, settings)]
+        print(f"  → python -m kidcar {' '.join(command[3:])}")
+        started = time.perf_counter()
+        result = subprocess.run(command)
+        if result.returncode != 0:
+            print(f"  ✗ {job} 失败（退出码 {result.returncode}）")
+            failed.append(job)
+            continue
+        print(f"  ✓ {job} 完成，耗时 {time.perf_counter() - started:.1f} 秒")
+    return failed
+
+
+def describe_diff(diff):
+    """差异的一行说明"""
+    parts = []
+    if diff["items"]:
+        parts.append(f"{len(diff['items'])} 个条目的名称/文本/路径变化")
+    other = diff["edited"] - len(diff["items"])
+    if other > 0:
+        parts.append(f"{other} 个条目的其它字段变化")
+    if diff["removed"]:
+        parts.append(f"删除 {diff['removed']} 个条目")
+    if diff["files"]:
+        parts.append(f"{len(diff['files'])} 个资源文件新增或修改")
+    if diff["deleted"]:
+        parts.append(f"删除 {len(diff['deleted'])} 个资源文件")
+    return "，".join(parts)
+
+
+def process_changes(state, settings, dry_run=False):
+    """
+    处理上一次状态之后的变化
+    返回新的状态（任务运行后重新记录，流水线自己写入的变化不会再次触发）
+    """
+    items = load_catalogue()
+    current = take_state(items)
+    diff = diff_state(state, current)
+    summary = describe_diff(diff)
+    if not summary:
+        return current
+
+    started = time.perf_counter()
+    print(f"\n[{time.strftime('%H:%M:%S')}] 检测到变化: {summary}")
+    index = scan_assets()
+    save_asset_index(index)
+    affected = affected_items(items, diff)
+    if clear_missing_assets(affected, index) and not dry_run:
+        save_catalogue(items)
+    jobs, counts = plan_jobs(affected, diff, index, settings)
+    for kind, count in counts.items():
+        print(f"  需要重新生成{'图片' if kind == 'image' else '音频'}: {count} 个")
+    if not jobs:
+        print("  不需要运行任务")
+        return current
+    if dry_run:
+        print(f"  将运行: {', '.join(jobs)}")
+        return current
+
+    failed = run_jobs(jobs, settings)
+    if failed:
+        # 不重试，避免服务不可用时每秒重跑；修正后用 python -m kidcar plan 查看仍需生成的资源
+        print(f"  有任务失败: {', '.join(failed)}，可以用 python -m kidcar plan 查看仍需生成的资源")
+    print(f"  处理完成，耗时 {time.perf_counter() - started:.1f} 秒")
+    return take_state(load_catalogue())
+
+
+def wait_until_stable(debounce, interval):
+    """等到 car.json 和资源目录在 debounce 秒内不再变化（例如编辑器分多次写入）"""
+    previous = (catalogue_signature(), snapshot_files())
+    while True:
+        time.sleep(debounce)
+        current = (catalogue_signature(), snapshot_files())
+        if current == previous:
+            return
+        previous = current
+        time.sleep(max(0, interval - debounce))
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="监视 car.json 和资源目录，编辑后只重新生成受影响的资源并重新导出")
+    parser.add_argument("--once", action="store_true", help="只处理上次运行之后的变化，然后退出")
+    parser.add_argument("--dry-run", action="store_true", help="只显示要运行的任务，不运行")
+    parser.add_argument("--image", help="生成图片用的命令（image / doubao-image / gemini-image），默认读取 Watch.Image")
+    parser.add_argument("--interval", type=float, help="检查间隔（秒），默认 1")
+    args = parser.parse_args(argv)
+
+    settings = watch_settings()
+    # 音频任务的规划依赖 TTS 配置，启动时先检查，避免配置写错时在监视中途退出
+    try:
+        tts_settings()
+    except ValueError as e:
+        print(f"配置错误: {e}")
+        return None
+    if args.image:
+        settings["Image"] = args.image
+    if args.interval:
+        settings["Interval"] = args.interval
+
+    state = load_watch_state()
+    if state is None:
+        # 第一次运行：把当前状态作为基线，之后的修改才会触发
+        state = take_state(load_catalogue())
+        save_watch_state(state)
+        print("已记录当前的目录和资源作为基线")
+    else:
+        state = process_changes(state, settings, args.dry_run)
+        if not args.dry_run:
+            save_watch_state(state)
+    if args.once:
+        return state
+
+    print(f"开始监视 {CAR_JSON_FILE} 和资源目录（每 {settings['Interval']} 秒检查一次，Ctrl+C 退出）")
+    last_signature = (state["catalogue"], state["files"])
+    try:
+        while True:
+            time.sleep(settings["Interval"])
+            if (catalogue_signature(), snapshot_files()) == last_signature:
+                continue
+            wait_until_stable(settings["Debounce"], settings["Interval"])
+            state = process_changes(state, settings, args.dry_run)
+            if not args.dry_run:
+                save_watch_state(state)
+            last_signature = (state["catalogue"], state["files"])
+    except KeyboardInterrupt:
+        print("\n已停止监视")
+    return state
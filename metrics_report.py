@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标报告脚本
+汇总生成脚本写入 .kidcar/traces 的追踪文件，按阶段、服务商和API密钥显示吞吐量、延迟分布和计数器
+"""
+
+from kidcar.metrics import main
+from kidcar.profiling import run_main
+
+if __name__ == "__main__":
+    run_main(main, "metrics_report")
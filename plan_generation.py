@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成任务规划脚本（dry-run）
+在调用任何API之前列出各阶段待生成的资源，并估算API调用次数、下载量和耗时
+"""
+
+from kidcar.plan import main
+from kidcar.profiling import run_main
+
+if __name__ == "__main__":
+    run_main(main, "plan_generation")
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资源同步脚本
+把 kid_car_flutter/assets 中的图片、音频和 car.json 增量同步到 kid-car-vue
+"""
+
+from kidcar.profiling import run_main
+from kidcar.sync import main
+
+if __name__ == "__main__":
+    run_main(main, "sync_assets")